@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Measure runtime, peak memory and output size of a full collection run.
+
+Exporters are imitated by a local HTTP server serving `dpkg`, `snap` and `kernel`
+endpoints with configurable payload size and latency. Juju controller is replaced by
+a fake controller with configurable number of models and size of their status and
+bundle. Each scenario runs in a separate process, so that its peak RSS is not
+affected by the server or by other scenarios. Run from repository root:
+
+    PYTHONPATH=. python benchmarks/bench_collector.py --targets 10 100 1000
+
+Targets are spread over distinct loopback addresses (127.0.x.y), so that the
+per-host concurrency limit applies the same way as with real exporter hosts. Use
+`--single-host` on systems that route only 127.0.0.1.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from software_inventory_collector.cli import collect_all, load_state
+from software_inventory_collector.config import Config
+from software_inventory_collector.context import CollectionContext
+from software_inventory_collector.packaging import packaging_pool
+from software_inventory_collector.report import RunReport
+
+EXPORTER_ENDPOINTS = ("dpkg", "snap", "kernel")
+
+
+def make_payload(size: int, seed: int) -> bytes:
+    """Return text payload of given size resembling package listing."""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        version = f"{rng.randint(0, 9)}.{rng.randint(0, 99)}"
+        line = f"ii  lib{rng.randint(0, 99999)}  {version}\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines).encode("UTF-8")[:size]
+
+
+class ExporterHandler(BaseHTTPRequestHandler):
+    """Request handler imitating inventory exporter endpoints."""
+
+    payloads: Dict[str, bytes] = {}
+    latency = 0.0
+
+    def do_GET(self) -> None:  # pylint: disable=C0103
+        """Serve payload of the requested endpoint after configured latency."""
+        payload = self.payloads.get(self.path.strip("/"))
+        time.sleep(self.latency)
+        if payload is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *_: Any) -> None:  # pylint: disable=W0221
+        """Do not log requests."""
+
+
+def start_exporter(payload_size: int, latency: float) -> ThreadingHTTPServer:
+    """Start local exporter server in a background thread."""
+    ExporterHandler.payloads = {
+        endpoint: make_payload(payload_size, seed)
+        for seed, endpoint in enumerate(EXPORTER_ENDPOINTS)
+    }
+    ExporterHandler.latency = latency
+    server = ThreadingHTTPServer(("", 0), ExporterHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeStatus:
+    """Model status returned by the fake model."""
+
+    def __init__(self, content: str) -> None:
+        """Initiate status with pre-serialized content."""
+        self.content = content
+
+    def to_json(self) -> str:
+        """Return status serialized as JSON."""
+        return self.content
+
+
+class FakeModel:
+    """Juju model serving status and bundle of configured size."""
+
+    def __init__(self, status: str, bundle: str, latency: float) -> None:
+        """Initiate fake model."""
+        self.status = status
+        self.bundle = bundle
+        self.latency = latency
+
+    async def get_status(self) -> FakeStatus:
+        """Return model status."""
+        await asyncio.sleep(self.latency)
+        return FakeStatus(self.status)
+
+    async def export_bundle(self) -> str:
+        """Return model bundle."""
+        await asyncio.sleep(self.latency)
+        return self.bundle
+
+    async def disconnect(self) -> None:
+        """Disconnect from the model."""
+
+
+class FakeController:
+    """Juju controller hosting given number of fake models."""
+
+    def __init__(
+        self, models: int, status_size: int, bundle_size: int, latency: float
+    ) -> None:
+        """Initiate fake controller, all models share the same status and bundle."""
+        self.models = [f"model-{index}" for index in range(models)]
+        self.status = json.dumps({"machines": make_payload(status_size, 1).decode()})
+        applications = {
+            f"app-{index}": {"charm": f"ch:app-{index}", "num_units": 3}
+            for index in range(max(1, bundle_size // 40))
+        }
+        self.bundle = json.dumps({"applications": applications})
+        self.latency = latency
+
+    async def model_uuids(self) -> Dict[str, str]:
+        """Return names and UUIDs of all models."""
+        return {name: f"uuid-{name}" for name in self.models}
+
+    async def get_model(self, _: str) -> FakeModel:
+        """Return connected model."""
+        await asyncio.sleep(self.latency)
+        return FakeModel(self.status, self.bundle, self.latency)
+
+
+def target_address(index: int, port: int, single_host: bool) -> str:
+    """Return exporter endpoint of the target with given index."""
+    if single_host:
+        return f"127.0.0.1:{port}"
+    return f"127.0.{index // 250}.{index % 250 + 1}:{port}"
+
+
+async def run_collection(config: Config, controller: FakeController) -> RunReport:
+    """Run exporter and Juju phases concurrently, as the CLI does.
+
+    Run uses budgets and limits of the settings and, if `state_file` is set, loads
+    and saves its state like a collection cycle of the CLI.
+    """
+    with packaging_pool(config.settings) as pool:
+        context = CollectionContext.new(config.settings, pool=pool)
+        context = replace(context, state=load_state(config))
+        controllers = {source.name: controller for source in config.controllers}
+        await collect_all(config, controllers, context)
+        if context.state is not None:
+            context.state.save()
+    context.report.finish()
+    return context.report
+
+
+def run_scenario(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run single collection scenario and return its measurements."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        settings = dict(json.loads(args.settings), collection_path=output_dir)
+        settings.update(customer="bench", site="bench")
+        targets = [
+            {
+                "endpoint": target_address(index, args.port, args.single_host),
+                "hostname": f"host-{index}",
+                "customer": "bench",
+                "site": "bench",
+                "model": f"model-{index % max(1, args.models)}",
+            }
+            for index in range(args.scenario)
+        ]
+        config = Config.from_dict(
+            {
+                "settings": settings,
+                "targets": targets,
+                "juju_controller": {
+                    "endpoint": "fake",
+                    "ca_cert": "",
+                    "username": "",
+                    "password": "",
+                },
+            }
+        )
+        controller = FakeController(
+            args.models, args.status_size, args.bundle_size, args.latency / 1000
+        )
+
+        # CLI imports collection modules lazily, they are imported before the clock
+        # starts, so that import time is not measured as runtime of the collection
+        importlib.import_module("software_inventory_collector.collector")
+        start = time.perf_counter()
+        report = asyncio.run(run_collection(config, controller))
+        runtime = time.perf_counter() - start
+
+        output_size = sum(
+            os.path.getsize(entry.path)
+            for entry in os.scandir(output_dir)
+            if entry.is_file()
+        )
+
+    return {
+        "targets": args.scenario,
+        "models": args.models,
+        "runtime_seconds": runtime,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "output_bytes": output_size,
+        "failed_sources": len(report.failed),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--targets", type=int, nargs="+", default=[10, 100, 1000], help="Target counts."
+    )
+    parser.add_argument("--models", type=int, default=10, help="Number of Juju models.")
+    parser.add_argument(
+        "--payload-size", type=int, default=256 * 1024, help="Exporter payload bytes."
+    )
+    parser.add_argument(
+        "--status-size", type=int, default=512 * 1024, help="Model status bytes."
+    )
+    parser.add_argument(
+        "--bundle-size", type=int, default=64 * 1024, help="Model bundle bytes."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=20.0, help="Latency of every request in ms."
+    )
+    parser.add_argument(
+        "--settings",
+        default="{}",
+        help='Collector settings as JSON, e.g. \'{"compression": "gzip"}\'.',
+    )
+    parser.add_argument(
+        "--single-host", action="store_true", help="Serve all targets on 127.0.0.1."
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    # internal options used when running a scenario in a subprocess
+    parser.add_argument("--scenario", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run benchmark scenarios and print results."""
+    args = parse_args()
+    if args.scenario is not None:
+        print(json.dumps(run_scenario(args)))
+        return
+
+    server = start_exporter(args.payload_size, args.latency / 1000)
+    results: List[Dict[str, Any]] = []
+    try:
+        for targets in args.targets:
+            command = [sys.executable, *sys.argv, "--scenario", str(targets)]
+            command += ["--port", str(server.server_address[1])]
+            output = subprocess.run(command, check=True, capture_output=True, text=True)
+            results.append(json.loads(output.stdout))
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"{'targets':>8}{'models':>8}{'runtime [s]':>13}{'peak RSS [MiB]':>16}"
+        f"{'output [MiB]':>14}{'failed':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['targets']:>8}{result['models']:>8}"
+            f"{result['runtime_seconds']:>13.2f}{result['peak_rss_kb'] / 1024:>16.1f}"
+            f"{result['output_bytes'] / 1024 / 1024:>14.1f}{result['failed_sources']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
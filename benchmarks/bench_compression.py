@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Compare size and CPU time of archive compression codecs on realistic payloads.
+
+Payloads imitate data gathered by the collector: `dpkg`, `snap` and `kernel` output
+of exporter hosts, and Juju status and bundle of a model. Run from repository root:
+
+    PYTHONPATH=. python benchmarks/bench_compression.py --hosts 50 --levels 1 6
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from software_inventory_collector.archive import (
+    COMPRESSIONS,
+    ArchiveWriter,
+    archive_suffix,
+    validate_compression,
+)
+
+
+def dpkg_payload(rng: random.Random, packages: int = 2500) -> bytes:
+    """Return dpkg listing similar to the one produced by inventory exporter."""
+    lines = []
+    for index in range(packages):
+        name = f"lib{rng.choice(['ssl', 'python3', 'gcc', 'systemd', 'x11'])}-{index}"
+        version = f"{rng.randint(0, 9)}.{rng.randint(0, 30)}-{rng.randint(1, 9)}ubuntu1"
+        lines.append(f"ii  {name}:amd64  {version}  amd64  Package {name} library")
+    return "\n".join(lines).encode("UTF-8")
+
+
+def snap_payload(rng: random.Random) -> bytes:
+    """Return snap listing similar to the one produced by inventory exporter."""
+    snaps = ["core20", "core22", "lxd", "snapd", "juju", "prometheus-node-exporter"]
+    return json.dumps(
+        [
+            {
+                "name": name,
+                "version": f"{rng.randint(1, 5)}.0",
+                "revision": rng.randint(1, 9999),
+            }
+            for name in snaps
+        ]
+    ).encode("UTF-8")
+
+
+def status_payload(rng: random.Random, machines: int) -> bytes:
+    """Return Juju status JSON of a model with given number of machines."""
+    status = {
+        "model": {"name": "openstack", "type": "iaas", "version": "2.9.38"},
+        "machines": {
+            str(index): {
+                "hostname": f"node-{index}",
+                "dns-name": f"10.0.{index // 250}.{index % 250}",
+                "series": "focal",
+                "juju-status": {"current": "started", "since": "2023-01-01T00:00:00Z"},
+                "containers": {
+                    f"{index}/lxd/{lxd}": {"series": "focal", "juju-status": "started"}
+                    for lxd in range(rng.randint(0, 4))
+                },
+            }
+            for index in range(machines)
+        },
+        "applications": {
+            f"app-{index}": {
+                "charm": f"ch:app-{index}",
+                "units": {
+                    f"app-{index}/{unit}": {"machine": str(unit)} for unit in range(3)
+                },
+            }
+            for index in range(machines // 2)
+        },
+    }
+    return json.dumps(status).encode("UTF-8")
+
+
+def build_payloads(hosts: int, seed: int = 42) -> List[Tuple[str, bytes]]:
+    """Return archive members for given number of exporter hosts and one model."""
+    rng = random.Random(seed)
+    members = []
+    for host in range(hosts):
+        members.append((f"dpkg_@_host-{host}", dpkg_payload(rng)))
+        members.append((f"snap_@_host-{host}", snap_payload(rng)))
+        members.append((f"kernel_@_host-{host}", b"5.4.0-150-generic"))
+    members.append(("juju_status_@_openstack", status_payload(rng, hosts)))
+    return members
+
+
+def measure(
+    members: List[Tuple[str, bytes]], compression: str, level: Optional[int], workdir: str
+) -> Dict:
+    """Write members into archive and return size and CPU time measurements."""
+    path = os.path.join(workdir, f"bench{archive_suffix(compression)}")
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    with ArchiveWriter(path, compression, level) as writer:
+        for name, payload in members:
+            writer.add_bytes(name, payload)
+    cpu_time, wall_time = (
+        time.process_time() - cpu_start,
+        time.perf_counter() - wall_start,
+    )
+    size = os.path.getsize(path)
+    os.unlink(path)
+    return {
+        "compression": compression,
+        "level": level,
+        "size": size,
+        "cpu_seconds": cpu_time,
+        "wall_seconds": wall_time,
+    }
+
+
+def main() -> None:
+    """Run compression benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=50, help="Number of exporter hosts.")
+    parser.add_argument(
+        "--levels", type=int, nargs="*", default=[], help="Extra levels to test."
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    members = build_payloads(args.hosts)
+    raw_size = sum(len(payload) for _, payload in members)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for compression in COMPRESSIONS:
+            for level in [None] + args.levels:
+                try:
+                    validate_compression(compression, level)
+                except ValueError:
+                    continue
+                results.append(measure(members, compression, level, workdir))
+
+    if args.json:
+        print(json.dumps({"raw_size": raw_size, "results": results}, indent=2))
+        return
+
+    print(f"Payload: {len(members)} members, {raw_size} bytes uncompressed")
+    print(
+        f"{'codec':<8}{'level':>6}{'size':>12}{'ratio':>8}{'cpu [s]':>10}{'wall [s]':>10}"
+    )
+    for result in results:
+        level = "-" if result["level"] is None else result["level"]
+        print(
+            f"{result['compression']:<8}{level:>6}{result['size']:>12}"
+            f"{raw_size / result['size']:>8.1f}{result['cpu_seconds']:>10.3f}"
+            f"{result['wall_seconds']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,622 @@
+"""Module containing helpers for writing collected data into archives."""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Executor, Future
+from itertools import islice
+from types import TracebackType
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    cast,
+)
+
+from typing_extensions import Protocol, Self
+
+from software_inventory_collector.index import (
+    INDEX_SUFFIX,
+    ArchiveIndex,
+    HashingReader,
+    retarget_index,
+)
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+# Supported compression codecs mapped to (tarball suffix, allowed compression levels)
+COMPRESSIONS: Dict[str, Tuple[str, range]] = {
+    "none": ("", range(0)),
+    "gzip": (".gz", range(1, 10)),
+    "bz2": (".bz2", range(1, 10)),
+    "xz": (".xz", range(0, 10)),
+    "zstd": (".zst", range(1, 23)),
+}
+# Size of tar stream compressed into a single frame of a framed tarball
+FRAME_SIZE = 1024 * 1024
+# Number of frames of a member compressed ahead of writing into a framed tarball
+FRAME_WINDOW = 4
+# Separator of fields in names of collected files
+FIELD_SEPARATOR = "_@_"
+
+
+def archive_suffix(compression: str) -> str:
+    """Return file name suffix of tarball compressed with selected codec."""
+    return f".tar{COMPRESSIONS[compression][0]}"
+
+
+def validate_compression(compression: str, level: Optional[int]) -> None:
+    """Verify that compression codec and level are supported.
+
+    :param compression: Name of the compression codec
+    :param level: Compression level, or None to use codec's default
+    :raises ValueError: If codec, or its level, is not supported
+    :return: None
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"unsupported compression '{compression}', choose from: "
+            f"{', '.join(COMPRESSIONS)}"
+        )
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires 'zstandard' python package")
+    levels = COMPRESSIONS[compression][1]
+    if level is not None and level not in levels:
+        raise ValueError(f"unsupported {compression} compression level {level}")
+
+
+def compress_frame(data: bytes, compression: str, level: Optional[int] = None) -> bytes:
+    """Compress data into a standalone frame (stream) of the codec.
+
+    Concatenated frames are decompressed as a single stream by all supported codecs,
+    so data can be compressed in independent pieces.
+
+    :param data: Data to compress
+    :param compression: Compression codec, one of `COMPRESSIONS`
+    :param level: Compression level, or None to use codec's default
+    :return: Compressed frame, or the data as they are if compression is "none"
+    """
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=level or 6, mtime=0)
+    if compression == "bz2":
+        return bz2.compress(data, level or 9)
+    if compression == "xz":
+        return lzma.compress(data, preset=6 if level is None else level)
+    if compression == "zstd":
+        return cast(bytes, zstandard.ZstdCompressor(level=level or 3).compress(data))
+    return data
+
+
+def _frame_compressor(compression: str, level: Optional[int] = None) -> Any:
+    """Return incremental compressor of a standalone frame (stream) of the codec.
+
+    Compressor has `compress(data)` and `flush()` methods, frames it produces are
+    the same as those of `compress_frame`.
+    """
+    if compression == "gzip":
+        return zlib.compressobj(level or 6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Compressor(level or 9)
+    if compression == "xz":
+        return lzma.LZMACompressor(preset=6 if level is None else level)
+    return zstandard.ZstdCompressor(level=level or 3).compressobj()
+
+
+def _tar_info(name: str, size: int, mtime: Optional[int] = None) -> tarfile.TarInfo:
+    """Return tar header of a collected file."""
+    member = tarfile.TarInfo(name)
+    member.size = size
+    member.mode = 0o644
+    member.mtime = int(time.time()) if mtime is None else mtime
+    return member
+
+
+def numbered_path(path: str, number: int) -> str:
+    """Return path with a number added as the last field of its file name.
+
+    Number is added in front of the file name suffixes, e.g. number 1 turns
+    `a_@_20230501100000.tar.gz` into `a_@_20230501100000_@_1.tar.gz`.
+    """
+    directory, name = os.path.split(path)
+    head, separator, last = name.rpartition(FIELD_SEPARATOR)
+    field, dot, suffixes = last.partition(".")
+    return os.path.join(
+        directory, f"{head}{separator}{field}{FIELD_SEPARATOR}{number}{dot}{suffixes}"
+    )
+
+
+def publish(source: str, destination: str) -> str:
+    """Atomically move finished file into place, existing file is never replaced.
+
+    File appears at the destination complete, or not at all. If the destination
+    already exists (e.g. it was published by a run started within the same second),
+    file is published under the first free numbered name (see `numbered_path`). Both
+    paths must be on the same filesystem.
+
+    :param source: Path to the finished file
+    :param destination: Path at which the file should be published
+    :return: Path at which the file was published
+    """
+    published, number = destination, 0
+    while True:
+        try:
+            os.link(source, published)
+            break
+        except FileExistsError:
+            number += 1
+            published = numbered_path(destination, number)
+    os.unlink(source)
+    return published
+
+
+class MemberWriter(Protocol):
+    """Destination of collected files, e.g. a tarball.
+
+    Writer that publishes its output itself updates its `path` to the path at which
+    the output was published.
+    """
+
+    path: str
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        """Add member with content taken from memory."""
+
+    def add_stream(
+        self, name: str, stream: BinaryIO, size: int, mtime: Optional[int] = None
+    ) -> None:
+        """Add member with content read from file-like object."""
+
+    def close(self) -> None:
+        """Finalize the destination."""
+
+
+class ArchiveWriter:  # pylint: disable=R0902
+    """Tarball that stays open while members are added to it.
+
+    Tarball is created when the first member is added and it is finalized only once,
+    when the writer is closed. Members are taken directly from memory or from a
+    file-like object without any intermediate temporary files. If compression is
+    selected, members are compressed while they are written. If index is enabled,
+    sidecar index (see `IndexedArchiveReader`) is written next to the tarball when
+    it's finalized, and each member of a compressed tarball starts a new frame, so
+    that readers can decompress the member from its first frame. Adding members is
+    thread-safe.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: str = "none",
+        level: Optional[int] = None,
+        index: bool = False,
+    ) -> None:
+        """Initiate archive writer.
+
+        :param path: Path to the resulting tarball.
+        :param compression: Compression codec, one of `COMPRESSIONS`
+        :param level: Compression level, or None to use codec's default
+        :param index: Write sidecar index of the tarball (`<path>.index.json`)
+        """
+        validate_compression(compression, level)
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self._lock = threading.Lock()
+        self._tar: Optional[tarfile.TarFile] = None
+        self._stream: Optional[io.BufferedIOBase] = None
+        self._index = ArchiveIndex(compression) if index else None
+        # tarball of members compressed into their own frames, and its tar stream size
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+
+    def __enter__(self) -> Self:
+        """Return archive writer as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Finalize archive when leaving context."""
+        self.close()
+
+    def _add_frame(
+        self, index: ArchiveIndex, member: tarfile.TarInfo, reader: HashingReader
+    ) -> None:
+        """Write member into a new compressed frame and add it to the index."""
+        if self._file is None:
+            self._file = open(self.path, "wb")  # pylint: disable=R1732
+        header = member.tobuf(tarfile.PAX_FORMAT, "UTF-8", "surrogateescape")
+        frame = self._file.tell()
+        compressor = _frame_compressor(self.compression, self.level)
+        for piece in _tar_pieces(header, cast(BinaryIO, reader), member.size):
+            self._file.write(compressor.compress(piece))
+        self._file.write(compressor.flush())
+        index.add(member.name, reader, self._size + len(header), frame, self._size)
+        self._size += len(header) + member.size + -member.size % tarfile.BLOCKSIZE
+
+    def _open(self) -> tarfile.TarFile:
+        """Return open tarball, create it if it does not exist yet."""
+        if self._tar is not None:
+            return self._tar
+
+        # archive is kept open until the writer is closed
+        # pylint: disable=R1732
+        stream: io.BufferedIOBase
+        if self.compression == "gzip":
+            stream = gzip.GzipFile(self.path, "wb", compresslevel=self.level or 6)
+        elif self.compression == "bz2":
+            stream = bz2.BZ2File(self.path, "wb", compresslevel=self.level or 9)
+        elif self.compression == "xz":
+            preset = 6 if self.level is None else self.level
+            stream = lzma.LZMAFile(self.path, "wb", preset=preset)
+        elif self.compression == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.level or 3)
+            stream = cast(
+                io.BufferedIOBase, compressor.stream_writer(open(self.path, "wb"))
+            )
+        else:
+            stream = open(self.path, "wb")
+
+        self._stream = stream
+        self._tar = tarfile.open(fileobj=stream, mode="w|", encoding="UTF-8")
+        return self._tar
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        """Add member to the archive with content taken from memory.
+
+        :param name: Name of the member in the archive
+        :param data: Content of the member
+        :return: None
+        """
+        self.add_stream(name, io.BytesIO(data), len(data))
+
+    def add_stream(
+        self, name: str, stream: BinaryIO, size: int, mtime: Optional[int] = None
+    ) -> None:
+        """Add member to the archive with content read from file-like object.
+
+        :param name: Name of the member in the archive
+        :param stream: File-like object from which exactly `size` bytes will be read
+        :param size: Size of the member
+        :param mtime: Modification time of the member, defaults to now
+        :return: None
+        """
+        member = _tar_info(name, size, mtime)
+        reader = HashingReader(stream)
+        with self._lock:
+            if self._index is not None and self.compression != "none":
+                self._add_frame(self._index, member, reader)
+                return
+            tar = self._open()
+            if self._index is None:
+                tar.addfile(member, stream)
+                return
+            tar.addfile(member, cast(BinaryIO, reader))
+            self._index.add(name, reader, tar.offset - size - -size % tarfile.BLOCKSIZE)
+
+    def close(self) -> None:
+        """Finalize the archive. Closing writer without members is a no-op."""
+        with self._lock:
+            if self._tar is not None:
+                self._tar.close()
+                self._tar = None
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            if self._file is not None:
+                end = _end_of_archive(self._size, self.compression, self.level)
+                self._file.write(end)
+                self._file.close()
+                self._file = None
+            if self._index is not None and self._index.members:
+                self._index.save(f"{self.path}{INDEX_SUFFIX}", self.path)
+                self._index = None
+
+
+def _end_of_archive(size: int, compression: str, level: Optional[int]) -> bytes:
+    """Return compressed frame that ends tar stream of given size."""
+    end = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+    end += tarfile.NUL * (-(size + len(end)) % tarfile.RECORDSIZE)
+    return compress_frame(end, compression, level)
+
+
+def _tar_pieces(header: bytes, stream: BinaryIO, size: int) -> Iterator[bytes]:
+    """Return tar stream of a member (header, content, padding) in `FRAME_SIZE` pieces.
+
+    :raises OSError: If the stream ends before `size` bytes are read
+    """
+    piece = header
+    remaining = size
+    while remaining:
+        chunk = stream.read(min(FRAME_SIZE - len(piece), remaining))
+        if not chunk:
+            raise OSError("unexpected end of data")
+        piece += chunk
+        remaining -= len(chunk)
+        if len(piece) >= FRAME_SIZE:
+            yield piece
+            piece = b""
+    yield piece + tarfile.NUL * (-size % tarfile.BLOCKSIZE)
+
+
+class FramedArchiveWriter:  # pylint: disable=R0902
+    """Compressed tarball whose members are compressed in parallel by an executor.
+
+    Tar stream of each member is split into pieces of `FRAME_SIZE` bytes and every
+    piece is compressed into a standalone frame by the executor (e.g. by a pool of
+    worker processes), like `pigz` does. Frames of a member are appended to the
+    tarball in order, members are appended as soon as their first frame is
+    compressed. Concatenated frames decompress as a single tar stream, so the result
+    is a regular compressed tarball (Python readers of zstd need
+    `read_across_frames=True`). Every member starts a new frame, so the sidecar
+    index, if enabled, lets readers decompress the member from its first frame.
+    Adding members is thread-safe.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: str,
+        level: Optional[int],
+        executor: Executor,
+        index: bool = False,
+    ) -> None:
+        """Initiate framed archive writer.
+
+        :param path: Path to the resulting tarball
+        :param compression: Compression codec, one of `COMPRESSIONS`
+        :param level: Compression level, or None to use codec's default
+        :param executor: Executor that compresses the frames
+        :param index: Write sidecar index of the tarball (`<path>.index.json`)
+        """
+        validate_compression(compression, level)
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+        self._index = ArchiveIndex(compression) if index else None
+
+    def __enter__(self) -> Self:
+        """Return archive writer as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Finalize archive when leaving context."""
+        self.close()
+
+    def _compress(self, piece: bytes) -> "Future[bytes]":
+        """Submit piece of tar stream for compression."""
+        return self.executor.submit(compress_frame, piece, self.compression, self.level)
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        """Add member to the archive with content taken from memory.
+
+        :param name: Name of the member in the archive
+        :param data: Content of the member
+        :return: None
+        """
+        self.add_stream(name, io.BytesIO(data), len(data))
+
+    def add_stream(
+        self, name: str, stream: BinaryIO, size: int, mtime: Optional[int] = None
+    ) -> None:
+        """Add member to the archive with content read from file-like object.
+
+        :param name: Name of the member in the archive
+        :param stream: File-like object from which exactly `size` bytes will be read
+        :param size: Size of the member
+        :param mtime: Modification time of the member, defaults to now
+        :raises OSError: If the stream ends before `size` bytes are read
+        :return: None
+        """
+        header = _tar_info(name, size, mtime).tobuf(
+            tarfile.PAX_FORMAT, "UTF-8", "surrogateescape"
+        )
+        reader = HashingReader(stream)
+        pieces = _tar_pieces(
+            header, stream if self._index is None else cast(BinaryIO, reader), size
+        )
+        pending: Deque["Future[bytes]"] = deque(
+            self._compress(piece) for piece in islice(pieces, FRAME_WINDOW)
+        )
+        # members don't hold the archive while their first frame is compressed
+        pending[0].result()
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "wb")  # pylint: disable=R1732
+            frame = self._file.tell()
+            while pending:
+                self._file.write(pending.popleft().result())
+                pending.extend(self._compress(piece) for piece in islice(pieces, 1))
+            if self._index is not None:
+                offset = self._size + len(header)
+                self._index.add(name, reader, offset, frame, self._size)
+            self._size += len(header) + size + -size % tarfile.BLOCKSIZE
+
+    def close(self) -> None:
+        """Finalize the archive. Closing writer without members is a no-op."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_end_of_archive(self._size, self.compression, self.level))
+            self._file.close()
+            self._file = None
+            if self._index is not None:
+                self._index.save(f"{self.path}{INDEX_SUFFIX}", self.path)
+                self._index = None
+
+
+def writer_factory(
+    compression: str = "none",
+    level: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    index: bool = False,
+) -> Callable[[str], MemberWriter]:
+    """Return callable that creates tarball writer for given path.
+
+    :param compression: Compression codec of the tarballs
+    :param level: Compression level, or None to use codec's default
+    :param executor: Executor that compresses tarballs (see `FramedArchiveWriter`),
+        e.g. a pool of worker processes. Tarballs are compressed by the threads
+        adding their members if not provided.
+    :param index: Write sidecar index of each tarball
+    :raises ValueError: If codec, or its level, is not supported
+    :return: Factory of tarball writers
+    """
+    validate_compression(compression, level)
+    if executor is not None and compression != "none":
+        return lambda path: FramedArchiveWriter(path, compression, level, executor, index)
+    return lambda path: ArchiveWriter(path, compression, level, index)
+
+
+class ArchiveSet:
+    """Archive writers shared by all phases of a collection, one per tarball path.
+
+    Exporter data and Juju data that belong to the same model are stored in the same
+    tarball, so every phase must add its members through the same writer.
+
+    If staging directory is used, tarballs are built inside it and published to their
+    final path only when they are finalized, so that readers of the final location
+    never see partially written tarball. Sidecar index of a tarball is published
+    right after the tarball. Without staging directory, writers are responsible for
+    publishing their output atomically. Callbacks registered with `on_published`
+    run when the set is closed, e.g. to advance state of collected data only when
+    the data are stored.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], MemberWriter] = ArchiveWriter,
+        staging_path: Optional[str] = None,
+    ) -> None:
+        """Initiate empty set of archives.
+
+        :param factory: Callable returning writer for given path, e.g. one returned
+            by `writer_factory`, defaults to uncompressed tarballs
+        :param staging_path: Directory in which tarballs are built, it must be on the
+            same filesystem as the final tarballs. Tarballs are built in place if
+            not provided.
+        """
+        self.staging_path = staging_path
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._writers: Dict[str, MemberWriter] = {}
+        self._staged: Dict[str, str] = {}
+        self._callbacks: List[
+            Tuple[Set[str], Callable[[], None], Optional[Callable[[], None]]]
+        ] = []
+
+    def get(self, path: str) -> MemberWriter:
+        """Return writer of the archive, create it if it does not exist yet."""
+        with self._lock:
+            if path not in self._writers:
+                if self.staging_path is not None:
+                    os.makedirs(self.staging_path, exist_ok=True)
+                    staged = os.path.join(self.staging_path, os.path.basename(path))
+                    self._staged[path] = staged
+                    self._writers[path] = self._factory(staged)
+                else:
+                    self._writers[path] = self._factory(path)
+            return self._writers[path]
+
+    def on_published(
+        self,
+        paths: Iterable[str],
+        callback: Callable[[], None],
+        discard: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Run callback when the set is closed, if all given archives were published.
+
+        Archive that was never created counts as published. If any of the archives
+        can't be finalized or published, `discard` runs instead of the callback.
+
+        :param paths: Final paths of the archives
+        :param callback: Function to run
+        :param discard: Function to run if the archives were not published
+        :return: None
+        """
+        with self._lock:
+            self._callbacks.append((set(paths), callback, discard))
+
+    def _publish(self, path: str, writer: MemberWriter, staged: Optional[str]) -> str:
+        """Finalize archive and publish it, if it's staged, with its sidecar index.
+
+        :return: Path at which the archive was published
+        """
+        writer.close()
+        if staged is None:
+            return writer.path
+        if not os.path.exists(staged):
+            return path
+        published = publish(staged, path)
+        if os.path.exists(f"{staged}{INDEX_SUFFIX}"):
+            if published != path:
+                retarget_index(f"{staged}{INDEX_SUFFIX}", published)
+            publish(f"{staged}{INDEX_SUFFIX}", f"{published}{INDEX_SUFFIX}")
+        return published
+
+    def close(self) -> Dict[str, Optional[OSError]]:
+        """Finalize all archives in the set and publish the staged ones.
+
+        Existing file is never replaced by a published archive, it's published under
+        a numbered name instead (see `publish`). Tarball that can't be published is
+        left in the staging directory. Callbacks of archives that were published, and
+        discard callbacks of the others, run once all archives are closed.
+
+        :return: Paths at which archives of the set were published mapped to None,
+            and final paths of archives that could not be finalized or published
+            mapped to the error that prevented it.
+        """
+        with self._lock:
+            writers, self._writers = self._writers, {}
+            staged, self._staged = self._staged, {}
+            callbacks, self._callbacks = self._callbacks, []
+        results: Dict[str, Optional[OSError]] = {}
+        failed = set()
+        for path, writer in writers.items():
+            try:
+                results[self._publish(path, writer, staged.get(path))] = None
+            except OSError as exc:
+                results[path] = exc
+                failed.add(path)
+
+        if self.staging_path is not None and staged:
+            try:
+                os.rmdir(self.staging_path)
+            except OSError:
+                pass  # not empty, some tarballs were not published
+        for paths, callback, discard in callbacks:
+            if failed.isdisjoint(paths):
+                callback()
+            elif discard is not None:
+                discard()
+        return results
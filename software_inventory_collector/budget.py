@@ -0,0 +1,230 @@
+"""Module containing limits of resources that a single collection run can consume."""
+import asyncio
+import shutil
+import threading
+import time
+from types import TracebackType
+from typing import Optional, Tuple, Type
+
+from typing_extensions import Self
+
+from software_inventory_collector.exception import CollectionError
+
+OVERSIZE_ACTIONS = ["skip", "truncate"]
+
+# Interval in which waiting collection re-checks whether it can continue
+POLL_INTERVAL = 0.1
+
+
+class ByteBudget:  # pylint: disable=R0903
+    """Thread-safe number of bytes that can be consumed, e.g. written by the run."""
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        """Initiate budget.
+
+        :param limit: Number of bytes in the budget, None for unlimited budget
+        """
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self, size: int, partial: bool = False) -> int:
+        """Consume bytes from the budget.
+
+        :param size: Number of requested bytes
+        :param partial: Whether to grant only the remaining bytes, if the budget can't
+            cover the whole request. Otherwise the request is granted fully or not at
+            all.
+        :return: Number of granted bytes
+        """
+        with self._lock:
+            if self.limit is None:
+                granted = size
+            else:
+                remaining = max(self.limit - self.used, 0)
+                if size <= remaining:
+                    granted = size
+                else:
+                    granted = remaining if partial else 0
+            self.used += granted
+            return granted
+
+
+class InFlightLimiter:
+    """Amount of collected data held in memory before it is written to archives.
+
+    New downloads wait while the amount exceeds the limit, so that a run slows down
+    instead of exhausting memory. Data that are already held are never blocked, they
+    are written and released.
+    """
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        """Initiate limiter.
+
+        :param limit: Number of bytes above which new downloads wait, None to disable
+        """
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def exceeded(self) -> bool:
+        """Return True if new downloads should wait."""
+        return self.limit is not None and self.in_flight >= self.limit
+
+    def add(self, size: int) -> None:
+        """Record data that are held in memory."""
+        with self._condition:
+            self.in_flight += size
+
+    def release(self, size: int) -> None:
+        """Record that data are no longer held in memory and wake up waiting callers."""
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+    def reserve(self, size: int) -> "Reservation":
+        """Record data that will be held in memory, e.g. before they are downloaded."""
+        return Reservation(self, size)
+
+    def wait(self) -> None:
+        """Block calling thread while the limit is exceeded."""
+        with self._condition:
+            self._condition.wait_for(lambda: not self.exceeded)
+
+    async def wait_async(self) -> None:
+        """Wait without blocking event loop while the limit is exceeded."""
+        while self.exceeded:
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+class Reservation:
+    """Data recorded in in-flight limiter before their actual size is known.
+
+    Reservation is settled to the actual size once it's known, and released when
+    leaving its context.
+    """
+
+    def __init__(self, limiter: InFlightLimiter, size: int) -> None:
+        """Initiate reservation and record the reserved data in the limiter.
+
+        :param limiter: Limiter of data held in memory
+        :param size: Number of reserved bytes
+        """
+        self.limiter = limiter
+        self.size = size
+        limiter.add(size)
+
+    def __enter__(self) -> Self:
+        """Return reservation as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Release reserved data when leaving context."""
+        self.settle(0)
+
+    def settle(self, size: int) -> None:
+        """Change number of reserved bytes, e.g. to the actual size of the data."""
+        if size > self.size:
+            self.limiter.add(size - self.size)
+        else:
+            self.limiter.release(self.size - size)
+        self.size = size
+
+
+class DiskGuard:
+    """Free space of the filesystem that receives collected data."""
+
+    def __init__(self, path: str, min_free: int = 0, timeout: float = 60) -> None:
+        """Initiate guard.
+
+        :param path: Path on the guarded filesystem
+        :param min_free: Bytes of free space required to write data, 0 to disable
+        :param timeout: Seconds to wait for free space before giving up
+        """
+        self.path = path
+        self.min_free = min_free
+        self.timeout = timeout
+
+    def has_space(self) -> bool:
+        """Return True if the filesystem has the required free space."""
+        return not self.min_free or shutil.disk_usage(self.path).free >= self.min_free
+
+    def _error(self) -> CollectionError:
+        """Return error raised when free space did not become available in time."""
+        return CollectionError(
+            f"Less than {self.min_free} bytes of free space in '{self.path}'"
+        )
+
+    def wait(self) -> None:
+        """Block calling thread until there is enough free space.
+
+        :raises CollectionError: If free space is not available within the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        while not self.has_space():
+            if time.monotonic() >= deadline:
+                raise self._error()
+            time.sleep(POLL_INTERVAL)
+
+    async def wait_async(self) -> None:
+        """Wait without blocking event loop until there is enough free space.
+
+        :raises CollectionError: If free space is not available within the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        while not self.has_space():
+            if time.monotonic() >= deadline:
+                raise self._error()
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+class RunLimits:  # pylint: disable=R0903
+    """Byte budgets and backpressure shared by all phases of a collection run."""
+
+    def __init__(
+        self,
+        max_artifact_size: Optional[int] = None,
+        max_run_size: Optional[int] = None,
+        oversize_action: str = "skip",
+        memory: Optional[InFlightLimiter] = None,
+        disk: Optional[DiskGuard] = None,
+    ) -> None:
+        """Initiate limits, all of them are disabled by default.
+
+        :param max_artifact_size: Maximal size of a single collected artifact
+        :param max_run_size: Maximal number of bytes written by the run
+        :param oversize_action: Whether artifacts over the limits are skipped or
+            truncated, one of `OVERSIZE_ACTIONS`
+        :param memory: Limiter of data held in memory
+        :param disk: Guard of free space on the output filesystem
+        """
+        self.max_artifact_size = max_artifact_size
+        self.oversize_action = oversize_action
+        self.run_budget = ByteBudget(max_run_size)
+        self.memory = memory or InFlightLimiter()
+        self.disk = disk or DiskGuard(".")
+
+    def admit(self, size: int) -> Tuple[int, Optional[str]]:
+        """Return how many bytes of an artifact can be written.
+
+        :param size: Size of the artifact
+        :return: Number of bytes to write (0 if the artifact is skipped) and reason
+            why the artifact is skipped or truncated, None if it's written fully
+        """
+        truncate = self.oversize_action == "truncate"
+        reason = None
+        allowed = size
+        if self.max_artifact_size is not None and size > self.max_artifact_size:
+            reason = f"larger than max_artifact_size of {self.max_artifact_size} bytes"
+            allowed = self.max_artifact_size if truncate else 0
+
+        granted = self.run_budget.take(allowed, partial=truncate)
+        if granted < allowed:
+            reason = f"max_run_size of {self.run_budget.limit} bytes reached"
+        return granted, reason
@@ -1,25 +1,65 @@
 #!/usr/bin/env python3
-"""CLI Entrypoint to the software-inventory-collector."""
+"""CLI Entrypoint to the software-inventory-collector.
+
+Heavy dependencies (python-libjuju, requests and the collector module that uses
+them) are imported only on code paths that need them, so that checking config or
+failing on invalid config does not pay for their import.
+"""
+# pylint: disable=C0415
 import argparse
+import asyncio
+import datetime
+import json
+import signal
 import sys
+from dataclasses import replace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
 
 import yaml
-from juju import jasyncio
-from juju.controller import Controller
-from juju.errors import JujuError
-
-from software_inventory_collector.collector import (
-    get_controller,
-    get_exporter_data,
-    get_juju_data,
+
+from software_inventory_collector.config import (
+    Config,
+    _ConfigJujuController,
+    _ConfigTarget,
 )
-from software_inventory_collector.config import Config
+from software_inventory_collector.context import CollectionContext
 from software_inventory_collector.exception import ConfigError, ConfigMissingKeyError
+from software_inventory_collector.report import (
+    EXIT_FAILURE,
+    EXIT_OK,
+    EXIT_PARTIAL_FAILURE,
+    RunReport,
+    get_run_report_path,
+)
+from software_inventory_collector.schedule import Schedule, parse_schedule
+from software_inventory_collector.shard import parse_shard, shard_path
+from software_inventory_collector.state import StateStore
+
+if TYPE_CHECKING:  # pragma: no cover
+    from juju.controller import Controller
+
+    from software_inventory_collector.watcher import ModelWatcher
+
+# Connected controllers by name, or an awaitable of them while they still connect
+Controllers = Union[Dict[str, "Controller"], Awaitable[Dict[str, "Controller"]]]
 
 
 def parse_cli() -> argparse.Namespace:
     """Parse CLI arguments."""
-    arg_parser = argparse.ArgumentParser("Collect software inventory data")
+    arg_parser = argparse.ArgumentParser(
+        "Collect software inventory data",
+        epilog=f"Exit codes: {EXIT_OK} - all sources collected, {EXIT_FAILURE} - "
+        f"collection failed, {EXIT_PARTIAL_FAILURE} - some sources failed.",
+    )
     arg_parser.add_argument(
         "-c",
         "--config",
@@ -34,6 +74,35 @@ def parse_cli() -> argparse.Namespace:
         help="Verifies successful connection to the controller but no output "
         "is produced.",
     )
+    arg_parser.add_argument(
+        "--check-config",
+        action="store_true",
+        default=False,
+        help="Only validate the configuration file, without connecting anywhere.",
+    )
+    arg_parser.add_argument(
+        "--shard",
+        metavar="INDEX/COUNT",
+        default=None,
+        help="Collect only the shard INDEX (counted from 0) of targets and models "
+        "split between COUNT collector instances, e.g. '0/4'. Overrides "
+        "'settings.shard_index' and 'settings.shard_count'.",
+    )
+    arg_parser.add_argument(
+        "--merge-reports",
+        metavar="REPORT",
+        nargs="+",
+        default=None,
+        help="Merge JSON run reports of collector shards into one run report, "
+        "instead of collecting data.",
+    )
+    arg_parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=False,
+        help="Run as a service collecting data periodically, according to the "
+        "schedule in the config file, until stopped by SIGTERM.",
+    )
     return arg_parser.parse_args()
 
 
@@ -57,6 +126,387 @@ def parse_config(config_path: str) -> Config:
     return config
 
 
+def write_report(config: Config, context: CollectionContext) -> None:
+    """Finish the run report and write it in formats enabled in the config.
+
+    Failure to write the report is printed, but it does not fail the collection.
+    Shards of a sharded collection don't write the Prometheus textfile, it's written
+    when their run reports are merged.
+
+    :param config: Collector's configuration
+    :param context: Context of the collection run
+    :return: None
+    """
+    report = context.report
+    report.finish()
+    try:
+        if config.settings.run_report:
+            report.write_json(get_run_report_path(config, context))
+        if config.settings.prometheus_textfile and config.settings.shard_count == 1:
+            report.write_prometheus(config.settings.prometheus_textfile)
+    except IOError as exc:
+        print(f"Failed to write run report: {exc}")
+
+
+async def collect_all(
+    config: Config, controllers: Controllers, context: CollectionContext
+) -> Dict[str, Any]:
+    """Run exporter and Juju collection phases concurrently.
+
+    Exporter data are collected in a worker thread while Juju models of all
+    connected controllers are collected on the event loop, each controller in its
+    own phase. Exporter phase does not wait for the controllers, it starts while
+    they still connect. All phases write into the same set of archives, so exporter
+    and Juju data of a model end up in the same tarball. Exporter targets discovered
+    by the Juju phases that were not known when the exporter phase started are
+    collected by a follow-up "discovery" phase. Tarballs are published into the
+    collection path only after all phases finished.
+
+    :param config: Collector's configuration
+    :param controllers: Connected Juju controllers, by controller name, or an
+        awaitable that connects them
+    :param context: Context of the collection run
+    :return: Results of the phases by phase name, exception if the phase failed as
+        a whole
+    """
+    from software_inventory_collector.collector import (
+        close_archives,
+        exporter_targets,
+        get_exporter_data,
+        new_archive_set,
+    )
+
+    targets = exporter_targets(config, context.state)
+    archives = new_archive_set(config, context)
+    context = replace(context, archives=archives)
+    try:
+        exporter, juju = await asyncio.gather(
+            asyncio.get_running_loop().run_in_executor(
+                None, get_exporter_data, config, context, targets
+            ),
+            _collect_juju(config, controllers, context),
+            return_exceptions=True,
+        )
+        results: Dict[str, Any] = {"exporter": exporter}
+        results.update(juju if isinstance(juju, dict) else {"juju": juju})
+        results.update(await _collect_discovered(config, context, targets))
+    finally:
+        close_archives(archives, context.report)
+
+    return results
+
+
+async def _collect_juju(
+    config: Config, controllers: Controllers, context: CollectionContext
+) -> Dict[str, Any]:
+    """Wait for controllers to connect, then run their Juju phases concurrently.
+
+    :return: Results of the Juju phases by phase name
+    """
+    from software_inventory_collector.collector import get_juju_data, juju_phase
+
+    if not isinstance(controllers, dict):
+        controllers = await controllers
+    phases = {
+        juju_phase(config, source): get_juju_data(
+            config, controllers[source.name], context, source
+        )
+        for source in config.controllers
+        if source.name in controllers
+    }
+    return dict(
+        zip(phases, await asyncio.gather(*phases.values(), return_exceptions=True))
+    )
+
+
+async def _collect_discovered(
+    config: Config, context: CollectionContext, known: List[_ConfigTarget]
+) -> Dict[str, Any]:
+    """Collect exporter targets discovered by Juju phases that were not known before.
+
+    :return: Result of the follow-up "discovery" phase by phase name, empty if no
+        new target was discovered
+    """
+    from software_inventory_collector.collector import (
+        exporter_targets,
+        get_exporter_data,
+    )
+
+    endpoints = {target.endpoint for target in known}
+    targets = [
+        target
+        for target in exporter_targets(config, context.state)
+        if target.endpoint not in endpoints
+    ]
+    if not targets:
+        return {}
+    results = await asyncio.gather(
+        asyncio.get_running_loop().run_in_executor(
+            None, get_exporter_data, config, context, targets
+        ),
+        return_exceptions=True,
+    )
+    return {"discovery": results[0]}
+
+
+async def connect_controller(
+    config: Config, report: RunReport, source: _ConfigJujuController
+) -> Optional["Controller"]:
+    """Connect to Juju controller, failure is printed and recorded in the report.
+
+    :param config: Collector's configuration
+    :param report: Run report that receives connection time or failure
+    :param source: Config of the controller
+    :return: Connected controller, or None if connection failed
+    """
+    from juju.errors import JujuError
+
+    from software_inventory_collector.collector import get_controller
+
+    try:
+        with report.timer("connect"):
+            return await get_controller(config, source)
+    except (JujuError, OSError) as exc:
+        print(f"Failed to connect to juju controller: {exc}")
+        report.record("controller", source.endpoint, str(exc))
+        return None
+
+
+async def connect_controllers(
+    config: Config,
+    report: RunReport,
+    controllers: Optional[Dict[str, "Controller"]] = None,
+) -> Dict[str, "Controller"]:
+    """Connect to all Juju controllers at once.
+
+    Controllers that are already connected are kept, controllers whose connection
+    dropped are disconnected and connected again. Failures are printed and recorded
+    in the report.
+
+    :param config: Collector's configuration
+    :param report: Run report that receives connection time or failures
+    :param controllers: Previously connected controllers, by controller name
+    :return: Connected controllers, by controller name
+    """
+    connected = dict(controllers or {})
+    missing = []
+    for source in config.controllers:
+        controller = connected.get(source.name)
+        if controller is None or not controller.is_connected():
+            await _disconnect(connected.pop(source.name, None))
+            missing.append(source)
+
+    results = await asyncio.gather(
+        *(connect_controller(config, report, source) for source in missing)
+    )
+    for source, controller in zip(missing, results):
+        if controller is not None:
+            connected[source.name] = controller
+    return connected
+
+
+def load_state(config: Config) -> Optional[StateStore]:
+    """Return state store of collector's shard, None if state file is not configured."""
+    settings = config.settings
+    if not settings.state_file:
+        return None
+    return StateStore.load(
+        shard_path(settings.state_file, settings.shard_index, settings.shard_count)
+    )
+
+
+async def collect_cycle(
+    config: Config, controllers: Controllers, context: CollectionContext
+) -> int:
+    """Collect data from all sources using already connected controllers.
+
+    Outcome of every exporter target and Juju model is printed in a summary. Timing
+    and throughput of the run, its phases and of every source are written into a
+    run report. Exit code reflects whether all, some or none of the sources failed.
+
+    :param config: Collector's configuration
+    :param controllers: Connected Juju controllers, by controller name, or an
+        awaitable that connects them
+    :param context: Context of the collection run
+    :return: Exit code of the collection
+    """
+    context = replace(context, state=load_state(config))
+    results = await collect_all(config, controllers, context)
+    if context.state is not None:
+        context.state.save()
+
+    report = context.report
+    for phase, result in results.items():
+        if isinstance(result, Exception):
+            print(f"Failed to collect data: {result}")
+            report.record("phase", phase, str(result))
+
+    write_report(config, context)
+    print(report.summary())
+    return report.exit_code
+
+
+async def collect(config: Config, dry_run: bool = False) -> int:
+    """Connect to Juju controllers and collect data from all sources once.
+
+    Exporter and Juju phases run concurrently, exporter phase starts while the
+    controllers connect. Connections to all controllers are established at once and
+    torn down exactly once. Controllers that can't be
+    connected are recorded as failed sources, models of the others are collected.
+    Exporter targets are collected even if no controller could be connected.
+    Packaging pool enabled by `settings.packaging_pool` lives for the duration of
+    the collection.
+
+    :param config: Collector's configuration
+    :param dry_run: Only verify connection to the controllers, don't collect data
+    :return: Exit code of the collection
+    """
+    from software_inventory_collector.packaging import packaging_pool
+
+    context = CollectionContext.new(config.settings)
+    connecting = asyncio.ensure_future(connect_controllers(config, context.report))
+    try:
+        if dry_run:
+            controllers = await connecting
+            if not controllers or len(controllers) != len(config.controllers):
+                return EXIT_FAILURE
+            print("OK.")
+            return EXIT_OK
+
+        with packaging_pool(config.settings) as pool:
+            return await collect_cycle(config, connecting, replace(context, pool=pool))
+    finally:
+        await asyncio.wait([connecting])
+        if connecting.exception() is None:
+            for controller in connecting.result().values():
+                await controller.disconnect()
+
+
+def merge_reports(config: Config, paths: Sequence[str]) -> int:
+    """Merge run reports of collector shards and write the result.
+
+    Merged report is written like a report of unsharded collection, i.e. as JSON
+    next to the collected data and into the Prometheus textfile if enabled.
+
+    :param config: Collector's configuration
+    :param paths: Paths to JSON run reports of the shards
+    :return: Exit code of the merged collection
+    """
+    reports = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="UTF-8") as report_file:
+                reports.append(RunReport.from_dict(json.load(report_file)))
+        except (IOError, ValueError, KeyError) as exc:
+            print(f"Failed to load run report '{path}': {exc}")
+            return EXIT_FAILURE
+
+    config.settings.shard_index, config.settings.shard_count = 0, 1
+    context = CollectionContext.new(config.settings)
+    context = replace(context, report=RunReport.merge(reports, context.run_id))
+    write_report(config, context)
+    print(context.report.summary())
+    return context.report.exit_code
+
+
+async def _disconnect(controller: Optional["Controller"]) -> None:
+    """Disconnect controller, errors of already broken connection are ignored."""
+    if controller is None:
+        return
+    try:
+        await controller.disconnect()
+    except Exception as exc:  # pylint: disable=W0718
+        print(f"Failed to disconnect from juju controller: {exc}")
+
+
+async def _reconnect(
+    config: Config,
+    report: RunReport,
+    controllers: Dict[str, "Controller"],
+    watchers: Dict[str, "ModelWatcher"],
+) -> Dict[str, "Controller"]:
+    """Connect controllers whose connection dropped, with models they watched."""
+    for name, watcher in watchers.items():
+        if name not in controllers or not controllers[name].is_connected():
+            await watcher.close()
+    return await connect_controllers(config, report, controllers)
+
+
+async def _disconnect_all(
+    controllers: Dict[str, "Controller"], watchers: Dict[str, "ModelWatcher"]
+) -> None:
+    """Disconnect all watched models and controllers."""
+    for watcher in watchers.values():
+        await watcher.close()
+    for controller in controllers.values():
+        await _disconnect(controller)
+
+
+async def run_daemon(config: Config, schedule: Schedule) -> int:
+    """Collect data periodically until the collector receives SIGTERM or SIGINT.
+
+    Controller connections and HTTP connection pools are kept open between
+    collections. Controllers are reconnected before the next collection if their
+    connection dropped. Collection that is in progress when the signal arrives is
+    finished, so that no archive is left half-written. With `settings.watch_models`
+    enabled, Juju models stay connected as well and only models that changed, or
+    whose data are older than `settings.watch_max_staleness`, are queried again.
+    Packaging pool enabled by `settings.packaging_pool` is kept between collections.
+
+    :param config: Collector's configuration
+    :param schedule: Schedule of the collections
+    :return: Exit code of the collector
+    """
+    from software_inventory_collector.collector import get_http_session
+    from software_inventory_collector.packaging import packaging_pool
+    from software_inventory_collector.watcher import ModelWatcher
+
+    watchers: Dict[str, "ModelWatcher"] = {}
+    if config.settings.watch_models:
+        watchers = {
+            source.name: ModelWatcher(config.settings.watch_max_staleness)
+            for source in config.controllers
+        }
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    controllers: Dict[str, "Controller"] = {}
+    next_run = schedule.first_run(datetime.datetime.now())
+    try:
+        with get_http_session(config) as session, packaging_pool(config.settings) as pool:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(
+                        stop.wait(),
+                        timeout=max(
+                            (next_run - datetime.datetime.now()).total_seconds(), 0
+                        ),
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+                next_run = schedule.next_run(datetime.datetime.now())
+                context = replace(
+                    CollectionContext.new(config.settings, pool),
+                    session=session,
+                    watchers=watchers,
+                )
+                controllers = await _reconnect(
+                    config, context.report, controllers, watchers
+                )
+                await collect_cycle(config, controllers, context)
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(signum)
+        await _disconnect_all(controllers, watchers)
+
+    print("Collector stopped.")
+    return EXIT_OK
+
+
 def main() -> None:
     """Run software inventory collector."""
     args = parse_cli()
@@ -67,28 +517,40 @@ def main() -> None:
         print(f"Failed to load config: {exc}")
         sys.exit(1)
 
-    try:
-        controller: Controller = jasyncio.run(get_controller(config))
-    except JujuError as exc:
-        print(f"Failed to connect to juju controller: {exc}")
-        sys.exit(1)
+    if args.shard is not None:
+        try:
+            shard_index, shard_count = parse_shard(args.shard)
+        except ValueError as exc:
+            print(f"Failed to load config: {exc}")
+            sys.exit(1)
+        config.settings.shard_index, config.settings.shard_count = (
+            shard_index,
+            shard_count,
+        )
 
-    if args.dry_run:
-        jasyncio.run(controller.disconnect())
-        print("OK.")
+    if args.check_config:
+        print("Config OK.")
         sys.exit(0)
 
-    try:
-        get_exporter_data(config)
-        jasyncio.run(get_juju_data(config, controller))
-        exit_code = 0
-    except Exception as exc:  # pylint: disable=W0718
-        print(f"Failed to collect data: {exc}")
-        exit_code = 1
-    finally:
-        jasyncio.run(controller.disconnect())
+    if args.merge_reports:
+        sys.exit(merge_reports(config, args.merge_reports))
+
+    # python-libjuju requires its own event loop
+    from juju import jasyncio
+
+    if args.daemon and not args.dry_run:
+        schedule = parse_schedule(
+            config.settings.schedule_interval, config.settings.schedule_cron
+        )
+        if schedule is None:
+            print(
+                "Failed to load config: daemon mode requires 'settings.schedule_interval'"
+                " or 'settings.schedule_cron'"
+            )
+            sys.exit(1)
+        sys.exit(jasyncio.run(run_daemon(config, schedule)))
 
-    sys.exit(exit_code)
+    sys.exit(jasyncio.run(collect(config, args.dry_run)))
 
 
 if __name__ == "__main__":  # pragma: no cover
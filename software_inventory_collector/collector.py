@@ -1,105 +1,953 @@
 """Implementation of collector functions from various data sources."""
-import datetime
+import asyncio
+import hashlib
 import json
 import os
-import tarfile
-from tempfile import NamedTemporaryFile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import replace
+from functools import partial
+from http import HTTPStatus
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, cast
+from urllib.parse import urlsplit
 
 import requests
 import yaml
 from juju.controller import Controller
 from juju.errors import JujuAPIError
+from juju.model import Model
 
-from software_inventory_collector.config import Config
+from software_inventory_collector.archive import (
+    ArchiveSet,
+    archive_suffix,
+    writer_factory,
+)
+from software_inventory_collector.budget import Reservation
+from software_inventory_collector.config import (
+    Config,
+    _ConfigEndpoint,
+    _ConfigJujuController,
+    _ConfigTarget,
+)
+from software_inventory_collector.context import CollectionContext
+from software_inventory_collector.dedup import (
+    MANIFEST_SUFFIX,
+    BlobStore,
+    ManifestWriter,
+)
+from software_inventory_collector.delta import DeltaPlan, delta_tracker
+from software_inventory_collector.discovery import (
+    discover_exporters,
+    discovered_targets,
+    discovery_key,
+)
 from software_inventory_collector.exception import CollectionError
+from software_inventory_collector.payload import Payload, content_length
+from software_inventory_collector.report import LimitedArtifact, RunReport
+from software_inventory_collector.shard import shard_field, shard_of
+from software_inventory_collector.state import StateStore
 
-ENDPOINTS = ["dpkg", "snap", "kernel"]
+# File name field distinguishing archives of deltas from archives of full content
+DELTA_FIELD = "_@_delta"
 
-TIMESTAMP = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+# Field of Juju status that changes on every query, even if the model did not change
+STATUS_TIMESTAMP_FIELD = "controller-timestamp"
 
+# libyaml based loader is an order of magnitude faster than the pure-python one
+BundleLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-def _add_file_to_tar(file_name: str, content: str, tar_path: str) -> None:
-    """Write content to a file with specified name and add it to tarball.
 
-    :param file_name: Resulting name of the file in tarball
-    :param content: Content of the file
-    :param tar_path: path to tarball to which the file will be added.
-    :return: None
+def get_http_session(config: Config) -> requests.Session:
+    """Return HTTP session with pools of keep-alive connections to exporters.
+
+    Connection pools are kept for up to `settings.http_pool_size` exporter hosts and
+    each pool holds as many connections as there can be simultaneous requests to a
+    single host.
+
+    :param config: Collector's configuration
+    :return: HTTP session that should be shared by all exporter requests
     """
-    with NamedTemporaryFile() as temp_file:
-        temp_file.write(content.encode("UTF-8"))
-        temp_file.flush()
-        with tarfile.open(tar_path, "a", encoding="UTF-8") as tar_file:
-            tar_file.add(temp_file.name, arcname=file_name)
-
-
-def get_exporter_data(config: Config) -> None:
-    """Query exporter endpoints and collect data."""
-    for target in config.targets:
-        url = f"http://{target.endpoint}/"
-        tar = f"{target.customer}_@_{target.site}_@_{target.model}_@_{TIMESTAMP}.tar"
-        tar_path = os.path.join(config.settings.collection_path, tar)
-        for endpoint in ENDPOINTS:
-            try:
-                content = requests.get(url + endpoint, timeout=60)
-                content.raise_for_status()
-            except requests.exceptions.RequestException as exc:
-                raise CollectionError(
-                    f"Failed to collect data from target '{target.endpoint}': f{exc}"
-                ) from exc
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=config.settings.http_pool_size,
+        pool_maxsize=config.settings.max_concurrency_per_host,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _content_hash(content: bytes) -> str:
+    """Return hash identifying content of a collected artifact."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def _normalized_status(status: bytes) -> bytes:
+    """Return Juju status serialized as JSON without `STATUS_TIMESTAMP_FIELD`."""
+    try:
+        document = json.loads(status)
+    except ValueError:
+        return status
+    if not isinstance(document, dict) or STATUS_TIMESTAMP_FIELD not in document:
+        return status
+    del document[STATUS_TIMESTAMP_FIELD]
+    return json.dumps(document).encode("UTF-8")
+
+
+def _is_retryable(exc: requests.exceptions.RequestException) -> bool:
+    """Return False for errors that would not be fixed by repeating the request."""
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+    return True
+
+
+def _backoff_delay(config: Config, attempt: int) -> float:
+    """Return delay before next retry after failed attempt (counted from 0)."""
+    return config.settings.retry_backoff * (2**attempt)
+
+
+class _ExporterCollection:  # pylint: disable=R0902
+    """Resources shared by all requests of a single exporter data collection."""
+
+    def __init__(self, config: Config, context: CollectionContext) -> None:
+        """Initiate exporter collection.
+
+        :param config: Collector's configuration
+        :param context: Context of the collection run, with HTTP session and archives
+        """
+        self.config = config
+        self.session = cast(requests.Session, context.session)
+        self.schedule_state = context.state
+        self.state = context.state if config.settings.incremental else None
+        self.deltas = delta_tracker(config.settings, context.state)
+        self.report = context.report
+        self.archives = cast(ArchiveSet, context.archives)
+        self.context = context
+        self.host_limits: Dict[str, threading.BoundedSemaphore] = {}
+
+    def prepare(self, target: _ConfigTarget) -> None:
+        """Prepare host concurrency limit for the target."""
+        host = urlsplit(f"http://{target.endpoint}/").hostname or target.endpoint
+        if host not in self.host_limits:
+            self.host_limits[host] = threading.BoundedSemaphore(
+                self.config.settings.max_concurrency_per_host
+            )
+
+    def plan(
+        self, targets: List[_ConfigTarget]
+    ) -> List[Tuple[_ConfigTarget, _ConfigEndpoint]]:
+        """Prepare targets and return their endpoints that are due for collection.
+
+        :param targets: Exporter targets to collect
+        :return: Pairs of target and endpoint, ordered by descending priority of the
+            endpoint across all targets
+        """
+        planned = []
+        for target in targets:
+            self.prepare(target)
+            for endpoint in self.config.target_endpoints(target):
+                if self.is_due(target, endpoint):
+                    planned.append((target, endpoint))
+        return sorted(planned, key=lambda request: -request[1].priority)
+
+    def is_due(self, target: _ConfigTarget, endpoint: _ConfigEndpoint) -> bool:
+        """Return False if endpoint was collected less than `min_interval` ago."""
+        if not endpoint.min_interval or self.schedule_state is None:
+            return True
+        key = f"schedule/{target.endpoint}/{endpoint.name}"
+        collected_at = float(self.schedule_state.get(key).get("collected_at", 0))
+        return time.time() - collected_at >= endpoint.min_interval
+
+    def mark_collected(
+        self, target: _ConfigTarget, endpoint: _ConfigEndpoint, published: bool = False
+    ) -> None:
+        """Record endpoint collection for `min_interval`, now or once it's published."""
+        if not endpoint.min_interval or self.schedule_state is None:
+            return
+        update = partial(
+            self.schedule_state.set,
+            f"schedule/{target.endpoint}/{endpoint.name}",
+            {"collected_at": str(time.time())},
+        )
+        if published:
+            self.archives.on_published(self.tar_paths(target), update)
+        else:
+            update()
+
+    def _in_memory(self, size: int) -> int:
+        """Return how many bytes of a payload are held in memory until it's written.
+
+        Entries of payload's delta are held in memory even if the payload is spooled
+        on disk. Payload over `max_artifact_size` is written without delta.
+        """
+        max_size = self.context.limits.max_artifact_size
+        if self.deltas is None or (max_size is not None and size > max_size):
+            return min(size, self.config.settings.spool_threshold)
+        return size
+
+    def _fetch(
+        self, url: str, known: Dict[str, str], timeout: float, reservation: Reservation
+    ) -> Optional[Payload]:
+        """Download exporter response, conditionally if previous state is known.
+
+        :param url: URL of the exporter endpoint
+        :param known: State of the artifact from previous run
+        :param timeout: Timeout of the request in seconds
+        :param reservation: Memory reserved for the response, it's settled to the
+            size announced by response headers
+        :return: Spooled response body or None if it was not modified
+        """
+        headers = {}
+        if "etag" in known:
+            headers["If-None-Match"] = known["etag"]
+        if "last_modified" in known:
+            headers["If-Modified-Since"] = known["last_modified"]
+
+        host = urlsplit(url).hostname or url
+        with self.host_limits[host], self.session.get(
+            url, timeout=timeout, headers=headers, stream=True
+        ) as response:
+            response.raise_for_status()
+            if response.status_code == HTTPStatus.NOT_MODIFIED:
+                return None
+            size = content_length(response)
+            if size is not None:
+                reservation.settle(self._in_memory(size))
+            return Payload.from_response(
+                response,
+                self.config.settings.spool_threshold,
+                self.context.limits.max_artifact_size,
+            )
+
+    def tar_paths(self, target: _ConfigTarget) -> List[str]:
+        """Return paths to target's archives of full data and of deltas."""
+        return [
+            _target_tar_path(self.config, self.context, target, delta)
+            for delta in (False, True)
+        ]
+
+    def _write_member(
+        self,
+        target: _ConfigTarget,
+        name: str,
+        payload: Payload,
+        delta: bool = False,
+    ) -> bool:
+        """Write member into target's archive, within the byte budgets of the run.
+
+        Member that exceeds the budgets is truncated or skipped and recorded in the
+        run report.
+
+        :param target: Exporter target that provided the data
+        :param name: Name of the archive member
+        :param payload: Spooled content of the member
+        :param delta: Write member into target's archive of deltas
+        :return: True if the member was written completely
+        """
+        limits = self.context.limits
+        limits.disk.wait()
+        size = payload.artifact_size
+        allowed, reason = limits.admit(size)
+        if reason is not None:
+            artifact = LimitedArtifact(
+                name, size, allowed, reason, payload.size_is_lower_bound
+            )
+            self.report.limit("target", target.hostname, artifact)
+        if allowed or reason is None:
+            archive = self.archives.get(
+                _target_tar_path(self.config, self.context, target, delta)
+            )
+            with self.report.timer("write", "target", target.hostname):
+                archive.add_stream(name, payload.data, allowed)
+            self.report.add_bytes("target", target.hostname, written=allowed)
+        return reason is None
+
+    def _write_payload(
+        self, target: _ConfigTarget, name: str, payload: Payload, key: str
+    ) -> bool:
+        """Write payload, or its delta against the previous collection, into archives.
+
+        Payload becomes the previous collection once the archives are published. It's
+        read in chunks, but entries of its delta are held in memory. Partially
+        downloaded payload is written without delta, it's truncated or skipped.
+
+        :param target: Exporter target that provided the payload
+        :param name: Name of the archive member
+        :param payload: Spooled payload
+        :param key: Key identifying the artifact in state store
+        :return: True if the payload and its delta were written completely
+        """
+        if self.deltas is None or payload.partial:
+            return self._write_member(target, name, payload)
+
+        self.context.limits.disk.wait()
+        plan = self.deltas.plan_stream(key, payload.data)
+        try:
+            payload.data.seek(0)
+            complete = not plan.full or self._write_member(target, name, payload)
+            if plan.delta is not None:
+                delta = Payload.from_bytes(plan.delta)
+                if not self._write_member(target, name, delta, True):
+                    complete = False
+        except BaseException:
+            self.deltas.discard(plan)
+            raise
+        if not complete:
+            self.deltas.discard(plan)
+            return False
+        self.archives.on_published(
+            self.tar_paths(target),
+            partial(self.deltas.commit, plan),
+            partial(self.deltas.discard, plan),
+        )
+        return True
+
+    def collect_endpoint(self, target: _ConfigTarget, endpoint: _ConfigEndpoint) -> None:
+        """Query single exporter endpoint of a target and write response into archives.
+
+        Failed requests are retried up to `settings.retries` times with exponential
+        backoff. In incremental mode, artifacts that did not change since the previous
+        run are not written again. Endpoint counts as collected for its `min_interval`
+        only if it did not change or once it's written completely and published.
+
+        :param target: Exporter target to query
+        :param endpoint: Settings of the exporter endpoint
+        :return: None
+        """
+        url = f"http://{target.endpoint}/{endpoint.name}"
+        state_key = f"exporter/{target.endpoint}/{endpoint.name}"
+        known = self.state.get(state_key) if self.state else {}
+        retries = self.config.settings.retries
+        memory = self.context.limits.memory
+        memory.wait()
+        # spool holds at most `spool_threshold` bytes until the size is known
+        with memory.reserve(self.config.settings.spool_threshold) as reservation:
+            for attempt in range(retries + 1):
+                try:
+                    with self.report.timer("http", "target", target.hostname):
+                        payload = self._fetch(url, known, endpoint.timeout, reservation)
+                    break
+                except requests.exceptions.RequestException as exc:
+                    if attempt == retries or not _is_retryable(exc):
+                        raise CollectionError(
+                            f"Failed to collect data from target '{target.endpoint}': "
+                            f"{exc}"
+                        ) from exc
+                    time.sleep(_backoff_delay(self.config, attempt))
+
+            if payload is None:
+                self.mark_collected(target, endpoint)
+                return
+            self.report.add_bytes("target", target.hostname, transferred=payload.size)
+            reservation.settle(self._in_memory(payload.size))
+            with payload.data:
+                if self.state is not None and known.get("sha256") == payload.sha256:
+                    self.mark_collected(target, endpoint)
+                    return
+                file_name = (
+                    f"{endpoint.name}_@_{target.hostname}_@_{self.context.timestamp}"
+                )
+                complete = self._write_payload(target, file_name, payload, state_key)
+
+        if not complete:
+            return
+        self.mark_collected(target, endpoint, published=True)
+        if self.state is not None:
+            self.archives.on_published(
+                self.tar_paths(target), partial(self.state.set, state_key, payload.state)
+            )
+
+
+def get_blob_store_path(config: Config) -> str:
+    """Return path to blob store of deduplicated output."""
+    if config.settings.blob_store:
+        return config.settings.blob_store
+    return os.path.join(config.settings.collection_path, "blobs")
+
+
+def get_staging_path(config: Config, context: CollectionContext) -> str:
+    """Return path to directory in which tarballs of the run are built."""
+    staging_root = config.settings.staging_path or os.path.join(
+        config.settings.collection_path, ".staging"
+    )
+    return os.path.join(staging_root, context.run_id)
+
+
+def new_archive_set(config: Config, context: CollectionContext) -> ArchiveSet:
+    """Return empty set of archives using compression selected in config.
+
+    Tarballs are built in run's staging directory and published into
+    `settings.collection_path` when they are complete. They are compressed by
+    run's packaging pool, if there is one. With `settings.archive_index` enabled,
+    each tarball is published with its sidecar index. With `settings.dedup`
+    enabled, archives are manifests referencing content in a shared blob store
+    instead of tarballs.
+    """
+    settings = config.settings
+    factory = writer_factory(
+        settings.compression,
+        settings.compression_level,
+        context.pool,
+        settings.archive_index,
+    )
+    if not settings.dedup:
+        return ArchiveSet(factory, get_staging_path(config, context))
+
+    store = BlobStore(get_blob_store_path(config))
+    return ArchiveSet(lambda path: ManifestWriter(path, store))
+
+
+def in_shard(config: Config, key: str) -> bool:
+    """Return True if the source identified by the key belongs to collector's shard."""
+    settings = config.settings
+    if settings.shard_count == 1:
+        return True
+    return shard_of(key, settings.shard_count) == settings.shard_index
+
+
+def output_suffix(config: Config) -> str:
+    """Return file name suffix of archives, manifest suffix if dedup is enabled."""
+    if config.settings.dedup:
+        return MANIFEST_SUFFIX
+    return archive_suffix(config.settings.compression)
+
+
+def close_archives(archives: ArchiveSet, report: RunReport) -> None:
+    """Finalize and publish all archives, record their sizes in the run report.
+
+    Archive that can't be finalized or published is recorded as failed source.
+    """
+    for tar_path, error in archives.close().items():
+        if error is None:
+            report.add_archive(tar_path)
+        else:
+            print(f"Failed to finalize archive '{tar_path}': {error}")
+            report.record("archive", os.path.basename(tar_path), str(error))
+
+
+def exporter_targets(config: Config, state: Optional[StateStore]) -> List[_ConfigTarget]:
+    """Return exporter targets of the collector's shard, declared and discovered.
+
+    Targets discovered in models of the collector's shard are not split between
+    shards again, so that they are collected by the same shard as their model.
+
+    :param config: Collector's configuration
+    :param state: State store holding the discovered targets
+    :return: Exporter targets to collect
+    """
+    targets = [target for target in config.targets if in_shard(config, target.hostname)]
+    if config.settings.discover_targets and state is not None:
+        targets += discovered_targets(config, state)
+    return targets
+
+
+def _target_tar_path(
+    config: Config, context: CollectionContext, target: _ConfigTarget, delta: bool = False
+) -> str:
+    """Return path to tarball that holds data (or deltas) collected from target."""
+    shard = shard_field(config.settings.shard_index, config.settings.shard_count)
+    tar = (
+        f"{target.customer}_@_{target.site}_@_{target.model}_@_{context.timestamp}"
+        f"{shard}{DELTA_FIELD if delta else ''}{output_suffix(config)}"
+    )
+    return os.path.join(config.settings.collection_path, tar)
+
+
+def get_exporter_data(
+    config: Config,
+    context: Optional[CollectionContext] = None,
+    targets: Optional[List[_ConfigTarget]] = None,
+) -> RunReport:
+    """Query exporter endpoints and collect data.
+
+    Endpoints that are due for collection are queried concurrently by a pool of
+    worker threads, endpoints with higher priority first. Outcome, timing and
+    throughput of each target is recorded in the run report.
+
+    :param config: Collector's configuration
+    :param context: Context of the collection run, new run is started if not
+        provided. State store of the context is updated, but not saved, and its
+        archives are left open for the caller to finalize. HTTP session and
+        archives that the context doesn't have are created for the duration of the
+        collection.
+    :param targets: Exporter targets to query, defaults to declared and discovered
+        targets of collector's shard (see `exporter_targets`)
+    :return: Run report of the context
+    """
+    context = CollectionContext.new(config.settings) if context is None else context
+    if context.session is None:
+        with get_http_session(config) as session:
+            return get_exporter_data(config, replace(context, session=session), targets)
+    if context.archives is None:
+        archives = new_archive_set(config, context)
+        try:
+            return get_exporter_data(config, replace(context, archives=archives), targets)
+        finally:
+            close_archives(archives, context.report)
+
+    report = context.report
+    collection = _ExporterCollection(config, context)
+    targets = exporter_targets(config, context.state) if targets is None else targets
+    futures: Dict[Future, _ConfigTarget] = {}
+
+    with report.timer("exporter"), ThreadPoolExecutor(
+        max_workers=config.settings.max_concurrency
+    ) as executor:
+        for target, endpoint in collection.plan(targets):
+            future = executor.submit(collection.collect_endpoint, target, endpoint)
+            futures[future] = target
+
+        try:
+            for future in as_completed(futures):
+                error = future.exception()
+                report.record(
+                    "target",
+                    futures[future].hostname,
+                    None if error is None else str(error),
+                )
+        finally:
+            executor.shutdown()
 
-            file_name = f"{endpoint}_@_{target.hostname}_@_{TIMESTAMP}"
-            _add_file_to_tar(file_name, content.text, tar_path)
+    return report
 
 
-async def get_controller(config: Config) -> Controller:
-    """Return connected instance of Juju Controller."""
+async def get_controller(
+    config: Config, source: Optional[_ConfigJujuController] = None
+) -> Controller:
+    """Return connected instance of Juju Controller.
+
+    :param config: Collector's configuration
+    :param source: Controller to connect to, defaults to the first one in config
+    :return: Connected controller
+    """
+    source = config.controllers[0] if source is None else source
     controller = Controller()
     await controller.connect(
-        endpoint=config.juju_controller.endpoint,
-        username=config.juju_controller.username,
-        password=config.juju_controller.password,
-        cacert=config.juju_controller.ca_cert,
+        endpoint=source.endpoint,
+        username=source.username,
+        password=source.password,
+        cacert=source.ca_cert,
     )
     return controller
 
 
-async def get_juju_data(config: Config, controller: Controller) -> None:
-    """Query Juju controller and collect information about models."""
-    model_uuids = await controller.model_uuids()
+def model_key(config: Config, source: _ConfigJujuController, model_name: str) -> str:
+    """Return name identifying Juju model among models of all controllers.
+
+    Model name is used as it is if config declares only one controller, otherwise
+    it's qualified by the controller's name. Juju model names can't contain "_", so
+    the qualified names are unambiguous.
+    """
+    if len(config.controllers) == 1:
+        return model_name
+    return f"{source.name}_{model_name}"
+
+
+def juju_phase(config: Config, source: _ConfigJujuController) -> str:
+    """Return name of the run phase that collects models of the controller."""
+    if len(config.controllers) == 1:
+        return "juju"
+    return f"juju/{source.name}"
+
+
+def _model_tar_path(
+    config: Config, context: CollectionContext, model_name: str, delta: bool = False
+) -> str:
+    """Return path to tarball that holds data (or deltas) collected from Juju model."""
+    shard = shard_field(config.settings.shard_index, config.settings.shard_count)
+    tar = (
+        f"{config.settings.customer}_@_{config.settings.site}_@_{model_name}_"
+        f"@_{context.timestamp}{shard}{DELTA_FIELD if delta else ''}"
+        f"{output_suffix(config)}"
+    )
+    return os.path.join(config.settings.collection_path, tar)
+
+
+def _is_offers_overlay(document: Any) -> bool:
+    """Return True if bundle document is an overlay that only defines offers (SAAS).
+
+    Overlay is recognized either by top-level "offers" key, or by applications that
+    define nothing but their offers.
+    """
+    if not isinstance(document, dict):
+        return False
+    if "offers" in document:
+        return True
+    applications = document.get("applications")
+    if set(document) != {"applications"} or not isinstance(applications, dict):
+        return False
+    return bool(applications) and all(
+        isinstance(application, dict) and set(application) == {"offers"}
+        for application in applications.values()
+    )
+
+
+def bundle_documents(bundle: str) -> Iterator[Any]:
+    """Parse exported YAML bundle and return its documents except the offers overlay.
+
+    :param bundle: Bundle exported from Juju model, possibly with multiple documents
+    :return: Iterator over parsed bundle documents that should be collected
+    """
+    for document in yaml.load_all(bundle, Loader=BundleLoader):
+        if not _is_offers_overlay(document):
+            yield document
+
+
+def serialize_bundle(bundle: str) -> List[bytes]:
+    """Return collected documents of exported YAML bundle, each serialized as JSON."""
+    return [json.dumps(document).encode("UTF-8") for document in bundle_documents(bundle)]
+
+
+def serialize_model(status: Any, bundle: str) -> Tuple[str, List[bytes]]:
+    """Serialize model's status and bundle, it runs in workers of packaging pool.
+
+    :param status: Status of the model
+    :param bundle: Exported YAML bundle of the model
+    :return: Status serialized as JSON and bundle documents serialized as JSON
+    """
+    return status.to_json(), serialize_bundle(bundle)
+
+
+class _JujuCollection:  # pylint: disable=R0902
+    """Resources shared by collection of all models of a Juju controller."""
+
+    def __init__(
+        self,
+        config: Config,
+        controller: Controller,
+        context: CollectionContext,
+        source: Optional[_ConfigJujuController] = None,
+    ) -> None:
+        """Initiate Juju collection.
+
+        :param config: Collector's configuration
+        :param controller: Connected Juju controller
+        :param context: Context of the collection run, with archives
+        :param source: Config of the controller, defaults to the first one in config
+        """
+        self.config = config
+        self.controller = controller
+        state = context.state
+        self.state = state if config.settings.incremental else None
+        self.discovery_state = state if config.settings.discover_targets else None
+        self.deltas = delta_tracker(config.settings, state)
+        self.report = context.report
+        self.archives = cast(ArchiveSet, context.archives)
+        self.context = context
+        self.source = config.controllers[0] if source is None else source
+        self.watcher = context.watchers.get(self.source.name)
+        self.limit = asyncio.Semaphore(
+            self.source.max_model_connections or config.settings.max_model_connections
+        )
+
+    def key(self, model_name: str) -> str:
+        """Return name identifying the model in output, report and state."""
+        return model_key(self.config, self.source, model_name)
+
+    def discover(self, model_name: str, status: Any) -> None:
+        """Cache exporter targets found in the model's status in the state store."""
+        if self.discovery_state is None:
+            return
+        settings = self.config.settings
+        self.discovery_state.set(
+            discovery_key(self.source.endpoint, self.key(model_name)),
+            discover_exporters(status, settings.exporter_charm, settings.exporter_port),
+        )
+
+    def prune_discovered(self, model_names: List[str]) -> None:
+        """Forget exporter targets of controller's models that no longer exist."""
+        if self.discovery_state is None:
+            return
+        keep = {
+            discovery_key(self.source.endpoint, self.key(name)) for name in model_names
+        }
+        for key in self.discovery_state.items(discovery_key(self.source.endpoint, "")):
+            if key not in keep:
+                self.discovery_state.delete(key)
+
+    async def connect_model(self, model_name: str) -> Model:
+        """Connect to a single Juju model."""
+        with self.report.timer("connect", "model", self.key(model_name)):
+            return await self.controller.get_model(model_name)
+
+    async def query_model(self, model_name: str, model: Model) -> Tuple[Any, str]:
+        """Query status and bundle of a connected Juju model.
 
-    for model_name in model_uuids.keys():
-        model = await controller.get_model(model_name)
-        status = await model.get_status()
+        :param model_name: Name of the model
+        :param model: Connected model
+        :return: Model's status and exported bundle
+        """
+        with self.report.timer("get_status", "model", self.key(model_name)):
+            status = await model.get_status()
         try:
-            bundle = await model.export_bundle()
+            with self.report.timer("export_bundle", "model", self.key(model_name)):
+                bundle = await model.export_bundle()
         except JujuAPIError as exc:
             if str(exc) == "nothing to export as there are no applications":
                 bundle = "{}"
             else:
                 raise exc
-        await model.disconnect()
+        return status, bundle
 
-        status_file = f"juju_status_@_{model_name}_@_{TIMESTAMP}"
-        bundle_file = f"juju_bundle_@_{model_name}_@_{TIMESTAMP}"
-        tar = (
-            f"{config.settings.customer}_@_{config.settings.site}_@_{model_name}_"
-            f"@_{TIMESTAMP}.tar"
-        )
-        tar_path = os.path.join(
-            config.settings.collection_path,
-            tar,
+    async def fetch_model(self, model_name: str) -> Tuple[Any, str]:
+        """Fetch status and bundle of a single Juju model.
+
+        Number of simultaneous model queries is limited by `max_model_connections`
+        of the controller, or of the settings. Without a model watcher, model is
+        connected only for the duration of the query. With a watcher, model stays
+        connected and it's queried only if it changed since the previous collection.
+
+        :param model_name: Name of the model to collect
+        :return: Model's status and exported bundle
+        """
+        async with self.limit:
+            if self.watcher is not None:
+                return await self.watcher.fetch(
+                    model_name, self.connect_model, self.query_model
+                )
+
+            model = await self.connect_model(model_name)
+            try:
+                return await self.query_model(model_name, model)
+            finally:
+                await model.disconnect()
+
+    def _write_members(
+        self, key: str, members: List[Tuple[str, bytes, bool]]
+    ) -> Tuple[int, Set[str]]:
+        """Write members into model's tarballs, within the byte budgets of the run.
+
+        :param key: Name identifying the Juju model
+        :param members: Triples of member name prefix, member content and flag
+            whether the member belongs into model's tarball of deltas
+        :return: Number of written bytes and name prefixes of members that were
+            truncated or skipped
+        """
+        limited = set()
+        written = 0
+        for prefix, content, delta in members:
+            name = f"{prefix}_@_{key}_@_{self.context.timestamp}"
+            allowed, reason = self.context.limits.admit(len(content))
+            if reason is not None:
+                artifact = LimitedArtifact(name, len(content), allowed, reason)
+                self.report.limit("model", key, artifact)
+                limited.add(prefix)
+            if allowed or reason is None:
+                archive = self.archives.get(
+                    _model_tar_path(self.config, self.context, key, delta)
+                )
+                archive.add_bytes(name, content[:allowed])
+                written += allowed
+        return written, limited
+
+    def tar_paths(self, key: str) -> List[str]:
+        """Return paths to model's archives of full data and of deltas."""
+        return [
+            _model_tar_path(self.config, self.context, key, delta)
+            for delta in (False, True)
+        ]
+
+    def _status_members(
+        self, status_key: str, status: bytes, normalized: bytes
+    ) -> Tuple[List[Tuple[str, bytes, bool]], Optional[DeltaPlan]]:
+        """Return members holding model's status in full, as delta or both.
+
+        :param status_key: Key identifying the status in state store
+        :param status: Status of the model serialized as JSON
+        :param normalized: Normalized status, from which the delta is computed
+        :return: Members of the status and its delta plan, None if deltas are disabled
+        """
+        if self.deltas is None:
+            return [("juju_status", status, False)], None
+        plan = self.deltas.plan(status_key, normalized)
+        members = [("juju_status", status, False)] if plan.full else []
+        if plan.delta is not None:
+            members.append(("juju_status", plan.delta, True))
+        return members, plan
+
+    def _write_planned(
+        self, key: str, members: List[Tuple[str, bytes, bool]], plan: Optional[DeltaPlan]
+    ) -> Tuple[int, Set[str]]:
+        """Write members, commit status delta plan once they're published if complete."""
+        if self.deltas is None or plan is None:
+            return self._write_members(key, members)
+        try:
+            written, limited = self._write_members(key, members)
+        except BaseException:
+            self.deltas.discard(plan)
+            raise
+        if "juju_status" in limited:
+            self.deltas.discard(plan)
+        else:
+            self.archives.on_published(
+                self.tar_paths(key),
+                partial(self.deltas.commit, plan),
+                partial(self.deltas.discard, plan),
+            )
+        return written, limited
+
+    def write_model(
+        self,
+        model_name: str,
+        status_json: str,
+        bundle: str,
+        documents: Optional[List[bytes]] = None,
+    ) -> int:
+        """Write collected status and bundle of a Juju model into model's tarball.
+
+        In incremental mode, status and bundle are written only if their content
+        changed since the previous run. Tarball is not created if nothing changed.
+        Status is compared, and its delta computed, without `STATUS_TIMESTAMP_FIELD`.
+        State of the model advances only once its tarballs are published.
+        With `settings.delta` enabled, delta of the status against its previous
+        collection is written into model's tarball of deltas, next to or instead of
+        the full status.
+        Members that exceed byte budgets of the run are truncated or skipped and
+        recorded in the run report, they are written again by the next run.
+
+        :param model_name: Name of the Juju model
+        :param status_json: Status of the model serialized as JSON
+        :param bundle: Exported YAML bundle of the model
+        :param documents: Bundle documents serialized as JSON, they are parsed from
+            the bundle if not provided
+        :return: Number of bytes written into the tarball (before compression)
+        """
+        normalized = _normalized_status(status_json.encode("UTF-8"))
+        status_state = {"sha256": _content_hash(normalized)}
+        bundle_state = {"sha256": _content_hash(bundle.encode("UTF-8"))}
+        key = self.key(model_name)
+        status_key = f"juju/{key}/status"
+        bundle_key = f"juju/{key}/bundle"
+        members: List[Tuple[str, bytes, bool]] = []
+        plan = None
+
+        if self.state is None or self.state.get(status_key) != status_state:
+            members, plan = self._status_members(
+                status_key, status_json.encode("UTF-8"), normalized
+            )
+
+        if self.state is None or self.state.get(bundle_key) != bundle_state:
+            if documents is None:
+                documents = serialize_bundle(bundle)
+            members.extend(("juju_bundle", document, False) for document in documents)
+
+        written, limited = self._write_planned(key, members, plan)
+
+        if self.state is not None:
+            if "juju_status" not in limited:
+                self.archives.on_published(
+                    self.tar_paths(key), partial(self.state.set, status_key, status_state)
+                )
+            if "juju_bundle" not in limited:
+                self.archives.on_published(
+                    self.tar_paths(key), partial(self.state.set, bundle_key, bundle_state)
+                )
+
+        return written
+
+    async def collect_model(self, model_name: str) -> None:
+        """Collect status and bundle of a single Juju model.
+
+        Failed collection is retried up to `settings.retries` times with exponential
+        backoff. If the run has a packaging pool, status and bundle are serialized by
+        the pool and written by a worker thread, so that the event loop is free to do
+        network I/O.
+
+        :param model_name: Name of the model to collect
+        :return: None
+        """
+        retries = self.config.settings.retries
+        limits = self.context.limits
+        await limits.memory.wait_async()
+        for attempt in range(retries + 1):
+            try:
+                status, bundle = await self.fetch_model(model_name)
+                break
+            except Exception:  # pylint: disable=W0718
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(_backoff_delay(self.config, attempt))
+
+        self.discover(model_name, status)
+        pool = self.context.pool
+        if pool is None:
+            status_json, documents = status.to_json(), None
+        else:
+            status_json, documents = await pool.run(serialize_model, status, bundle)
+        transferred = len(status_json.encode("UTF-8")) + len(bundle.encode("UTF-8"))
+        limits.memory.add(transferred)
+        try:
+            await limits.disk.wait_async()
+            with self.report.timer("write", "model", self.key(model_name)):
+                if pool is None:
+                    written = self.write_model(model_name, status_json, bundle)
+                else:
+                    written = await asyncio.get_running_loop().run_in_executor(
+                        None, self.write_model, model_name, status_json, bundle, documents
+                    )
+        finally:
+            limits.memory.release(transferred)
+        self.report.add_bytes(
+            "model", self.key(model_name), transferred=transferred, written=written
         )
 
-        _add_file_to_tar(status_file, status.to_json(), tar_path)
 
-        bundle_yaml = yaml.load_all(bundle, Loader=yaml.FullLoader)
-        for data in bundle_yaml:
-            bundle_json = json.dumps(data)
-            # skip SAAS; multiple documents, we need to import only the bundle
-            if "offers" in bundle_json:
-                continue
+async def get_juju_data(
+    config: Config,
+    controller: Controller,
+    context: Optional[CollectionContext] = None,
+    source: Optional[_ConfigJujuController] = None,
+) -> RunReport:
+    """Query Juju controller and collect information about models.
+
+    Models of collector's shard are collected concurrently. Outcome, timing and
+    throughput of each model is recorded in the run report. Controller connection
+    is owned by the caller and it's left open.
+
+    :param config: Collector's configuration
+    :param controller: Connected Juju controller
+    :param context: Context of the collection run, new run is started if not
+        provided. State store of the context is updated, but not saved, and its
+        archives are left open for the caller to finalize. If the context has no
+        archives, they are created for the duration of the collection. Models are
+        connected only for the duration of the collection, unless the context has a
+        watcher of the controller.
+    :param source: Config of the controller, defaults to the first one in config
+    :return: Run report of the context
+    """
+    context = CollectionContext.new(config.settings) if context is None else context
+    if context.archives is None:
+        archives = new_archive_set(config, context)
+        try:
+            return await get_juju_data(
+                config, controller, replace(context, archives=archives), source
+            )
+        finally:
+            close_archives(archives, context.report)
 
-            _add_file_to_tar(bundle_file, bundle_json, tar_path)
+    report = context.report
+    source = config.controllers[0] if source is None else source
+    with report.timer(juju_phase(config, source)):
+        model_uuids = await controller.model_uuids()
+        collection = _JujuCollection(config, controller, context, source)
+        model_names = [
+            name for name in model_uuids if in_shard(config, collection.key(name))
+        ]
+        if collection.watcher is not None:
+            await collection.watcher.prune(model_names)
+        collection.prune_discovered(model_names)
+
+        results = await asyncio.gather(
+            *(collection.collect_model(name) for name in model_names),
+            return_exceptions=True,
+        )
+
+    for name, result in zip(model_names, results):
+        report.record(
+            "model",
+            collection.key(name),
+            str(result) if isinstance(result, Exception) else None,
+        )
 
-    await controller.disconnect()
+    return report
@@ -1,10 +1,75 @@
 """Module containing software-inventory-collector configuration classes."""
-from dataclasses import dataclass, fields
-from typing import ClassVar, Dict, List, get_args, get_origin
+from dataclasses import MISSING, Field, dataclass
+from dataclasses import field as dataclass_field
+from dataclasses import fields, replace
+from typing import Any, ClassVar, Dict, List, Optional, Union, get_args, get_origin
 
 from typing_extensions import Self
 
-from software_inventory_collector.exception import ConfigMissingKeyError
+from software_inventory_collector.archive import validate_compression
+from software_inventory_collector.budget import OVERSIZE_ACTIONS
+from software_inventory_collector.delta import validate_delta
+from software_inventory_collector.exception import ConfigError, ConfigMissingKeyError
+from software_inventory_collector.schedule import parse_schedule
+from software_inventory_collector.shard import validate_shard
+
+# Exporter endpoints collected when config does not declare any
+DEFAULT_ENDPOINTS = ["dpkg", "snap", "kernel"]
+
+
+def _has_default(field: Field) -> bool:
+    """Return True if dataclass field defines default value."""
+    return field.default is not MISSING or field.default_factory is not MISSING
+
+
+def _unwrap_optional(field_type: Any) -> Any:
+    """Return type X of field annotated as Optional[X], other types are unchanged."""
+    args = get_args(field_type)
+    if get_origin(field_type) is Union and len(args) == 2 and type(None) in args:
+        return args[0] if args[1] is type(None) else args[1]
+    return field_type
+
+
+def _check_type(name: str, value: Any, field_type: Any) -> None:
+    """Verify that value of a simple config field has the annotated type.
+
+    :param name: Qualified name of the field, used in the error message
+    :param value: Value of the field
+    :param field_type: Annotated type of the field
+    :raises ConfigError: If the value is not of the annotated type
+    """
+    # integer values are accepted for float fields, booleans only for bool fields
+    expected = (int, float) if field_type is float else (field_type,)
+    if not isinstance(value, expected) or (
+        isinstance(value, bool) and field_type is not bool
+    ):
+        raise ConfigError(f"{name} must be {field_type.__name__}, got {value!r}")
+
+
+def _field_value(name: str, field_type: Any, value: Any) -> Any:
+    """Return value of a config field, nested config structures are instantiated.
+
+    :param name: Qualified name of the field, used in error messages
+    :param field_type: Annotated type of the field
+    :param value: Raw value of the field from config data
+    :raises ConfigError: If the value does not match the annotated type
+    :return: Value of the field
+    """
+    if value is None:
+        if _unwrap_optional(field_type) is field_type:
+            raise ConfigError(f"{name} can't be null")
+        return value
+    field_type = _unwrap_optional(field_type)
+    if get_origin(field_type) == list:
+        # Handle lists of simple and nested config values
+        if not isinstance(value, list):
+            raise ConfigError(f"{name} must be a list, got {value!r}")
+        nested_type = get_args(field_type)[0]
+        return [_field_value(name, nested_type, item) for item in value]
+    if isinstance(field_type, type) and issubclass(field_type, _BaseConfig):
+        return field_type.from_dict(value)
+    _check_type(name, value, field_type)
+    return value
 
 
 @dataclass
@@ -22,26 +87,33 @@ class _BaseConfig:
             * simple nested config structures (section_name: {<section_configs>})
             * list of nested config structures (section_name:
                 [{section_config}, {section_config}]
+            * optional nested config structures, that can be null
+
+        Fields that define default value are optional and the default is used if
+        they are not present in the source data. Keys that don't match any field and
+        values of simple fields that don't match the field's type are rejected.
 
         :param source: Dict data from config to populate specific config subsection.
+        :raises ConfigMissingKeyError: If required key is missing
+        :raises ConfigError: If the source data are not valid
         :return: Initiated instance of the class.
         """
-        kwargs = {}
+        name = cls.NAME or "config"
+        if not isinstance(source, dict):
+            raise ConfigError(f"{name} must be a mapping, got {source!r}")
+        known = {field.name for field in fields(cls)}
+        unknown = sorted(str(key) for key in source if key not in known)
+        if unknown:
+            raise ConfigError(f"{name}: unknown keys {', '.join(unknown)}")
+
+        kwargs: Dict[str, Any] = {}
         try:
             for field in fields(cls):
-                origin_type = get_origin(field.type)
-                value = source[field.name]
-                if origin_type == list:
-                    # Handle lists of simple and nested config values
-                    nested_type = get_args(field.type)[0]
-                    if issubclass(nested_type, _BaseConfig):
-                        kwargs[field.name] = [nested_type(**value) for value in value]
-                    else:
-                        kwargs[field.name] = value
-                elif issubclass(field.type, _BaseConfig):
-                    kwargs[field.name] = field.type.from_dict(value)  # type: ignore
-                else:
-                    kwargs[field.name] = value
+                if field.name not in source and _has_default(field):
+                    continue
+                kwargs[field.name] = _field_value(
+                    f"{name}.{field.name}", field.type, source[field.name]
+                )
         except KeyError as exc:
             raise ConfigMissingKeyError(f"{cls.NAME}.{exc.args[0]}") from exc
 
@@ -49,7 +121,7 @@ class _BaseConfig:
 
 
 @dataclass
-class _ConfigSettings(_BaseConfig):
+class _ConfigSettings(_BaseConfig):  # pylint: disable=R0902
     """Definition for 'settings' subsection of main config."""
 
     NAME = "settings"
@@ -57,6 +129,141 @@ class _ConfigSettings(_BaseConfig):
     collection_path: str
     customer: str
     site: str
+    max_concurrency: int = 10
+    max_concurrency_per_host: int = 2
+    max_model_connections: int = 4
+    http_pool_size: int = 100
+    spool_threshold: int = 1024 * 1024
+    retries: int = 2
+    retry_backoff: float = 1.0
+    state_file: Optional[str] = None
+    incremental: bool = False
+    compression: str = "none"
+    compression_level: Optional[int] = None
+    archive_index: bool = False
+    run_report: bool = True
+    prometheus_textfile: Optional[str] = None
+    schedule_interval: Optional[float] = None
+    schedule_cron: Optional[str] = None
+    dedup: bool = False
+    blob_store: Optional[str] = None
+    staging_path: Optional[str] = None
+    shard_index: int = 0
+    shard_count: int = 1
+    max_artifact_size: Optional[int] = None
+    max_run_size: Optional[int] = None
+    oversize_action: str = "skip"
+    max_in_flight: Optional[int] = None
+    min_free_space: int = 0
+    free_space_timeout: float = 60
+    watch_models: bool = False
+    watch_max_staleness: float = 3600
+    discover_targets: bool = False
+    exporter_charm: str = "inventory-exporter"
+    exporter_port: int = 8675
+    packaging_pool: bool = False
+    packaging_workers: Optional[int] = None
+    delta: str = "off"
+    delta_index: Optional[str] = None
+    delta_baseline_interval: float = 86400
+
+    def __post_init__(self) -> None:
+        """Validate values of the settings."""
+        limits = [
+            self.max_concurrency,
+            self.max_concurrency_per_host,
+            self.max_model_connections,
+            self.http_pool_size,
+            self.spool_threshold,
+            1 if self.packaging_workers is None else self.packaging_workers,
+        ]
+        if any(limit < 1 for limit in limits):
+            raise ConfigError(
+                f"{self.NAME}: concurrency, pool and spool limits must be positive"
+            )
+        if self.retries < 0 or self.retry_backoff < 0:
+            raise ConfigError(f"{self.NAME}: retries and backoff can't be negative")
+        stateful = [
+            option
+            for option in ("incremental", "discover_targets", "delta")
+            if getattr(self, option) not in (False, "off")
+        ]
+        if stateful and not self.state_file:
+            raise ConfigError(f"{self.NAME}: {stateful[0]} requires state_file")
+        budgets = [self.max_artifact_size, self.max_run_size, self.max_in_flight]
+        if any(budget is not None and budget < 1 for budget in budgets):
+            raise ConfigError(f"{self.NAME}: size and memory budgets must be positive")
+        if self.min_free_space < 0 or self.free_space_timeout < 0:
+            raise ConfigError(
+                f"{self.NAME}: min_free_space and free_space_timeout can't be negative"
+            )
+        if self.watch_max_staleness <= 0:
+            raise ConfigError(f"{self.NAME}: watch_max_staleness must be positive")
+        if self.oversize_action not in OVERSIZE_ACTIONS:
+            raise ConfigError(
+                f"{self.NAME}: oversize_action must be one of {OVERSIZE_ACTIONS}"
+            )
+        try:
+            validate_compression(self.compression, self.compression_level)
+            parse_schedule(self.schedule_interval, self.schedule_cron)
+            validate_shard(self.shard_index, self.shard_count)
+            validate_delta(self.delta, self.delta_baseline_interval)
+        except ValueError as exc:
+            raise ConfigError(f"{self.NAME}: {exc}") from exc
+
+
+@dataclass
+class _ConfigEndpoint(_BaseConfig):
+    """Definition for 'endpoints' subsection of main config.
+
+    Endpoints with higher priority are queried first. Endpoint with `min_interval`
+    is collected from each target at most once per `min_interval` seconds, it's
+    skipped by runs that come sooner.
+    """
+
+    NAME = "endpoint"
+
+    name: str
+    timeout: float = 60
+    priority: int = 0
+    enabled: bool = True
+    min_interval: float = 0
+
+    def __post_init__(self) -> None:
+        """Validate values of the endpoint settings."""
+        if self.timeout <= 0:
+            raise ConfigError(f"{self.NAME} '{self.name}': timeout must be positive")
+        if self.min_interval < 0:
+            raise ConfigError(
+                f"{self.NAME} '{self.name}': min_interval can't be negative"
+            )
+
+
+@dataclass
+class _ConfigEndpointOverride(_BaseConfig):
+    """Definition for 'endpoints' subsection of a target.
+
+    Settings that are defined override settings of the same endpoint in the main
+    config. Endpoint that is not declared in the main config is added to the target,
+    with default values of the settings that are not defined.
+    """
+
+    NAME = "endpoint_override"
+
+    name: str
+    timeout: Optional[float] = None
+    priority: Optional[int] = None
+    enabled: Optional[bool] = None
+    min_interval: Optional[float] = None
+
+    def apply(self, endpoint: _ConfigEndpoint) -> _ConfigEndpoint:
+        """Return endpoint settings with overrides applied."""
+        changes = {
+            field.name: getattr(self, field.name)
+            for field in fields(self)
+            if field.name != "name" and getattr(self, field.name) is not None
+        }
+        return replace(endpoint, **changes)
 
 
 @dataclass
@@ -70,11 +277,18 @@ class _ConfigTarget(_BaseConfig):
     customer: str
     site: str
     model: str
+    endpoints: List[_ConfigEndpointOverride] = dataclass_field(default_factory=list)
 
 
 @dataclass
 class _ConfigJujuController(_BaseConfig):
-    """Definition for 'juju_controller' subsection of main config."""
+    """Definition for 'juju_controller' and 'juju_controllers' subsections.
+
+    Name of the controller is required only if the config declares more than one
+    controller, it then qualifies names of the controller's models. Each controller
+    can limit its number of simultaneous model connections, otherwise
+    `settings.max_model_connections` applies.
+    """
 
     NAME = "juju_controller"
 
@@ -82,12 +296,70 @@ class _ConfigJujuController(_BaseConfig):
     ca_cert: str
     username: str
     password: str
+    name: str = ""
+    max_model_connections: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        """Validate values of the controller settings."""
+        if self.max_model_connections is not None and self.max_model_connections < 1:
+            raise ConfigError(
+                f"{self.NAME} '{self.name or self.endpoint}': "
+                "max_model_connections must be positive"
+            )
 
 
 @dataclass
 class Config(_BaseConfig):
-    """Object representation of a complete config file."""
+    """Object representation of a complete config file.
+
+    Exporter targets can be declared in `targets`, or discovered from status of
+    Juju models if `settings.discover_targets` is enabled, or both.
+    """
 
     settings: _ConfigSettings
-    targets: List[_ConfigTarget]
-    juju_controller: _ConfigJujuController
+    targets: List[_ConfigTarget] = dataclass_field(default_factory=list)
+    juju_controller: Optional[_ConfigJujuController] = None
+    juju_controllers: List[_ConfigJujuController] = dataclass_field(default_factory=list)
+    endpoints: List[_ConfigEndpoint] = dataclass_field(
+        default_factory=lambda: [_ConfigEndpoint(name) for name in DEFAULT_ENDPOINTS]
+    )
+
+    def __post_init__(self) -> None:
+        """Validate controllers and endpoints of the config and of its targets."""
+        controllers = self.controllers
+        if not controllers:
+            raise ConfigError("config must define juju_controller or juju_controllers")
+        controller_names = {controller.name for controller in controllers} - {""}
+        if len(controllers) > 1 and len(controller_names) != len(controllers):
+            raise ConfigError("juju_controllers: controllers must have unique names")
+
+        names = [endpoint.name for endpoint in self.endpoints]
+        if len(set(names)) != len(names):
+            raise ConfigError("endpoints: endpoint names must be unique")
+        # resolving endpoints of every target validates their overrides
+        min_intervals = [
+            endpoint.min_interval
+            for target in self.targets
+            for endpoint in self.target_endpoints(target)
+        ]
+        if any(min_intervals) and not self.settings.state_file:
+            raise ConfigError("endpoints: min_interval requires settings.state_file")
+
+    @property
+    def controllers(self) -> List[_ConfigJujuController]:
+        """Return all Juju controllers declared in the config."""
+        single = [self.juju_controller] if self.juju_controller is not None else []
+        return single + self.juju_controllers
+
+    def target_endpoints(self, target: _ConfigTarget) -> List[_ConfigEndpoint]:
+        """Return enabled endpoints of the target, ordered by descending priority.
+
+        :param target: Exporter target
+        :return: Endpoint settings with target's overrides applied
+        """
+        endpoints = {endpoint.name: endpoint for endpoint in self.endpoints}
+        for override in target.endpoints:
+            base = endpoints.get(override.name, _ConfigEndpoint(override.name))
+            endpoints[override.name] = override.apply(base)
+        enabled = [endpoint for endpoint in endpoints.values() if endpoint.enabled]
+        return sorted(enabled, key=lambda endpoint: -endpoint.priority)
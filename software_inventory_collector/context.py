@@ -0,0 +1,86 @@
+"""Module containing identity of a single collection run."""
+import datetime
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Optional
+
+from typing_extensions import Self
+
+from software_inventory_collector.budget import DiskGuard, InFlightLimiter, RunLimits
+from software_inventory_collector.config import _ConfigSettings
+from software_inventory_collector.report import RunReport
+from software_inventory_collector.state import StateStore
+
+if TYPE_CHECKING:  # pragma: no cover
+    import requests
+
+    from software_inventory_collector.archive import ArchiveSet
+    from software_inventory_collector.packaging import PackagingPool
+    from software_inventory_collector.watcher import ModelWatcher
+
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+@dataclass(frozen=True)
+class CollectionContext:  # pylint: disable=R0902
+    """Identity of a single collection run and resources shared by all of its phases.
+
+    Timestamp is used in names of all files produced by the run. Run ID is unique
+    even for runs started within the same second, it names the run's staging
+    directory and it's recorded in the run report. Limits hold byte budgets and
+    backpressure that all phases of the run draw from. Packaging pool, if there is
+    one, serializes and compresses data collected by all phases of the run.
+
+    Report receives outcome of every source of the run and state store, if there is
+    one, holds state persisted between runs. Archives receive data of all phases and
+    HTTP session is shared by all exporter requests, phases that don't find them in
+    the context create their own for their duration. Watchers keep Juju models
+    connected between runs, by controller name.
+    """
+
+    timestamp: str
+    run_id: str
+    limits: RunLimits = field(default_factory=RunLimits, compare=False, repr=False)
+    pool: Optional["PackagingPool"] = field(default=None, compare=False, repr=False)
+    report: RunReport = field(default_factory=RunReport, compare=False, repr=False)
+    state: Optional[StateStore] = field(default=None, compare=False, repr=False)
+    archives: Optional["ArchiveSet"] = field(default=None, compare=False, repr=False)
+    session: Optional["requests.Session"] = field(default=None, compare=False, repr=False)
+    watchers: Dict[str, "ModelWatcher"] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    @classmethod
+    def new(
+        cls,
+        settings: Optional[_ConfigSettings] = None,
+        pool: Optional["PackagingPool"] = None,
+    ) -> Self:
+        """Return context of a run starting now.
+
+        :param settings: Settings that define limits of the run, run is unlimited
+            if they are not provided
+        :param pool: Packaging pool used by the run, data are packaged by the
+            threads that collect them if not provided
+        """
+        limits = RunLimits()
+        if settings is not None:
+            limits = RunLimits(
+                max_artifact_size=settings.max_artifact_size,
+                max_run_size=settings.max_run_size,
+                oversize_action=settings.oversize_action,
+                memory=InFlightLimiter(settings.max_in_flight),
+                disk=DiskGuard(
+                    settings.collection_path,
+                    settings.min_free_space,
+                    settings.free_space_timeout,
+                ),
+            )
+        run_id = uuid.uuid4().hex
+        return cls(
+            timestamp=datetime.datetime.now().strftime(TIMESTAMP_FORMAT),
+            run_id=run_id,
+            limits=limits,
+            pool=pool,
+            report=RunReport(run_id),
+        )
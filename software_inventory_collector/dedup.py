@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Module containing content-addressed storage of collected files.
+
+Instead of a tarball, each collected archive is represented by a JSON manifest that
+maps names of its members to SHA-256 hashes of their content. Content itself is
+stored once in a blob store shared by all manifests (and by all collection runs),
+so identical payloads reported by many hosts take space only once. Classic tarball
+layout can be rebuilt from a manifest with `rebuild_tarball` or from the command
+line:
+
+    software-inventory-rebuild -o <output_dir> <manifest> [<manifest> ...]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import TracebackType
+from typing import BinaryIO, Dict, List, Optional, Type
+
+from typing_extensions import Self
+
+from software_inventory_collector.archive import (
+    COMPRESSIONS,
+    ArchiveWriter,
+    archive_suffix,
+    publish,
+    validate_compression,
+)
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_FORMAT = 1
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """Directory storing file content under the SHA-256 hash of the content.
+
+    Blobs are spread into subdirectories by the first two characters of their hash.
+    Blob is written into a temporary file first and moved into place only when it's
+    complete, so concurrent writers (threads or processes) of the same content never
+    expose partially written blob.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initiate blob store, directory is created when the first blob is added.
+
+        :param path: Path to the root directory of the store
+        """
+        self.path = path
+
+    def blob_path(self, digest: str) -> str:
+        """Return path to the blob with given SHA-256 hash."""
+        return os.path.join(self.path, digest[:2], digest)
+
+    def put_bytes(self, data: bytes) -> str:
+        """Store content taken from memory.
+
+        :param data: Content to store
+        :return: SHA-256 hash of the content
+        """
+        return self.put_stream(io.BytesIO(data), len(data))
+
+    def put_stream(self, stream: BinaryIO, size: int) -> str:
+        """Store content read from file-like object, unless the store already has it.
+
+        :param stream: File-like object from which exactly `size` bytes will be read
+        :param size: Size of the content
+        :raises OSError: If the stream ends before `size` bytes are read
+        :return: SHA-256 hash of the content
+        """
+        os.makedirs(self.path, exist_ok=True)
+        sha256 = hashlib.sha256()
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".blob-")
+        try:
+            with os.fdopen(temp_fd, "wb") as temp_file:
+                remaining = size
+                while remaining > 0:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise OSError("unexpected end of data")
+                    sha256.update(chunk)
+                    temp_file.write(chunk)
+                    remaining -= len(chunk)
+
+            digest = sha256.hexdigest()
+            blob_path = self.blob_path(digest)
+            if os.path.exists(blob_path):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, blob_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return digest
+
+    def open(self, digest: str) -> BinaryIO:
+        """Return content of the blob with given SHA-256 hash opened for reading."""
+        return open(self.blob_path(digest), "rb")
+
+
+class ManifestWriter:
+    """Manifest that replaces tarball when deduplicated output is enabled.
+
+    Writer has the same interface as `ArchiveWriter`. Content of added members is
+    stored in the blob store immediately, manifest listing the members is written
+    only once, when the writer is closed. Manifest is written into a hidden temporary
+    file and published atomically, existing manifest is never replaced (see
+    `publish`). Adding members is thread-safe.
+    """
+
+    def __init__(self, path: str, store: BlobStore) -> None:
+        """Initiate manifest writer.
+
+        :param path: Path to the resulting manifest
+        :param store: Blob store that receives content of the members
+        """
+        self.path = path
+        self.store = store
+        self._lock = threading.Lock()
+        self._members: List[Dict] = []
+
+    def __enter__(self) -> Self:
+        """Return manifest writer as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Write manifest when leaving context."""
+        self.close()
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        """Add member with content taken from memory.
+
+        :param name: Name of the member
+        :param data: Content of the member
+        :return: None
+        """
+        self.add_stream(name, io.BytesIO(data), len(data))
+
+    def add_stream(
+        self, name: str, stream: BinaryIO, size: int, mtime: Optional[int] = None
+    ) -> None:
+        """Add member with content read from file-like object.
+
+        :param name: Name of the member
+        :param stream: File-like object from which exactly `size` bytes will be read
+        :param size: Size of the member
+        :param mtime: Modification time of the member, defaults to now
+        :return: None
+        """
+        digest = self.store.put_stream(stream, size)
+        member = {
+            "name": name,
+            "sha256": digest,
+            "size": size,
+            "mtime": int(time.time()) if mtime is None else mtime,
+        }
+        with self._lock:
+            self._members.append(member)
+
+    def close(self) -> None:
+        """Write the manifest. Closing writer without members is a no-op.
+
+        If a manifest already exists at `path`, manifest is published under a numbered
+        name and `path` is updated to it. Manifest that can't be published is kept in
+        its temporary file.
+        """
+        with self._lock:
+            members, self._members = self._members, []
+        if not members:
+            return
+
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "blob_store": os.path.relpath(self.store.path, os.path.dirname(self.path)),
+            "members": members,
+        }
+        directory, name = os.path.split(self.path)
+        # temporary file is unique, so that runs writing the same manifest don't clash
+        temp_fd, temp_path = tempfile.mkstemp(
+            dir=directory or ".", prefix=f".{name}.", suffix=".tmp"
+        )
+        with os.fdopen(temp_fd, "w", encoding="UTF-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.chmod(temp_path, 0o644)
+        self.path = publish(temp_path, self.path)
+
+
+def rebuild_tarball(
+    manifest_path: str,
+    output_path: str,
+    compression: str = "none",
+    level: Optional[int] = None,
+    blob_store: Optional[str] = None,
+) -> None:
+    """Rebuild tarball with the classic layout from a manifest and blob store.
+
+    :param manifest_path: Path to the manifest
+    :param output_path: Path to the resulting tarball
+    :param compression: Compression codec of the tarball
+    :param level: Compression level, or None to use codec's default
+    :param blob_store: Path to the blob store, defaults to the one recorded in the
+        manifest (relative to manifest's location)
+    :raises ValueError: If the manifest format is not supported
+    :return: None
+    """
+    with open(manifest_path, "r", encoding="UTF-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"unsupported manifest format in '{manifest_path}'")
+
+    if blob_store is None:
+        blob_store = os.path.join(os.path.dirname(manifest_path), manifest["blob_store"])
+    store = BlobStore(blob_store)
+    with ArchiveWriter(output_path, compression, level) as archive:
+        for member in manifest["members"]:
+            with store.open(member["sha256"]) as blob:
+                archive.add_stream(member["name"], blob, member["size"], member["mtime"])
+
+
+def rebuilt_tarball_name(manifest_path: str, compression: str) -> str:
+    """Return file name of the tarball rebuilt from the manifest."""
+    name = os.path.basename(manifest_path)
+    if name.endswith(MANIFEST_SUFFIX):
+        name = name[: -len(MANIFEST_SUFFIX)]
+    return f"{name}{archive_suffix(compression)}"
+
+
+def parse_cli() -> argparse.Namespace:
+    """Parse CLI arguments."""
+    arg_parser = argparse.ArgumentParser(
+        "Rebuild tarballs from deduplicated collection output"
+    )
+    arg_parser.add_argument("manifests", nargs="+", help="Manifest files to rebuild.")
+    arg_parser.add_argument(
+        "-o", "--output-dir", default=".", help="Directory for the rebuilt tarballs."
+    )
+    arg_parser.add_argument(
+        "--compression",
+        default="none",
+        choices=list(COMPRESSIONS),
+        help="Compression of the rebuilt tarballs.",
+    )
+    arg_parser.add_argument(
+        "--blob-store",
+        default=None,
+        help="Blob store path, defaults to the one recorded in each manifest.",
+    )
+    return arg_parser.parse_args()
+
+
+def main() -> None:
+    """Rebuild tarballs from manifests given on the command line."""
+    args = parse_cli()
+    try:
+        validate_compression(args.compression, None)
+    except ValueError as exc:
+        print(f"Failed to rebuild tarballs: {exc}")
+        sys.exit(1)
+
+    failed = False
+    for manifest_path in args.manifests:
+        output_path = os.path.join(
+            args.output_dir, rebuilt_tarball_name(manifest_path, args.compression)
+        )
+        try:
+            rebuild_tarball(
+                manifest_path, output_path, args.compression, blob_store=args.blob_store
+            )
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"Failed to rebuild '{manifest_path}': {exc}")
+            failed = True
+            continue
+        print(output_path)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,340 @@
+"""Module containing deltas of collected artifacts against their previous collection.
+
+Delta of an artifact lists entries that were added, removed or changed since the
+previous collection of the artifact. Entries of JSON documents (e.g. Juju status) are
+their scalar values identified by JSON pointers, items of lists of objects that have
+a "name" are identified by the name instead of their position. Entries of text
+payloads (e.g. package listings) are their lines, identified by the package name,
+i.e. the second field of `dpkg -l` lines and the first field of other lines.
+"""
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
+
+from software_inventory_collector.index import HashingReader
+from software_inventory_collector.state import StateStore
+
+if TYPE_CHECKING:  # pragma: no cover
+    from software_inventory_collector.config import _ConfigSettings
+
+DELTA_MODES = ["off", "alongside", "instead"]
+DELTA_FORMAT = 1
+# Prefix of state store keys that hold delta state of the artifacts
+DELTA_PREFIX = "delta/"
+
+CHUNK_SIZE = 64 * 1024
+
+# Package state at the start of `dpkg -l` lines, e.g. "ii" or "rc"
+_DPKG_STATE = re.compile(r"[uihrp][ncUHFWti]R?")
+
+
+def validate_delta(mode: str, baseline_interval: float) -> None:
+    """Verify delta mode and interval of full baselines.
+
+    :param mode: Delta mode, one of `DELTA_MODES`
+    :param baseline_interval: Seconds between full baselines of an artifact
+    :raises ValueError: If mode is not supported or interval is negative
+    :return: None
+    """
+    if mode not in DELTA_MODES:
+        raise ValueError(f"delta must be one of {DELTA_MODES}")
+    if baseline_interval < 0:
+        raise ValueError("delta_baseline_interval can't be negative")
+
+
+def _escape(token: str) -> str:
+    """Escape reference token of JSON pointer."""
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _json_entries(value: Any, pointer: str, entries: Dict[str, Any]) -> None:
+    """Add scalar values of JSON document, and its empty containers, to entries."""
+    if isinstance(value, dict):
+        items = [(str(key), item) for key, item in value.items()]
+    elif isinstance(value, list):
+        named = all(isinstance(item, dict) and "name" in item for item in value)
+        items = [
+            (str(item["name"]) if named else str(index), item)
+            for index, item in enumerate(value)
+        ]
+    else:
+        entries[pointer] = value
+        return
+
+    if not items:
+        entries[pointer] = value
+    for token, item in items:
+        _json_entries(item, f"{pointer}/{_escape(token)}", entries)
+
+
+def _text_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Return lines of text payload that is read in chunks."""
+    pending: List[bytes] = []
+    for chunk in chunks:
+        if b"\n" not in chunk:
+            pending.append(chunk)
+            continue
+        *lines, last = b"".join([*pending, chunk]).split(b"\n")
+        pending = [last]
+        for line in lines:
+            yield from line.decode("UTF-8", errors="replace").splitlines()
+    yield from b"".join(pending).decode("UTF-8", errors="replace").splitlines()
+
+
+def _text_entries(lines: Iterable[str]) -> Dict[str, str]:
+    """Return non-empty lines of text payload, by package name."""
+    entries: Dict[str, str] = {}
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if len(fields) > 1 and _DPKG_STATE.fullmatch(fields[0]):
+            key = fields[1]
+        else:
+            key = fields[0]
+        entries[line if key in entries else key] = line
+    return entries
+
+
+def stream_entries(stream: BinaryIO) -> Dict[str, Any]:
+    """Return entries of collected artifact read from file-like object.
+
+    Content that starts with "{" or "[" and is a valid JSON document is read whole
+    and parsed as JSON, other content is read in chunks and parsed as text.
+
+    :param stream: File-like object with content of the artifact
+    :return: Scalar values by JSON pointer, or lines by package name
+    """
+    head = stream.read(CHUNK_SIZE)
+    chunks = itertools.chain([head], iter(lambda: stream.read(CHUNK_SIZE), b""))
+    if head.lstrip()[:1] in (b"{", b"["):
+        content = b"".join(chunks)
+        try:
+            document = json.loads(content)
+        except ValueError:
+            return _text_entries(_text_lines([content]))
+        json_entries: Dict[str, Any] = {}
+        _json_entries(document, "", json_entries)
+        return json_entries
+    return _text_entries(_text_lines(chunks))
+
+
+def _delta_document(
+    previous: Tuple[Dict[str, Any], str], current: Tuple[Dict[str, Any], str]
+) -> bytes:
+    """Return delta of current content of an artifact against its previous content.
+
+    :param previous: Entries and SHA-256 hash of the previous collection
+    :param current: Entries and SHA-256 hash of this collection
+    :return: JSON document with hashes of both contents and with entries that were
+        added, removed and changed (as pairs of previous and current value)
+    """
+    (old, base), (new, sha256) = previous, current
+    document = {
+        "format": DELTA_FORMAT,
+        "base": base,
+        "sha256": sha256,
+        "added": {key: value for key, value in new.items() if key not in old},
+        "removed": {key: value for key, value in old.items() if key not in new},
+        "changed": {
+            key: [old[key], value]
+            for key, value in new.items()
+            if key in old and old[key] != value
+        },
+    }
+    return json.dumps(document, sort_keys=True).encode("UTF-8")
+
+
+class DeltaIndex:
+    """Local directory holding the last collected content of each artifact."""
+
+    def __init__(self, path: str) -> None:
+        """Initiate index, directory is created when the first content is stored.
+
+        :param path: Path to the directory of the index
+        """
+        self.path = path
+
+    def _content_path(self, key: str) -> str:
+        """Return path to the file that holds content of the artifact."""
+        return os.path.join(self.path, hashlib.sha256(key.encode("UTF-8")).hexdigest())
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Return last content of the artifact opened for reading, or None."""
+        try:
+            return open(self._content_path(key), "rb")
+        except OSError:
+            return None
+
+    def stage(self, stream: BinaryIO) -> str:
+        """Copy content from file-like object into a temporary file in the index.
+
+        :param stream: File-like object with the content
+        :return: Path to the temporary file, it's passed to `put_staged` or `discard`
+        """
+        os.makedirs(self.path, exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".content-")
+        try:
+            with os.fdopen(temp_fd, "wb") as content_file:
+                shutil.copyfileobj(stream, content_file, CHUNK_SIZE)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return temp_path
+
+    def put_staged(self, key: str, staged: str) -> None:
+        """Atomically replace last content of the artifact with staged content."""
+        try:
+            os.replace(staged, self._content_path(key))
+        except BaseException:
+            self.discard(staged)
+            raise
+
+    @staticmethod
+    def discard(staged: str) -> None:
+        """Remove staged content that will not be put into the index."""
+        try:
+            os.unlink(staged)
+        except FileNotFoundError:
+            pass
+
+
+@dataclass
+class DeltaPlan:
+    """Decision how to write new content of an artifact.
+
+    Content is written in full if `full` is True, delta is written if it's not None.
+    New content is staged in the delta index until the plan is committed or
+    discarded.
+    """
+
+    key: str
+    staged: str
+    full: bool
+    delta: Optional[bytes]
+    state: Dict[str, str]
+
+
+class DeltaTracker:
+    """Deltas of collected artifacts against their content in the delta index.
+
+    Delta is written whenever the previous content of the artifact is known. Full
+    content is written always in "alongside" mode. In "instead" mode, it's written
+    only as a baseline, i.e. if previous content is not known or if the last
+    baseline of the artifact is at least `baseline_interval` seconds old.
+    """
+
+    def __init__(
+        self, mode: str, index: DeltaIndex, state: StateStore, baseline_interval: float
+    ) -> None:
+        """Initiate tracker.
+
+        :param mode: Delta mode, "alongside" or "instead"
+        :param index: Index of the last collected content of artifacts
+        :param state: State store that holds hashes and baseline times of artifacts
+        :param baseline_interval: Seconds between full baselines in "instead" mode
+        """
+        self.mode = mode
+        self.index = index
+        self.state = state
+        self.baseline_interval = baseline_interval
+
+    def plan(self, key: str, content: bytes) -> DeltaPlan:
+        """Decide how to write new content of the artifact, taken from memory.
+
+        :param key: Key identifying the artifact
+        :param content: New content of the artifact
+        :return: Plan that should be committed once the content is written
+        """
+        return self.plan_stream(key, io.BytesIO(content))
+
+    def _previous_entries(
+        self, key: str, sha256: Optional[str]
+    ) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Return entries and hash of previous content, if it has the expected hash."""
+        content_file = self.index.open(key)
+        if content_file is None:
+            return None
+        with content_file:
+            reader = HashingReader(content_file)
+            entries = stream_entries(cast(BinaryIO, reader))
+        digest = reader.digest.hexdigest()
+        return (entries, digest) if digest == sha256 else None
+
+    def plan_stream(self, key: str, stream: BinaryIO) -> DeltaPlan:
+        """Decide how to write new content of the artifact, read from file-like object.
+
+        Content is staged in the delta index and its entries are read back from the
+        staged file in chunks, so that content itself is never held in memory. Only
+        entries of JSON documents are computed from the whole document. Previous
+        content that does not match the hash in the state store (e.g. state store
+        was lost) is ignored.
+
+        :param key: Key identifying the artifact
+        :param stream: File-like object with new content of the artifact
+        :return: Plan that should be committed once the content is written, or
+            discarded if it's not
+        """
+        known = self.state.get(f"{DELTA_PREFIX}{key}")
+        previous = self._previous_entries(key, known.get("sha256")) if known else None
+        reader = HashingReader(stream)
+        staged = self.index.stage(cast(BinaryIO, reader))
+        try:
+            with open(staged, "rb") as staged_file:
+                current = (stream_entries(staged_file), reader.digest.hexdigest())
+        except BaseException:
+            self.index.discard(staged)
+            raise
+
+        now = time.time()
+        baseline_at = float(known.get("baseline_at", 0))
+        baseline_due = previous is None or now - baseline_at >= self.baseline_interval
+        full = baseline_due or self.mode == "alongside"
+        state = {"sha256": current[1], "baseline_at": str(now if full else baseline_at)}
+        delta = None if previous is None else _delta_document(previous, current)
+        return DeltaPlan(key, staged, full, delta, state)
+
+    def commit(self, plan: DeltaPlan) -> None:
+        """Record written content of the artifact as its previous content."""
+        self.index.put_staged(plan.key, plan.staged)
+        self.state.set(f"{DELTA_PREFIX}{plan.key}", plan.state)
+
+    def discard(self, plan: DeltaPlan) -> None:
+        """Drop content of the artifact that was not written completely."""
+        self.index.discard(plan.staged)
+
+
+def delta_tracker(
+    settings: "_ConfigSettings", state: Optional[StateStore]
+) -> Optional[DeltaTracker]:
+    """Return tracker of artifact deltas, or None if delta archives are disabled.
+
+    Delta index defaults to a directory next to the state file, e.g. "state.delta"
+    for "state.json", so that the previous content is kept with the state that
+    refers to it and never lands in the collection directory.
+    """
+    if settings.delta == "off" or state is None:
+        return None
+    index_path = settings.delta_index or f"{os.path.splitext(state.path)[0]}.delta"
+    return DeltaTracker(
+        settings.delta, DeltaIndex(index_path), state, settings.delta_baseline_interval
+    )
@@ -0,0 +1,122 @@
+"""Module containing discovery of exporter targets from status of Juju models."""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from software_inventory_collector.config import Config, _ConfigTarget
+from software_inventory_collector.state import StateStore
+
+# Prefix of state store keys under which exporters discovered in models are cached
+DISCOVERY_PREFIX = "discovery/"
+
+
+def discovery_key(controller_endpoint: str, model_key: str) -> str:
+    """Return state store key of exporters discovered in the model."""
+    return f"{DISCOVERY_PREFIX}{controller_endpoint}/{model_key}"
+
+
+def charm_name(charm_url: str) -> str:
+    """Return name of the charm from its URL, e.g. 'ch:amd64/focal/exporter-3'."""
+    name = charm_url.rsplit(":", 1)[-1].rsplit("/", 1)[-1]
+    base, _, revision = name.rpartition("-")
+    return base if base and revision.isdigit() else name
+
+
+def _machines(machines: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return machines and their containers at any depth, by machine ID."""
+    flat = {}
+    for machine_id, machine in (machines or {}).items():
+        flat[machine_id] = machine
+        flat.update(_machines(machine.containers))
+    return flat
+
+
+def _port(unit: Any, default: int) -> int:
+    """Return first TCP port opened by the unit (e.g. '8675/tcp'), or the default."""
+    for opened in unit.opened_ports or []:
+        port, _, protocol = opened.partition("/")
+        if protocol == "tcp":
+            return int(port.split("-")[0])
+    return default
+
+
+def _exporter_units(status: Any, charm: str) -> Iterator[Tuple[str, Any, Any]]:
+    """Return exporter units found in the status, with their principal units.
+
+    :return: Iterator over triples of unit name, exporter unit and principal unit,
+        principal unit of a unit that is not a subordinate is the unit itself
+    """
+    applications = status.applications or {}
+    exporters = {
+        name
+        for name, application in applications.items()
+        if charm_name(application.charm or "") == charm
+    }
+    for application in applications.values():
+        for unit_name, unit in (application.units or {}).items():
+            if unit_name.split("/")[0] in exporters:
+                yield unit_name, unit, unit
+            for subordinate_name, subordinate in (unit.subordinates or {}).items():
+                if subordinate_name.split("/")[0] in exporters:
+                    yield subordinate_name, subordinate, unit
+
+
+def discover_exporters(status: Any, charm: str, default_port: int) -> Dict[str, str]:
+    """Return endpoints of exporter units found in status of a Juju model.
+
+    Exporter unit is a unit of an application deployed from the exporter charm,
+    usually a subordinate of a unit on the machine that it inventories. Exporter is
+    identified by hostname of its principal unit's machine, or by the unit name if
+    the unit has no machine. Units that don't have an address yet are skipped.
+
+    :param status: Full status of the model, as returned by `Model.get_status()`
+    :param charm: Name of the exporter charm
+    :param default_port: Port of exporters that don't report any opened port
+    :return: Exporter endpoints ("address:port") by hostname
+    """
+    machines = _machines(status.machines)
+    exporters = {}
+    for unit_name, unit, principal in _exporter_units(status, charm):
+        addresses = [unit.public_address, unit.address, principal.public_address]
+        address = next((address for address in addresses if address), None)
+        if address is None:
+            continue
+        if ":" in address:
+            address = f"[{address}]"
+        machine = machines.get(principal.machine or "")
+        hostname = getattr(machine, "hostname", None) or unit_name.replace("/", "-")
+        exporters[hostname] = f"{address}:{_port(unit, default_port)}"
+    return exporters
+
+
+def discovered_targets(config: Config, state: StateStore) -> List[_ConfigTarget]:
+    """Return exporter targets discovered by previous collections.
+
+    Discovered target belongs to the model in whose status it was found, so that
+    its data end up in the same tarball as Juju data of the model. Targets of
+    controllers that are no longer in config are ignored, as are endpoints that
+    are declared in `targets`, declared target takes precedence.
+
+    :param config: Collector's configuration
+    :param state: State store holding the discovered exporters
+    :return: Discovered exporter targets
+    """
+    controllers = {controller.endpoint for controller in config.controllers}
+    known = {target.endpoint for target in config.targets}
+    targets = []
+    for key, exporters in sorted(state.items(DISCOVERY_PREFIX).items()):
+        controller, _, model = key.split("/", 1)[1].rpartition("/")
+        if controller not in controllers:
+            continue
+        for hostname, endpoint in sorted(exporters.items()):
+            if endpoint in known:
+                continue
+            known.add(endpoint)
+            targets.append(
+                _ConfigTarget(
+                    endpoint=endpoint,
+                    hostname=hostname,
+                    customer=config.settings.customer,
+                    site=config.settings.site,
+                    model=model,
+                )
+            )
+    return targets
@@ -15,4 +15,4 @@ class ConfigMissingKeyError(ConfigError):
 
 
 class CollectionError(Exception):
-    """Error occurred while collecting data from exporter."""
+    """Error occurred while collecting data from exporter or Juju controller."""
@@ -0,0 +1,221 @@
+"""Module containing sidecar indexes of tarballs and their indexed reader.
+
+Index is a JSON document stored next to the tarball (`<tarball>.index.json`) that
+lists name, size and SHA-256 hash of every member together with offset of its
+content in the tar stream. Members of uncompressed tarballs are read straight from
+memory-mapped tarball at their offset. Every member of an indexed compressed
+tarball starts a new frame, so the member is read by decompressing the tarball from
+its first frame.
+"""
+import bz2
+import gzip
+import hashlib
+import json
+import lzma
+import mmap
+import os
+import tempfile
+from types import TracebackType
+from typing import Any, BinaryIO, Dict, List, Optional, Type, cast
+
+from typing_extensions import Self
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+INDEX_SUFFIX = ".index.json"
+INDEX_FORMAT = 1
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingReader:  # pylint: disable=R0903
+    """File-like object that computes SHA-256 hash and size of data read from a stream."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        """Initiate reader of the stream."""
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Read data from the stream and add them to the hash."""
+        data = self.stream.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+
+class ArchiveIndex:
+    """Index of tarball members that is built while the tarball is written."""
+
+    def __init__(self, compression: str) -> None:
+        """Initiate empty index.
+
+        :param compression: Compression codec of the tarball
+        """
+        self.compression = compression
+        self.members: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        name: str,
+        reader: HashingReader,
+        offset: int,
+        frame: int = 0,
+        frame_offset: int = 0,
+    ) -> None:
+        """Add member to the index.
+
+        :param name: Name of the member
+        :param reader: Reader through which the member content was written
+        :param offset: Offset of the member content in uncompressed tar stream
+        :param frame: Offset in the tarball file at which decompression can start
+        :param frame_offset: Offset in uncompressed tar stream at which the
+            decompression that starts at `frame` begins
+        """
+        self.members.append(
+            {
+                "name": name,
+                "size": reader.size,
+                "sha256": reader.digest.hexdigest(),
+                "offset": offset,
+                "frame": frame,
+                "frame_offset": frame_offset,
+            }
+        )
+
+    def save(self, path: str, archive_path: str) -> None:
+        """Atomically write index of the tarball.
+
+        :param path: Path to the index file
+        :param archive_path: Path to the indexed tarball
+        :return: None
+        """
+        index = {
+            "format": INDEX_FORMAT,
+            "archive": os.path.basename(archive_path),
+            "compression": self.compression,
+            "members": self.members,
+        }
+        directory = os.path.dirname(path) or "."
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".index-")
+        try:
+            with os.fdopen(temp_fd, "w", encoding="UTF-8") as index_file:
+                json.dump(index, index_file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def retarget_index(path: str, archive_path: str) -> None:
+    """Point index to its tarball, if the tarball was renamed after it was indexed.
+
+    :param path: Path to the index file
+    :param archive_path: New path to the indexed tarball
+    :return: None
+    """
+    with open(path, "r", encoding="UTF-8") as index_file:
+        index = json.load(index_file)
+    index["archive"] = os.path.basename(archive_path)
+    with open(path, "w", encoding="UTF-8") as index_file:
+        json.dump(index, index_file)
+
+
+def _decompressor(compression: str, stream: Any) -> BinaryIO:
+    """Return reader of data decompressed from the stream."""
+    if compression == "gzip":
+        return cast(BinaryIO, gzip.GzipFile(fileobj=stream, mode="rb"))
+    if compression == "bz2":
+        return cast(BinaryIO, bz2.BZ2File(stream))
+    if compression == "xz":
+        return cast(BinaryIO, lzma.LZMAFile(stream))
+    if zstandard is None:  # pragma: no cover
+        raise ValueError("zstd compression requires 'zstandard' python package")
+    decompressor = zstandard.ZstdDecompressor()
+    return cast(
+        BinaryIO,
+        decompressor.stream_reader(stream, read_across_frames=True, closefd=False),
+    )
+
+
+class IndexedArchiveReader:
+    """Reader of single members of a tarball, located by the tarball's index.
+
+    Tarball is memory-mapped, member is found in the index by its name and read
+    without scanning the tar stream. Reader is not thread-safe.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None) -> None:
+        """Open indexed tarball.
+
+        :param path: Path to the tarball
+        :param index_path: Path to the index, defaults to `<path>.index.json`
+        :raises ValueError: If the index format is not supported
+        :raises OSError: If the tarball or its index can't be opened
+        """
+        with open(index_path or f"{path}{INDEX_SUFFIX}", "r", encoding="UTF-8") as file:
+            index = json.load(file)
+        if index.get("format") != INDEX_FORMAT:
+            raise ValueError(f"unsupported index format {index.get('format')}")
+        self.compression: str = index["compression"]
+        self.members: Dict[str, Dict[str, Any]] = {
+            member["name"]: member for member in index["members"]
+        }
+        with open(path, "rb") as archive_file:
+            self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self) -> Self:
+        """Return reader as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Close the tarball when leaving context."""
+        self.close()
+
+    def names(self) -> List[str]:
+        """Return names of all members in the tarball."""
+        return list(self.members)
+
+    def read(self, name: str) -> bytes:
+        """Return content of the member.
+
+        :param name: Name of the member
+        :raises KeyError: If the tarball has no such member
+        :raises OSError: If the tarball ends before the member content
+        :return: Content of the member
+        """
+        member = self.members[name]
+        offset, size = member["offset"], member["size"]
+        if self.compression == "none":
+            end = offset + size
+            content = self._map[offset:end]
+        else:
+            self._map.seek(member["frame"])
+            with _decompressor(self.compression, self._map) as stream:
+                position = member["frame_offset"]
+                while position < offset:
+                    skipped = len(stream.read(min(offset - position, CHUNK_SIZE)))
+                    if not skipped:
+                        break
+                    position += skipped
+                content = stream.read(size)
+        if len(content) != size:
+            raise OSError(f"unexpected end of data in member '{name}'")
+        return content
+
+    def verify(self, name: str) -> bool:
+        """Return True if content of the member matches its hash in the index."""
+        return hashlib.sha256(self.read(name)).hexdigest() == self.members[name]["sha256"]
+
+    def close(self) -> None:
+        """Close the memory-mapped tarball."""
+        self._map.close()
@@ -0,0 +1,103 @@
+"""Module containing pool of worker processes that package collected data.
+
+Serialization of Juju data and compression of archives are CPU-bound and, if they
+run on the threads that collect the data, they hold up network I/O of the whole
+collection. Packaging pool runs them in worker processes on the other CPU cores.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+from software_inventory_collector.budget import POLL_INTERVAL
+from software_inventory_collector.config import _ConfigSettings
+
+# Number of jobs that can wait in the queue for each worker process
+QUEUE_PER_WORKER = 2
+
+T = TypeVar("T")
+
+
+def available_cores() -> int:
+    """Return number of CPU cores on which the collector can run."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover
+        return os.cpu_count() or 1
+
+
+class PackagingPool(Executor):
+    """Pool of worker processes with a bounded queue of jobs.
+
+    Submission of a job waits while `queue_size` submitted jobs are not finished, so
+    that threads collecting the data can't get ahead of their packaging and pile up
+    collected data in memory. Worker processes are started by the first jobs.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None):
+        """Initiate packaging pool.
+
+        :param workers: Number of worker processes, defaults to available CPU cores
+        :param queue_size: Number of jobs submitted and not finished at once, defaults
+            to `QUEUE_PER_WORKER` jobs per worker process
+        """
+        self.workers = workers or available_cores()
+        self.queue_size = queue_size or QUEUE_PER_WORKER * self.workers
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _submit_queued(
+        self, fn: Callable[..., T], args: Tuple[Any, ...], kwargs: Dict[str, Any]
+    ) -> "Future[T]":
+        """Submit job that already took its place in the queue."""
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> "Future[T]":
+        """Submit job to worker processes, block while the queue is full.
+
+        :param fn: Picklable callable to run in a worker process
+        :return: Future result of the call
+        """
+        self._slots.acquire()  # pylint: disable=R1732
+        return self._submit_queued(fn, args, kwargs)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run job in a worker process without blocking event loop.
+
+        :param fn: Picklable callable to run in a worker process
+        :return: Result of the call
+        """
+        while not self._slots.acquire(blocking=False):  # pylint: disable=R1732
+            await asyncio.sleep(POLL_INTERVAL)
+        return await asyncio.wrap_future(self._submit_queued(fn, args, {}))
+
+    def shutdown(self, wait: bool = True, **_: Any) -> None:
+        """Stop worker processes once they finish submitted jobs."""
+        self._executor.shutdown(wait)
+
+
+@contextmanager
+def packaging_pool(settings: _ConfigSettings) -> Iterator[Optional[PackagingPool]]:
+    """Return packaging pool if it's enabled in settings, otherwise None.
+
+    Pool is shut down when the context is left.
+
+    :param settings: Collector's settings
+    :return: Context manager of the packaging pool
+    """
+    if not settings.packaging_pool:
+        yield None
+        return
+    with PackagingPool(settings.packaging_workers) as pool:
+        yield pool
@@ -0,0 +1,103 @@
+"""Module containing bodies of exporter responses spooled before they are archived."""
+import hashlib
+import io
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, Optional, cast
+
+import requests
+from typing_extensions import Self
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_length(response: requests.Response) -> Optional[int]:
+    """Return size of response body announced by its headers, None if it's unknown.
+
+    Content-Length of encoded (e.g. gzip compressed) body is not the size of the
+    decoded body, so it's ignored.
+    """
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+@dataclass
+class Payload:
+    """Body of exporter response spooled in memory or, if it's large, on disk.
+
+    `size` is the number of spooled bytes. Body over the maximal size is spooled only
+    partially, `full_size` is then size of the whole body if its Content-Length is
+    known, otherwise the size of the body is known only to exceed `size`.
+    """
+
+    data: BinaryIO
+    size: int
+    sha256: str
+    state: Dict[str, str]
+    partial: bool = False
+    full_size: Optional[int] = None
+
+    @property
+    def artifact_size(self) -> int:
+        """Return size of the whole body, or its lower bound if it's not known."""
+        return self.size if self.full_size is None else self.full_size
+
+    @property
+    def size_is_lower_bound(self) -> bool:
+        """Return True if the body was spooled partially and its size is not known."""
+        return self.partial and self.full_size is None
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> Self:
+        """Return payload with content taken from memory."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        return cls(cast(BinaryIO, io.BytesIO(content)), len(content), sha256, {})
+
+    @classmethod
+    def from_response(
+        cls,
+        response: requests.Response,
+        spool_threshold: int,
+        max_size: Optional[int] = None,
+    ) -> Self:
+        """Stream response body in chunks into a spool file.
+
+        Body is never held in memory as a whole, memory use is bounded by
+        `spool_threshold` and the body is not decoded into text. Body larger than
+        `max_size` is not downloaded completely, reading stops one byte past the
+        limit, which is enough to tell that the body is oversized.
+
+        :param response: Streamed HTTP response
+        :param spool_threshold: Payloads larger than this are spooled to disk
+        :param max_size: Maximal expected size of the body, None for unlimited
+        :return: Spooled payload rewound to its start
+        """
+        spool = SpooledTemporaryFile(max_size=spool_threshold)  # pylint: disable=R1732
+        digest = hashlib.sha256()
+        remaining = None if max_size is None else max_size + 1
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if remaining is not None:
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+            digest.update(chunk)
+            spool.write(chunk)
+            if remaining == 0:
+                break
+        size = spool.tell()
+        spool.seek(0)
+
+        state = {"sha256": digest.hexdigest()}
+        for header, key in (("ETag", "etag"), ("Last-Modified", "last_modified")):
+            if header in response.headers:
+                state[key] = response.headers[header]
+
+        payload = cls(cast(BinaryIO, spool), size, state["sha256"], state)
+        if remaining == 0:
+            full_size = content_length(response)
+            payload.partial = True
+            payload.full_size = None if full_size is None else max(full_size, size)
+        return payload
@@ -0,0 +1,383 @@
+"""Module containing report summarizing outcome of a collection run."""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from typing_extensions import Self
+
+from software_inventory_collector.shard import shard_field
+
+if TYPE_CHECKING:  # pragma: no cover
+    from software_inventory_collector.config import Config
+    from software_inventory_collector.context import CollectionContext
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_PARTIAL_FAILURE = 2
+
+METRIC_PREFIX = "software_inventory_collector"
+
+
+@dataclass(frozen=True)
+class LimitedArtifact:
+    """Artifact of a source that was truncated or skipped, because it exceeded budgets.
+
+    Number of written bytes is 0 if the artifact was skipped. Size of an artifact
+    that was not downloaded completely may be only its lower bound.
+    """
+
+    artifact: str
+    size: int
+    written: int
+    reason: str
+    size_is_lower_bound: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return JSON serializable representation of the artifact."""
+        data: Dict[str, Any] = asdict(self)
+        data["action"] = "truncated" if self.written else "skipped"
+        return data
+
+
+@dataclass
+class ReportEntry:  # pylint: disable=R0902
+    """Outcome of collection from a single source (exporter target, Juju model, ...).
+
+    Besides the outcome, entry holds wall time of the source's collection, time
+    spent in individual phases (e.g. "http", "write", "get_status"), amount of data
+    transferred from the source, amount of data written into archives and artifacts
+    that were truncated or skipped because they exceeded byte budgets.
+    """
+
+    kind: str
+    name: str
+    error: Optional[str] = None
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    phases: Dict[str, float] = field(default_factory=dict)
+    bytes_transferred: int = 0
+    bytes_written: int = 0
+    limited: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> bool:
+        """Return True if collection from this source succeeded."""
+        return self.error is None
+
+    @property
+    def duration(self) -> float:
+        """Return wall time between start of the first and end of the last phase."""
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return JSON serializable representation of the entry."""
+        data = asdict(self)
+        del data["started"], data["finished"]
+        data["status"] = "ok" if self.succeeded else "failed"
+        data["duration"] = self.duration
+        return data
+
+
+class RunReport:
+    """Thread-safe record of outcome, timing and throughput of a collection run."""
+
+    def __init__(self, run_id: Optional[str] = None) -> None:
+        """Initiate empty report.
+
+        :param run_id: Unique identifier of the reported run
+        """
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], ReportEntry] = {}
+        self.phases: Dict[str, float] = {}
+        self.archives: Dict[str, int] = {}
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    @property
+    def entries(self) -> List[ReportEntry]:
+        """Return all entries in the order in which they were recorded."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def _entry(self, kind: str, name: str) -> ReportEntry:
+        """Return entry of the source, create it if needed. Caller must hold lock."""
+        return self._entries.setdefault((kind, name), ReportEntry(kind, name))
+
+    def record(self, kind: str, name: str, error: Optional[str] = None) -> None:
+        """Record outcome of collection from a source.
+
+        Failure of a source is never overwritten by a later success of the same source
+        (e.g. when one of target's endpoints failed and the other succeeded).
+
+        :param kind: Kind of the source, e.g. "target" or "model"
+        :param name: Name identifying the source
+        :param error: Description of an error, None if collection succeeded
+        :return: None
+        """
+        with self._lock:
+            entry = self._entry(kind, name)
+            if error is not None and entry.error is None:
+                entry.error = error
+
+    def add_bytes(
+        self, kind: str, name: str, transferred: int = 0, written: int = 0
+    ) -> None:
+        """Add amount of data transferred from the source and written to archive."""
+        with self._lock:
+            entry = self._entry(kind, name)
+            entry.bytes_transferred += transferred
+            entry.bytes_written += written
+
+    def limit(self, kind: str, name: str, artifact: LimitedArtifact) -> None:
+        """Record artifact of the source that was truncated or skipped.
+
+        :param kind: Kind of the source, e.g. "target" or "model"
+        :param name: Name identifying the source
+        :param artifact: Artifact that exceeded budgets
+        :return: None
+        """
+        with self._lock:
+            self._entry(kind, name).limited.append(artifact.to_dict())
+
+    def add_archive(self, path: str) -> None:
+        """Record size of finalized archive, archives that weren't created are ignored."""
+        if os.path.exists(path):
+            with self._lock:
+                self.archives[os.path.basename(path)] = os.path.getsize(path)
+
+    @contextmanager
+    def timer(
+        self, phase: str, kind: Optional[str] = None, name: Optional[str] = None
+    ) -> Iterator[None]:
+        """Measure wall time of a phase of the run, or of a phase of single source.
+
+        Time of repeated phases (e.g. "http" phase of each target's endpoint) is summed.
+
+        :param phase: Name of the measured phase
+        :param kind: Kind of the source, omit to measure phase of the whole run
+        :param name: Name of the source, omit to measure phase of the whole run
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            with self._lock:
+                if kind is None or name is None:
+                    phases = self.phases
+                else:
+                    entry = self._entry(kind, name)
+                    entry.started = min(entry.started or start, start)
+                    entry.finished = max(entry.finished or end, end)
+                    phases = entry.phases
+                phases[phase] = phases.get(phase, 0.0) + end - start
+
+    def finish(self) -> None:
+        """Mark the end of the run, report that is already finished is not changed."""
+        if self.finished is None:
+            self.finished = time.time()
+
+    @property
+    def duration(self) -> float:
+        """Return wall time of the run, up to now if it's not finished yet."""
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def failed(self) -> List[ReportEntry]:
+        """Return entries of sources that failed."""
+        return [entry for entry in self.entries if not entry.succeeded]
+
+    @property
+    def exit_code(self) -> int:
+        """Return exit code reflecting full, partial or no failure of the run."""
+        failed = len(self.failed)
+        if failed == 0:
+            return EXIT_OK
+        if failed == len(self.entries):
+            return EXIT_FAILURE
+        return EXIT_PARTIAL_FAILURE
+
+    def summary(self) -> str:
+        """Return human-readable summary listing outcome of every source."""
+        entries = self.entries
+        failed = len(self.failed)
+        lines = [
+            f"Collection summary: {len(entries) - failed} succeeded, {failed} failed"
+        ]
+        for entry in entries:
+            if entry.succeeded:
+                lines.append(f"  OK      {entry.kind} '{entry.name}'")
+            else:
+                lines.append(f"  FAILED  {entry.kind} '{entry.name}': {entry.error}")
+            for limited in entry.limited:
+                at_least = "at least " if limited.get("size_is_lower_bound") else ""
+                lines.append(
+                    f"    {limited['action'].upper()} '{limited['artifact']}' "
+                    f"({at_least}{limited['size']} bytes): {limited['reason']}"
+                )
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return JSON serializable representation of the report."""
+        entries = self.entries
+        return {
+            "run_id": self.run_id,
+            "started": self.started,
+            "duration": self.duration,
+            "exit_code": self.exit_code,
+            "phases": dict(self.phases),
+            "bytes_transferred": sum(entry.bytes_transferred for entry in entries),
+            "bytes_written": sum(entry.bytes_written for entry in entries),
+            "archives": dict(self.archives),
+            "entries": [entry.to_dict() for entry in entries],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Self:
+        """Return finished report loaded from its JSON serializable representation.
+
+        Wall time of each source is preserved, but the sources are treated as if they
+        started at the start of the run.
+        """
+        report = cls(data.get("run_id"))
+        report.started = data["started"]
+        report.finished = data["started"] + data["duration"]
+        report.phases = dict(data["phases"])
+        report.archives = dict(data["archives"])
+        for item in data["entries"]:
+            entry = report._entry(item["kind"], item["name"])
+            entry.error = item["error"]
+            entry.phases = dict(item["phases"])
+            entry.bytes_transferred = item["bytes_transferred"]
+            entry.bytes_written = item["bytes_written"]
+            entry.limited = list(item.get("limited", []))
+            if item["duration"]:
+                entry.started = report.started
+                entry.finished = report.started + item["duration"]
+        return report
+
+    @classmethod
+    def merge(cls, reports: List["RunReport"], run_id: Optional[str] = None) -> Self:
+        """Combine reports of collector shards that ran in parallel into one report.
+
+        Merged run spans from the earliest start to the latest end of the shards.
+        Phases of the run take the longest time among the shards, since the shards
+        run them in parallel. Sources collected by more than one shard (e.g. the
+        controller) keep their failure and their time and bytes are summed.
+
+        :param reports: Finished reports of the shards
+        :param run_id: Unique identifier of the merged run
+        :return: Finished merged report
+        """
+        merged = cls(run_id)
+        merged.started = min(report.started for report in reports)
+        merged.finished = max(report.started + report.duration for report in reports)
+        for report in reports:
+            for phase, seconds in report.phases.items():
+                merged.phases[phase] = max(merged.phases.get(phase, 0.0), seconds)
+            merged.archives.update(report.archives)
+            for entry in report.entries:
+                target = merged._entry(entry.kind, entry.name)
+                target.error = target.error or entry.error
+                for phase, seconds in entry.phases.items():
+                    target.phases[phase] = target.phases.get(phase, 0.0) + seconds
+                target.bytes_transferred += entry.bytes_transferred
+                target.bytes_written += entry.bytes_written
+                target.limited.extend(entry.limited)
+                if entry.started is not None and entry.finished is not None:
+                    target.started = min(target.started or entry.started, entry.started)
+                    target.finished = max(
+                        target.finished or entry.finished, entry.finished
+                    )
+        return merged
+
+    def write_json(self, path: str) -> None:
+        """Atomically write the report as JSON document."""
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically write the report in Prometheus textfile-collector format."""
+        metrics: Dict[str, Tuple[str, List[str]]] = {
+            "last_run_timestamp_seconds": ("Start of the last collection run.", []),
+            "run_duration_seconds": ("Wall time of the collection run.", []),
+            "run_exit_code": ("Exit code of the collection run.", []),
+            "phase_duration_seconds": ("Wall time of the run's phase.", []),
+            "source_success": ("Whether collection from the source succeeded.", []),
+            "source_duration_seconds": ("Wall time of the source's collection.", []),
+            "source_bytes_transferred": ("Bytes transferred from the source.", []),
+            "source_bytes_written": ("Bytes written to archives from the source.", []),
+            "source_artifacts_limited": (
+                "Artifacts of the source truncated or skipped by byte budgets.",
+                [],
+            ),
+        }
+        metrics["last_run_timestamp_seconds"][1].append(f" {self.started}")
+        metrics["run_duration_seconds"][1].append(f" {self.duration}")
+        metrics["run_exit_code"][1].append(f" {self.exit_code}")
+        for phase, seconds in self.phases.items():
+            metrics["phase_duration_seconds"][1].append(
+                f"{_labels(phase=phase)} {seconds}"
+            )
+        for entry in self.entries:
+            labels = _labels(kind=entry.kind, name=entry.name)
+            metrics["source_success"][1].append(f"{labels} {int(entry.succeeded)}")
+            metrics["source_duration_seconds"][1].append(f"{labels} {entry.duration}")
+            metrics["source_bytes_transferred"][1].append(
+                f"{labels} {entry.bytes_transferred}"
+            )
+            metrics["source_bytes_written"][1].append(f"{labels} {entry.bytes_written}")
+            metrics["source_artifacts_limited"][1].append(
+                f"{labels} {len(entry.limited)}"
+            )
+
+        lines = []
+        for metric, (description, samples) in metrics.items():
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} gauge")
+            lines.extend(f"{METRIC_PREFIX}_{metric}{sample}" for sample in samples)
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def _labels(**labels: str) -> str:
+    """Return Prometheus label set with properly escaped values."""
+    pairs = []
+    for key, value in labels.items():
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _write_atomic(path: str, content: str) -> None:
+    """Write file content so that readers never see partially written file.
+
+    Content is written into a hidden temporary file in the same directory, so that
+    readers that scan the directory never pick it up.
+    """
+    directory = os.path.dirname(path) or "."
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".report-")
+    try:
+        with os.fdopen(temp_fd, "w", encoding="UTF-8") as out_file:
+            out_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def get_run_report_path(config: "Config", context: "CollectionContext") -> str:
+    """Return path to JSON run report, it's stored next to collected tarballs."""
+    settings = config.settings
+    shard = shard_field(settings.shard_index, settings.shard_count)
+    report = (
+        f"{settings.customer}_@_{settings.site}_@_run_report_"
+        f"@_{context.timestamp}{shard}.json"
+    )
+    return os.path.join(settings.collection_path, report)
@@ -0,0 +1,155 @@
+"""Module containing schedules of periodic collection in daemon mode."""
+import datetime
+from typing import List, Optional, Set, Union
+
+# Allowed (minimum, maximum) values of cron expression fields
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# Cron expression that never matches is detected after searching this far ahead
+CRON_SEARCH_LIMIT = datetime.timedelta(days=5 * 366)
+
+
+def _parse_cron_field(field: str, minimum: int, maximum: int) -> Set[int]:
+    """Return values matched by single field of cron expression.
+
+    Supported syntax is a comma-separated list of `*`, `N`, `N-M`, each optionally
+    followed by `/STEP`.
+
+    :param field: Field of the cron expression
+    :param minimum: Lowest allowed value of the field
+    :param maximum: Highest allowed value of the field
+    :return: Set of matched values
+    """
+    values: Set[int] = set()
+    for part in field.split(","):
+        value_range, _, step = part.partition("/")
+        if value_range == "*":
+            start, end = minimum, maximum
+        elif "-" in value_range:
+            start_str, end_str = value_range.split("-", 1)
+            start, end = int(start_str), int(end_str)
+        else:
+            start = int(value_range)
+            end = maximum if step else start
+        if not minimum <= start <= end <= maximum:
+            raise ValueError(f"value '{part}' is out of range {minimum}-{maximum}")
+        increment = int(step) if step else 1
+        if increment < 1:
+            raise ValueError(f"step in '{part}' must be positive")
+        values.update(range(start, end + 1, increment))
+    return values
+
+
+class CronSchedule:
+    """Schedule defined by standard 5-field cron expression in local time.
+
+    Fields are minute, hour, day of month, month and day of week (0 or 7 is
+    Sunday). As in cron, if both day of month and day of week are restricted, a day
+    matching either of them is scheduled.
+    """
+
+    def __init__(self, expression: str) -> None:
+        """Parse cron expression.
+
+        :param expression: Cron expression, e.g. "*/15 * * * *"
+        :raises ValueError: If the expression is not valid
+        """
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"cron expression '{expression}' must have 5 fields")
+        try:
+            parsed: List[Set[int]] = [
+                _parse_cron_field(field, minimum, maximum)
+                for field, (minimum, maximum) in zip(fields, CRON_FIELDS)
+            ]
+        except ValueError as exc:
+            raise ValueError(f"invalid cron expression '{expression}': {exc}") from exc
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        # day matching either of the restricted day fields is scheduled
+        self._either_day = fields[2] != "*" and fields[4] != "*"
+
+    def _day_matches(self, date: datetime.datetime) -> bool:
+        """Return True if collection can be scheduled on the date."""
+        day_matches = date.day in self.days
+        # cron counts days of week from Sunday, python from Monday
+        weekday_matches = (date.weekday() + 1) % 7 in self.weekdays
+        if self._either_day:
+            return day_matches or weekday_matches
+        return day_matches and weekday_matches
+
+    def first_run(self, now: datetime.datetime) -> datetime.datetime:
+        """Return time of the first collection, the next time matching expression."""
+        return self.next_run(now)
+
+    def next_run(self, after: datetime.datetime) -> datetime.datetime:
+        """Return the first time matching the expression strictly after given time.
+
+        :param after: Time after which the next collection should run
+        :return: Time of the next collection
+        :raises ValueError: If the expression never matches (e.g. "0 0 31 2 *")
+        """
+        candidate = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = candidate + CRON_SEARCH_LIMIT
+        while candidate < limit:
+            if candidate.month not in self.months:
+                month_start = candidate.replace(day=1, hour=0, minute=0)
+                candidate = (month_start + datetime.timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + datetime.timedelta(
+                    days=1
+                )
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + datetime.timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += datetime.timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"cron expression '{self.expression}' never matches")
+
+
+class IntervalSchedule:
+    """Schedule running collection at fixed interval, starting immediately.
+
+    Interval is measured from start of one collection to start of the next one. If
+    collection takes longer than the interval, the next one starts right after it.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        """Initiate schedule.
+
+        :param seconds: Interval between starts of collections
+        """
+        self.interval = datetime.timedelta(seconds=seconds)
+
+    def first_run(self, now: datetime.datetime) -> datetime.datetime:
+        """Return time of the first collection, that is now."""
+        return now
+
+    def next_run(self, after: datetime.datetime) -> datetime.datetime:
+        """Return time of the collection following the one started at given time."""
+        return after + self.interval
+
+
+Schedule = Union[CronSchedule, IntervalSchedule]
+
+
+def parse_schedule(interval: Optional[float], cron: Optional[str]) -> Optional[Schedule]:
+    """Return schedule defined by collection interval or by cron expression.
+
+    :param interval: Interval between collections in seconds
+    :param cron: Cron expression
+    :return: Schedule, or None if neither interval nor cron expression is defined
+    :raises ValueError: If both are defined or if they are not valid
+    """
+    if interval is not None and cron is not None:
+        raise ValueError("schedule can be defined either by interval or by cron")
+    if interval is not None:
+        if interval <= 0:
+            raise ValueError("schedule interval must be positive")
+        return IntervalSchedule(interval)
+    if cron is not None:
+        return CronSchedule(cron)
+    return None
@@ -0,0 +1,75 @@
+"""Module containing assignment of collected sources to collector shards.
+
+Sources (exporter targets and Juju models) are split between `count` collector
+instances by rendezvous (highest random weight) hashing of the source's name. Every
+instance computes the same assignment independently, and changing the number of
+shards moves only the sources whose winning shard was added or removed.
+"""
+import hashlib
+import os
+from typing import Tuple
+
+
+def _weight(key: str, shard: int) -> int:
+    """Return pseudo-random, but stable, weight of the key for given shard."""
+    digest = hashlib.sha256(f"{shard}:{key}".encode("UTF-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def shard_of(key: str, count: int) -> int:
+    """Return index of the shard that collects the source identified by the key.
+
+    :param key: Name of the source, e.g. target's hostname or model name
+    :param count: Total number of shards
+    :return: Index of the shard in range 0..count-1
+    """
+    return max(range(count), key=lambda shard: _weight(key, shard))
+
+
+def validate_shard(index: int, count: int) -> None:
+    """Verify that shard index and count are valid.
+
+    :raises ValueError: If the count is not positive or index is out of range
+    """
+    if count < 1:
+        raise ValueError("shard count must be positive")
+    if not 0 <= index < count:
+        raise ValueError(f"shard index must be in range 0-{count - 1}")
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse shard specification in "INDEX/COUNT" format, e.g. "0/4".
+
+    :param spec: Shard specification
+    :raises ValueError: If the specification is not valid
+    :return: Tuple with shard index and count
+    """
+    index, _, count = spec.partition("/")
+    try:
+        result = int(index), int(count)
+    except ValueError as exc:
+        raise ValueError(f"invalid shard '{spec}', expected INDEX/COUNT") from exc
+    validate_shard(*result)
+    return result
+
+
+def shard_tag(index: int, count: int) -> str:
+    """Return tag distinguishing output of the shard, empty if sharding is disabled."""
+    if count == 1:
+        return ""
+    return f"shard-{index}-of-{count}"
+
+
+def shard_field(index: int, count: int) -> str:
+    """Return file name field distinguishing output of the shard, empty if unsharded."""
+    tag = shard_tag(index, count)
+    return f"_@_{tag}" if tag else ""
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """Return path of a file owned by the shard, e.g. "state.shard-0-of-4.json"."""
+    tag = shard_tag(index, count)
+    if not tag:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{tag}{ext}"
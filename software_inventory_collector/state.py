@@ -0,0 +1,74 @@
+"""Module containing local store of state persisted between collector runs."""
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+
+class StateStore:
+    """Small JSON-backed key-value store persisted between collector runs.
+
+    Each key maps to a flat dictionary of string values (e.g. content hash, ETag or
+    Last-Modified header of a collected artifact). Access to the store is
+    thread-safe and the store is written to the disk atomically.
+    """
+
+    def __init__(self, path: str, data: Optional[Dict[str, Dict[str, str]]] = None):
+        """Initiate state store.
+
+        :param path: Path to the file in which the state is persisted
+        :param data: Initial content of the store
+        """
+        self.path = path
+        self._data = data or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "StateStore":
+        """Load state store from file.
+
+        Missing or unreadable state file results in an empty store, forcing full
+        collection of all artifacts.
+
+        :param path: Path to the state file
+        :return: Loaded state store
+        """
+        try:
+            with open(path, "r", encoding="UTF-8") as state_file:
+                data = json.load(state_file)
+        except (IOError, ValueError):
+            data = {}
+
+        return cls(path, data if isinstance(data, dict) else {})
+
+    def get(self, key: str) -> Dict[str, str]:
+        """Return copy of the state stored under the key, or empty dict."""
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def set(self, key: str, value: Dict[str, str]) -> None:
+        """Replace state stored under the key."""
+        with self._lock:
+            self._data[key] = dict(value)
+
+    def items(self, prefix: str = "") -> Dict[str, Dict[str, str]]:
+        """Return copies of all states whose key starts with the prefix, by key."""
+        with self._lock:
+            return {
+                key: dict(value)
+                for key, value in self._data.items()
+                if key.startswith(prefix)
+            }
+
+    def delete(self, key: str) -> None:
+        """Remove state stored under the key, missing key is ignored."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def save(self) -> None:
+        """Atomically write the store to its state file."""
+        temp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(temp_path, "w", encoding="UTF-8") as state_file:
+                json.dump(self._data, state_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
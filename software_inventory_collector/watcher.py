@@ -0,0 +1,116 @@
+"""Module containing Juju models watched for changes between collections."""
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+from juju.delta import EntityDelta
+from juju.model import Model
+
+# Entities whose deltas don't affect model's status nor its bundle
+IGNORED_ENTITIES = {"action"}
+
+
+@dataclass
+class _WatchedModel:
+    """Connected model with status and bundle from its last fetch."""
+
+    model: Model
+    changed: bool = True
+    fetched_at: float = 0.0
+    status: Any = None
+    bundle: str = ""
+
+
+def _is_relevant(delta: EntityDelta) -> bool:
+    """Return True if the delta can change model's status or bundle."""
+    return delta.entity not in IGNORED_ENTITIES
+
+
+class ModelWatcher:
+    """Juju models kept connected between collections and watched for changes.
+
+    Each connected model runs the all-watcher of python-libjuju, which keeps
+    in-memory state of the model up to date. Any relevant delta marks the model as
+    changed. Status and bundle of the model are fetched again only if the model
+    changed since the last fetch or if the last fetch is older than `max_staleness`
+    seconds, otherwise the previous result is reused without any API call.
+    """
+
+    def __init__(self, max_staleness: float) -> None:
+        """Initiate watcher without any models.
+
+        :param max_staleness: Maximal age in seconds of reused status and bundle
+        """
+        self.max_staleness = max_staleness
+        self._models: Dict[str, _WatchedModel] = {}
+
+    def _watch(self, model_name: str, model: Model) -> _WatchedModel:
+        """Start tracking changes of newly connected model."""
+        watched = _WatchedModel(model)
+
+        async def on_change(*_: Any) -> None:
+            watched.changed = True
+
+        model.add_observer(on_change, predicate=_is_relevant)
+        self._models[model_name] = watched
+        return watched
+
+    def is_stale(self, model_name: str) -> bool:
+        """Return True if status and bundle of the model need to be fetched."""
+        watched = self._models.get(model_name)
+        if watched is None or watched.changed:
+            return True
+        return time.monotonic() - watched.fetched_at >= self.max_staleness
+
+    async def fetch(
+        self,
+        model_name: str,
+        connect: Callable[[str], Awaitable[Model]],
+        query: Callable[[str, Model], Awaitable[Tuple[Any, str]]],
+    ) -> Tuple[Any, str]:
+        """Return status and bundle of the model, query the model only if needed.
+
+        Model that is not connected yet, or whose connection dropped, is connected
+        using `connect` and it's queried right away.
+
+        :param model_name: Name of the model
+        :param connect: Coroutine function returning connected model
+        :param query: Coroutine function returning status and bundle of the model
+        :return: Model's status and exported bundle
+        """
+        watched = self._models.get(model_name)
+        if watched is None or not watched.model.is_connected():
+            if watched is not None:
+                await self._disconnect(model_name)
+            watched = self._watch(model_name, await connect(model_name))
+
+        if self.is_stale(model_name):
+            # Deltas that arrive while the model is being queried mark it as changed
+            watched.changed = False
+            fetched_at = time.monotonic()
+            try:
+                watched.status, watched.bundle = await query(model_name, watched.model)
+            except BaseException:
+                watched.changed = True
+                raise
+            watched.fetched_at = fetched_at
+
+        return watched.status, watched.bundle
+
+    async def _disconnect(self, model_name: str) -> None:
+        """Stop watching the model, errors of already broken connection are ignored."""
+        watched = self._models.pop(model_name)
+        try:
+            await watched.model.disconnect()
+        except Exception as exc:  # pylint: disable=W0718
+            print(f"Failed to disconnect from model '{model_name}': {exc}")
+
+    async def prune(self, model_names: Iterable[str]) -> None:
+        """Stop watching models that are not among the given ones (e.g. destroyed)."""
+        keep = set(model_names)
+        for model_name in [name for name in self._models if name not in keep]:
+            await self._disconnect(model_name)
+
+    async def close(self) -> None:
+        """Stop watching all models."""
+        await self.prune([])
@@ -7,6 +7,7 @@ from software_inventory_collector.config import (
     _ConfigSettings,
     _ConfigTarget,
 )
+from software_inventory_collector.context import CollectionContext
 
 
 @pytest.fixture()
@@ -83,3 +84,11 @@ def collector_config() -> Config:
     return Config(
         settings=general_settings, juju_controller=juju_settings, targets=targets
     )
+
+
+@pytest.fixture()
+def collection_context(mocker) -> CollectionContext:
+    """Context returned whenever a new collection run starts."""
+    context = CollectionContext(timestamp="20230501100000", run_id="run-1")
+    mocker.patch.object(CollectionContext, "new", return_value=context)
+    return context
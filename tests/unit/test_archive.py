@@ -0,0 +1,312 @@
+"""Tests for software_inventory_collector.archive module"""
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+import zstandard
+
+from software_inventory_collector import archive
+
+
+def test_archive_writer_members(tmp_path):
+    """Test that members from memory and from stream are written into the tarball."""
+    tar_path = tmp_path / "output.tar"
+
+    with archive.ArchiveWriter(str(tar_path)) as writer:
+        writer.add_bytes("from_memory", b"in-memory data")
+        writer.add_stream("from_stream", io.BytesIO(b"streamed data and more"), 13)
+
+    with tarfile.open(tar_path, "r") as tar_file:
+        assert tar_file.getnames() == ["from_memory", "from_stream"]
+        member = tar_file.getmember("from_memory")
+        assert member.mode == 0o644
+        assert tar_file.extractfile(member).read() == b"in-memory data"
+        assert tar_file.extractfile("from_stream").read() == b"streamed data"
+
+
+def test_archive_writer_opened_once(tmp_path, mocker):
+    """Test that tarball is opened once and finalized once for all members."""
+    tar_path = str(tmp_path / "output.tar")
+    open_spy = mocker.spy(archive.tarfile, "open")
+
+    writer = archive.ArchiveWriter(tar_path)
+    for index in range(5):
+        writer.add_bytes(f"member_{index}", b"data")
+    writer.close()
+    writer.close()
+
+    open_spy.assert_called_once()
+    with tarfile.open(tar_path, "r") as tar_file:
+        assert len(tar_file.getmembers()) == 5
+
+
+def test_archive_writer_without_members(tmp_path):
+    """Test that closing writer without any members does not create tarball."""
+    tar_path = tmp_path / "output.tar"
+
+    with archive.ArchiveWriter(str(tar_path)):
+        pass
+
+    assert not tar_path.exists()
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "bz2", "xz", "zstd"])
+@pytest.mark.parametrize("level", [None, 1])
+def test_archive_writer_compression(compression, level, tmp_path):
+    """Test that archives are compressed with selected codec and can be read back."""
+    tar_path = tmp_path / f"output{archive.archive_suffix(compression)}"
+    payload = b"ii  package  1.0  amd64  description\n" * 1000
+    level = None if compression == "none" else level
+
+    with archive.ArchiveWriter(str(tar_path), compression, level) as writer:
+        writer.add_bytes("dpkg", payload)
+
+    raw = tar_path.read_bytes()
+    if compression == "zstd":
+        raw = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(raw)).read()
+    with tarfile.open(fileobj=io.BytesIO(raw), mode="r:*") as tar_file:
+        assert tar_file.extractfile("dpkg").read() == payload
+    if compression != "none":
+        assert tar_path.stat().st_size < len(payload)
+
+
+def read_tarball(path, compression):
+    """Return content of members of a tarball made of concatenated frames."""
+    raw = path.read_bytes()
+    if compression == "zstd":
+        raw = (
+            zstandard.ZstdDecompressor()
+            .stream_reader(io.BytesIO(raw), read_across_frames=True)
+            .read()
+        )
+    elif compression != "none":
+        decompress = {
+            "gzip": gzip.decompress,
+            "bz2": bz2.decompress,
+            "xz": lzma.decompress,
+        }
+        raw = decompress[compression](raw)
+    assert len(raw) % tarfile.RECORDSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(raw), mode="r") as tar_file:
+        return {
+            member.name: tar_file.extractfile(member).read()
+            for member in tar_file.getmembers()
+        }
+
+
+def test_compress_frame_none():
+    """Test that data are framed without change if compression is disabled."""
+    assert archive.compress_frame(b"data", "none") == b"data"
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bz2", "xz", "zstd"])
+def test_framed_archive_writer(compression, tmp_path, mocker):
+    """Test that members compressed in frames by an executor form valid tarball."""
+    mocker.patch.object(archive, "FRAME_SIZE", 4096)
+    mocker.patch.object(archive, "FRAME_WINDOW", 2)
+    tar_path = tmp_path / f"output{archive.archive_suffix(compression)}"
+    members = {f"member_{index}": b"x" * index * 1000 for index in range(10)}
+    members["long_name_" * 20] = b"pax header"
+
+    with ThreadPoolExecutor(4) as executor:
+        with archive.FramedArchiveWriter(
+            str(tar_path), compression, None, executor
+        ) as writer:
+            for name, content in members.items():
+                writer.add_stream(name, io.BytesIO(content + b"ignored"), len(content))
+        writer.close()
+
+    assert read_tarball(tar_path, compression) == members
+
+
+def test_framed_archive_writer_errors(tmp_path):
+    """Test that empty writer creates no file and that short stream is an error."""
+    tar_path = tmp_path / "output.tar.gz"
+
+    with ThreadPoolExecutor(1) as executor:
+        writer = archive.FramedArchiveWriter(str(tar_path), "gzip", 1, executor)
+        writer.close()
+        assert not tar_path.exists()
+
+        with pytest.raises(OSError, match="unexpected end of data"):
+            writer.add_stream("member", io.BytesIO(b"short"), 10)
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_writer_factory_executor(compression, tmp_path):
+    """Test that compressed tarballs are compressed by executor of writer factory."""
+    tar_path = tmp_path / f"output{archive.archive_suffix(compression)}"
+
+    with ThreadPoolExecutor(1) as executor:
+        archives = archive.ArchiveSet(archive.writer_factory(compression, None, executor))
+        writer = archives.get(str(tar_path))
+        writer.add_bytes("member", b"data")
+        assert archives.close() == {str(tar_path): None}
+
+    expected = (
+        archive.ArchiveWriter if compression == "none" else archive.FramedArchiveWriter
+    )
+    assert isinstance(writer, expected)
+    assert read_tarball(tar_path, compression) == {"member": b"data"}
+
+
+@pytest.mark.parametrize(
+    "compression, suffix",
+    [("none", ".tar"), ("gzip", ".tar.gz"), ("xz", ".tar.xz"), ("zstd", ".tar.zst")],
+)
+def test_archive_suffix(compression, suffix):
+    """Test file name suffixes of compressed archives."""
+    assert archive.archive_suffix(compression) == suffix
+
+
+@pytest.mark.parametrize(
+    "compression, level, zstd_available",
+    [("lz4", None, True), ("gzip", 10, True), ("none", 1, True), ("zstd", None, False)],
+)
+def test_validate_compression_error(compression, level, zstd_available, mocker):
+    """Test that unsupported codecs and levels are rejected."""
+    if not zstd_available:
+        mocker.patch.object(archive, "zstandard", None)
+
+    with pytest.raises(ValueError):
+        archive.validate_compression(compression, level)
+    with pytest.raises(ValueError):
+        archive.writer_factory(compression, level)
+
+
+def test_archive_set_shares_writers(tmp_path):
+    """Test that archive set returns one writer per path and finalizes all of them."""
+    archives = archive.ArchiveSet(archive.writer_factory("gzip", 1))
+    first = archives.get(str(tmp_path / "first.tar.gz"))
+    first.add_bytes("member", b"data")
+
+    assert archives.get(str(tmp_path / "first.tar.gz")) is first
+    assert archives.get(str(tmp_path / "second.tar.gz")).compression == "gzip"
+    assert archives.close() == {
+        str(tmp_path / "first.tar.gz"): None,
+        str(tmp_path / "second.tar.gz"): None,
+    }
+    assert archives.close() == {}
+    with tarfile.open(tmp_path / "first.tar.gz", "r:gz") as tar_file:
+        assert tar_file.getnames() == ["member"]
+
+
+def test_archive_set_staging(tmp_path):
+    """Test that tarballs appear at their final path only when they are complete."""
+    staging_path = tmp_path / "staging" / "run-1"
+    archives = archive.ArchiveSet(staging_path=str(staging_path))
+    final_path = tmp_path / "output.tar"
+    archives.get(str(final_path)).add_bytes("member", b"data")
+    archives.get(str(tmp_path / "empty.tar"))
+
+    assert not final_path.exists()
+    assert (staging_path / "output.tar").exists()
+
+    assert archives.close() == {str(final_path): None, str(tmp_path / "empty.tar"): None}
+    with tarfile.open(final_path, "r") as tar_file:
+        assert tar_file.getnames() == ["member"]
+    assert not staging_path.exists()
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_archive_set_index(compression, tmp_path):
+    """Test that sidecar index is published with its tarball."""
+    staging_path = tmp_path / "staging"
+    tar_path = tmp_path / f"output{archive.archive_suffix(compression)}"
+    index_path = tmp_path / f"{tar_path.name}{archive.INDEX_SUFFIX}"
+
+    with ThreadPoolExecutor(1) as executor:
+        factory = archive.writer_factory(compression, None, executor, index=True)
+        archives = archive.ArchiveSet(factory, str(staging_path))
+        archives.get(str(tar_path)).add_bytes("member", b"data")
+        assert archives.close() == {str(tar_path): None}
+
+    assert read_tarball(tar_path, compression) == {"member": b"data"}
+    assert index_path.exists()
+    assert not staging_path.exists()
+
+
+def test_archive_set_staging_no_clobber(tmp_path):
+    """Test that existing file is never replaced, tarball gets a numbered name."""
+    staging_path = tmp_path / "staging"
+    final_path = tmp_path / "output_@_20230501100000.tar"
+    final_path.write_bytes(b"previous run")
+    (tmp_path / "output_@_20230501100000_@_1.tar").write_bytes(b"previous run")
+    factory = archive.writer_factory(index=True)
+    archives = archive.ArchiveSet(factory, str(staging_path))
+    archives.get(str(final_path)).add_bytes("member", b"data")
+
+    published = tmp_path / "output_@_20230501100000_@_2.tar"
+    assert archives.close() == {str(published): None}
+    assert final_path.read_bytes() == b"previous run"
+    with tarfile.open(published, "r") as tar_file:
+        assert tar_file.getnames() == ["member"]
+    with open(f"{published}{archive.INDEX_SUFFIX}", "r", encoding="UTF-8") as index:
+        assert json.load(index)["archive"] == published.name
+    assert not staging_path.exists()
+
+
+def test_archive_set_publish_failure(tmp_path, mocker):
+    """Test that tarball that can't be published is kept in staging."""
+    staging_path = tmp_path / "staging"
+    final_path = tmp_path / "output.tar"
+    mocker.patch.object(archive.os, "link", side_effect=PermissionError("denied"))
+    archives = archive.ArchiveSet(staging_path=str(staging_path))
+    archives.get(str(final_path)).add_bytes("member", b"data")
+
+    errors = archives.close()
+
+    assert isinstance(errors[str(final_path)], PermissionError)
+    assert not final_path.exists()
+    assert (staging_path / "output.tar").exists()
+
+
+def test_archive_set_on_published(tmp_path, mocker):
+    """Test that callbacks run only if all their archives were published."""
+    archives = archive.ArchiveSet(staging_path=str(tmp_path / "staging"))
+    good, bad = str(tmp_path / "good.tar"), str(tmp_path / "bad.tar")
+    archives.get(good).add_bytes("member", b"data")
+    archives.get(bad).add_bytes("member", b"data")
+    callbacks = MagicMock()
+    archives.on_published([good], callbacks.good, callbacks.discard_good)
+    archives.on_published([good, bad], callbacks.bad, callbacks.discard_bad)
+    archives.on_published([str(tmp_path / "never-created.tar")], callbacks.empty)
+    link = os.link
+
+    def fail_bad(source, destination):
+        if destination == bad:
+            raise PermissionError("denied")
+        link(source, destination)
+
+    mocker.patch.object(archive.os, "link", side_effect=fail_bad)
+    callbacks.good.side_effect = lambda: callbacks.published(os.path.exists(good))
+
+    archives.close()
+
+    callbacks.published.assert_called_once_with(True)
+    callbacks.bad.assert_not_called()
+    callbacks.discard_bad.assert_called_once_with()
+    callbacks.discard_good.assert_not_called()
+    callbacks.empty.assert_called_once_with()
+
+
+def test_numbered_path():
+    """Test that number is added as the last field of the file name."""
+    path = "/a/b.c_@_x_@_1.tar.gz"
+    assert archive.numbered_path(path, 2) == "/a/b.c_@_x_@_1_@_2.tar.gz"
+    assert archive.numbered_path("output.tar", 1) == "output_@_1.tar"
+
+
+def test_archive_set_factory(tmp_path):
+    """Test that archive set creates writers with custom factory."""
+    writer = archive.ArchiveWriter(str(tmp_path / "custom.tar"))
+    archives = archive.ArchiveSet(factory=lambda path: writer)
+
+    assert archives.get(str(tmp_path / "output.tar")) is writer
@@ -0,0 +1,160 @@
+"""Tests for software_inventory_collector.budget module"""
+import asyncio
+import threading
+from collections import namedtuple
+
+import pytest
+
+from software_inventory_collector import budget
+from software_inventory_collector.exception import CollectionError
+
+DiskUsage = namedtuple("DiskUsage", ["total", "used", "free"])
+
+
+@pytest.mark.parametrize(
+    "limit, partial, expected",
+    [
+        (None, False, [60, 60]),
+        (100, False, [60, 0]),
+        (100, True, [60, 40]),
+    ],
+)
+def test_byte_budget_take(limit, partial, expected):
+    """Test that budget grants requests fully, partially or not at all."""
+    byte_budget = budget.ByteBudget(limit)
+
+    assert [byte_budget.take(60, partial), byte_budget.take(60, partial)] == expected
+    assert byte_budget.take(0, partial) == 0
+
+
+def test_in_flight_limiter_wait():
+    """Test that waiting thread continues only after held data are released."""
+    limiter = budget.InFlightLimiter(100)
+    limiter.add(150)
+    resumed = threading.Event()
+
+    def wait():
+        limiter.wait()
+        resumed.set()
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    assert not resumed.wait(0.05)
+
+    limiter.release(100)
+    waiter.join(1)
+    assert resumed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_in_flight_limiter_wait_async(mocker):
+    """Test that waiting coroutine polls until held data are released."""
+    mocker.patch.object(budget, "POLL_INTERVAL", 0.01)
+    limiter = budget.InFlightLimiter(100)
+    limiter.add(100)
+    asyncio.get_running_loop().call_later(0.03, limiter.release, 100)
+
+    await asyncio.wait_for(limiter.wait_async(), 1)
+
+    assert not limiter.exceeded
+
+
+def test_in_flight_limiter_unlimited():
+    """Test that limiter without limit never blocks."""
+    limiter = budget.InFlightLimiter()
+    limiter.add(10**12)
+
+    assert not limiter.exceeded
+    limiter.wait()
+
+
+def test_in_flight_reservation():
+    """Test that reserved data are settled to their actual size and released."""
+    limiter = budget.InFlightLimiter(100)
+
+    with limiter.reserve(100) as reservation:
+        assert limiter.exceeded
+        reservation.settle(20)
+        assert limiter.in_flight == 20
+        reservation.settle(250)
+        assert limiter.in_flight == 250
+
+    assert limiter.in_flight == 0
+
+
+def test_disk_guard_wait(mocker):
+    """Test that writing waits until enough free space is available."""
+    mocker.patch.object(budget, "POLL_INTERVAL", 0)
+    usage = mocker.patch.object(
+        budget.shutil,
+        "disk_usage",
+        side_effect=[DiskUsage(100, 95, 5), DiskUsage(100, 50, 50)],
+    )
+
+    budget.DiskGuard("/output", min_free=10).wait()
+
+    assert usage.call_count == 2
+    usage.assert_called_with("/output")
+
+
+def test_disk_guard_timeout(mocker):
+    """Test that error is raised if free space does not become available in time."""
+    mocker.patch.object(budget, "POLL_INTERVAL", 0)
+    mocker.patch.object(budget.shutil, "disk_usage", return_value=DiskUsage(1, 1, 0))
+
+    with pytest.raises(CollectionError, match="Less than 10 bytes of free space"):
+        budget.DiskGuard("/output", min_free=10, timeout=0).wait()
+
+
+@pytest.mark.asyncio
+async def test_disk_guard_wait_async(mocker):
+    """Test that coroutine waits for free space and gives up after timeout."""
+    mocker.patch.object(budget, "POLL_INTERVAL", 0)
+    mocker.patch.object(
+        budget.shutil,
+        "disk_usage",
+        side_effect=[DiskUsage(1, 1, 0), DiskUsage(1, 0, 1), DiskUsage(1, 1, 0)],
+    )
+
+    await budget.DiskGuard("/output", min_free=1, timeout=60).wait_async()
+    with pytest.raises(CollectionError):
+        await budget.DiskGuard("/output", min_free=1, timeout=0).wait_async()
+
+
+def test_disk_guard_disabled(mocker):
+    """Test that free space is not checked if minimum is not set."""
+    usage = mocker.patch.object(budget.shutil, "disk_usage")
+
+    assert budget.DiskGuard("/output").has_space()
+    usage.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "action, expected",
+    [
+        ("skip", [(50, None), (0, "max_artifact_size"), (40, None), (0, "max_run_size")]),
+        (
+            "truncate",
+            [
+                (50, None),
+                (60, "max_artifact_size"),
+                (10, "max_run_size"),
+                (0, "max_run_size"),
+            ],
+        ),
+    ],
+)
+def test_run_limits_admit(action, expected):
+    """Test that artifacts over per-artifact and per-run budgets are limited."""
+    limits = budget.RunLimits(
+        max_artifact_size=60, max_run_size=120, oversize_action=action
+    )
+
+    results = [limits.admit(size) for size in (50, 80, 40, 40)]
+
+    for (allowed, reason), (expected_allowed, expected_reason) in zip(results, expected):
+        assert allowed == expected_allowed
+        if expected_reason is None:
+            assert reason is None
+        else:
+            assert expected_reason in reason
@@ -1,10 +1,34 @@
 """Tests for software_inventory_collector.cli module"""
-from unittest.mock import AsyncMock, MagicMock, mock_open, patch
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+from unittest.mock import ANY, AsyncMock, MagicMock, mock_open, patch
 
 import pytest
 import yaml
-
-from software_inventory_collector import cli
+from juju import jasyncio
+from juju.errors import JujuError
+
+from software_inventory_collector import cli, collector, discovery, report, watcher
+from software_inventory_collector.config import _ConfigJujuController
+from software_inventory_collector.report import EXIT_FAILURE, EXIT_PARTIAL_FAILURE
+from software_inventory_collector.schedule import CronSchedule, IntervalSchedule
+
+# modules that must not be imported when only validating config
+HEAVY_MODULES = [
+    "juju",
+    "requests",
+    "websockets",
+    "software_inventory_collector.collector",
+]
+# config of the only controller of mocked configs
+SOURCE = _ConfigJujuController("10.0.0.1:17070", "cert", "admin", "admin")
+# budget for import of the CLI module, in microseconds (Juju stack alone takes ~0.5s)
+IMPORT_TIME_BUDGET_US = 250_000
 
 
 @pytest.mark.parametrize("dry_run", [True, False])
@@ -64,6 +88,10 @@ def test_cli_main_success(dry_run, mocker):
     """Test successfully running 'main' function."""
     conf_path = "/path/to/conf"
     cli_args = MagicMock()
+    cli_args.daemon = False
+    cli_args.check_config = False
+    cli_args.shard = None
+    cli_args.merge_reports = None
     cli_args.config = conf_path
     cli_args.dry_run = dry_run
 
@@ -72,24 +100,33 @@ def test_cli_main_success(dry_run, mocker):
     controller.disconnect.side_effect = controller_disconnect
 
     config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
 
     parse_cli_mock = mocker.patch.object(cli, "parse_cli", return_value=cli_args)
     parse_config_mock = mocker.patch.object(cli, "parse_config", return_value=config)
     get_controller_mock = mocker.patch.object(
-        cli, "get_controller", return_value=controller
+        collector, "get_controller", return_value=controller
     )
-    get_exporter_data_mock = mocker.patch.object(cli, "get_exporter_data")
-    get_juju_data_mock = mocker.patch.object(cli, "get_juju_data")
+    get_exporter_data_mock = mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
 
     with pytest.raises(SystemExit) as exc:
         cli.main()
 
     parse_cli_mock.assert_called_once()
     parse_config_mock.assert_called_once_with(conf_path)
-    get_controller_mock.assert_called_once_with(config)
+    get_controller_mock.assert_called_once_with(config, SOURCE)
     if not dry_run:
-        get_exporter_data_mock.assert_called_once_with(config)
-        get_juju_data_mock.assert_called_once_with(config, controller)
+        get_exporter_data_mock.assert_called_once_with(config, ANY, [])
+        get_juju_data_mock.assert_called_once_with(config, controller, ANY, SOURCE)
     else:
         get_exporter_data_mock.assert_not_called()
         get_juju_data_mock.assert_not_called()
@@ -103,15 +140,19 @@ def test_cli_main_config_error(mocker):
     """Test failure of main function during config loading."""
     conf_path = "/path/to/conf"
     cli_args = MagicMock()
+    cli_args.daemon = False
+    cli_args.check_config = False
+    cli_args.shard = None
+    cli_args.merge_reports = None
     cli_args.config = conf_path
 
     mocker.patch.object(cli, "parse_cli", return_value=cli_args)
     parse_config_mock = mocker.patch.object(
         cli, "parse_config", side_effect=cli.ConfigError
     )
-    get_controller_mock = mocker.patch.object(cli, "get_controller")
-    get_exporter_data_mock = mocker.patch.object(cli, "get_exporter_data")
-    get_juju_data_mock = mocker.patch.object(cli, "get_juju_data")
+    get_controller_mock = mocker.patch.object(collector, "get_controller")
+    get_exporter_data_mock = mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
 
     with pytest.raises(SystemExit) as exc:
         cli.main()
@@ -127,22 +168,35 @@ def test_cli_main_juju_error(mocker):
     """Test failure of main function during connection to juju controller."""
     conf_path = "/path/to/conf"
     cli_args = MagicMock()
+    cli_args.daemon = False
+    cli_args.check_config = False
+    cli_args.shard = None
+    cli_args.merge_reports = None
     cli_args.config = conf_path
     config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
 
     mocker.patch.object(cli, "parse_cli", return_value=cli_args)
     parse_config_mock = mocker.patch.object(cli, "parse_config", return_value=config)
     get_controller_mock = mocker.patch.object(
-        cli, "get_controller", side_effect=cli.JujuError
+        collector, "get_controller", side_effect=JujuError
     )
-    get_exporter_data_mock = mocker.patch.object(cli, "get_exporter_data")
-    get_juju_data_mock = mocker.patch.object(cli, "get_juju_data")
+    get_exporter_data_mock = mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
 
     with pytest.raises(SystemExit) as exc:
         cli.main()
 
     parse_config_mock.assert_called_once_with(conf_path)
-    get_controller_mock.assert_called_once_with(config)
+    get_controller_mock.assert_called_once_with(config, SOURCE)
     get_exporter_data_mock.assert_not_called()
     get_juju_data_mock.assert_not_called()
     assert exc.value.code == 1
@@ -152,6 +206,10 @@ def test_cli_main_collection_error(mocker):
     """Test failure of main function during data collection."""
     conf_path = "/path/to/conf"
     cli_args = MagicMock()
+    cli_args.daemon = False
+    cli_args.check_config = False
+    cli_args.shard = None
+    cli_args.merge_reports = None
     cli_args.config = conf_path
     cli_args.dry_run = False
 
@@ -160,26 +218,583 @@ def test_cli_main_collection_error(mocker):
     controller.disconnect.side_effect = controller_disconnect
 
     config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
 
     parse_cli_mock = mocker.patch.object(cli, "parse_cli", return_value=cli_args)
     parse_config_mock = mocker.patch.object(cli, "parse_config", return_value=config)
     get_controller_mock = mocker.patch.object(
-        cli, "get_controller", return_value=controller
+        collector, "get_controller", return_value=controller
     )
     get_exporter_data_mock = mocker.patch.object(
-        cli, "get_exporter_data", side_effect=Exception
+        collector, "get_exporter_data", side_effect=Exception
     )
-    get_juju_data_mock = mocker.patch.object(cli, "get_juju_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
 
     with pytest.raises(SystemExit) as exc:
         cli.main()
 
     parse_cli_mock.assert_called_once()
     parse_config_mock.assert_called_once_with(conf_path)
-    get_controller_mock.assert_called_once_with(config)
-    get_exporter_data_mock.assert_called_once_with(config)
-    get_juju_data_mock.assert_not_called()
+    get_controller_mock.assert_called_once_with(config, SOURCE)
+    get_exporter_data_mock.assert_called_once_with(config, ANY, [])
+    # failure of one phase does not prevent the other phase from running
+    get_juju_data_mock.assert_called_once_with(config, controller, ANY, SOURCE)
 
     controller_disconnect.assert_called_once()
 
     assert exc.value.code == 1
+
+
+@pytest.mark.asyncio
+async def test_collect_phases_run_concurrently(mocker):
+    """Test that exporter and Juju phases overlap instead of running in sequence."""
+    juju_phase_started = threading.Event()
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+
+    def get_exporter_data(*_):
+        assert juju_phase_started.wait(timeout=5)
+
+    async def get_juju_data(*_):
+        juju_phase_started.set()
+
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    mocker.patch.object(collector, "get_exporter_data", side_effect=get_exporter_data)
+    mocker.patch.object(collector, "get_juju_data", side_effect=get_juju_data)
+
+    config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
+
+    assert await cli.collect(config) == 0
+    controller.disconnect.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_collect_exporter_phase_does_not_wait_for_controllers(mocker):
+    """Test that exporter phase runs while the controllers still connect."""
+    exporter_done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+
+    async def get_controller(*_):
+        await asyncio.wait_for(exporter_done.wait(), timeout=5)
+        return controller
+
+    mocker.patch.object(collector, "get_controller", side_effect=get_controller)
+    mocker.patch.object(
+        collector,
+        "get_exporter_data",
+        side_effect=lambda *_: loop.call_soon_threadsafe(exporter_done.set),
+    )
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
+
+    config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
+
+    assert await cli.collect(config) == 0
+    get_juju_data_mock.assert_called_once_with(config, controller, ANY, SOURCE)
+    controller.disconnect.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_collect_unexpected_connection_error(mocker, capsys):
+    """Test that unexpected connection error fails Juju phase, not the exporter."""
+    mocker.patch.object(collector, "get_controller", side_effect=RuntimeError("boom"))
+    get_exporter_data_mock = mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
+
+    config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
+
+    assert await cli.collect(config) == 1
+
+    get_exporter_data_mock.assert_called_once_with(config, ANY, [])
+    get_juju_data_mock.assert_not_called()
+    assert "Failed to collect data: boom" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_collect_with_state(mocker):
+    """Test that state store is shared by both phases and saved after collection."""
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+    config = MagicMock()
+    config.settings.state_file = "/path/to/state.json"
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
+
+    load_mock = mocker.patch.object(cli.StateStore, "load")
+    state = load_mock.return_value
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    get_exporter_data_mock = mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
+
+    assert await cli.collect(config) == 0
+
+    load_mock.assert_called_once_with(config.settings.state_file)
+    get_exporter_data_mock.assert_called_once_with(config, ANY, [])
+    get_juju_data_mock.assert_called_once_with(config, controller, ANY, SOURCE)
+    assert get_exporter_data_mock.call_args.args[1].state is state
+    assert get_juju_data_mock.call_args.args[2].state is state
+    state.save.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_collect_partial_failure(mocker, capsys):
+    """Test that partial failure is summarized and reflected in the exit code."""
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+    config = MagicMock()
+    config.settings.state_file = None
+    config.settings.compression = "none"
+    config.settings.compression_level = None
+    config.settings.packaging_pool = False
+    config.settings.run_report = False
+    config.settings.prometheus_textfile = None
+    config.settings.shard_index = 0
+    config.settings.shard_count = 1
+    config.controllers = [SOURCE]
+
+    def get_exporter_data(config, context, targets):
+        context.report.record("target", "exporter-1")
+        context.report.record("target", "exporter-2", "connection refused")
+
+    async def get_juju_data(config, controller, context, source):
+        context.report.record("model", "openstack")
+
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    mocker.patch.object(collector, "get_exporter_data", side_effect=get_exporter_data)
+    mocker.patch.object(collector, "get_juju_data", side_effect=get_juju_data)
+
+    assert await cli.collect(config) == EXIT_PARTIAL_FAILURE
+
+    output = capsys.readouterr().out
+    assert "Collection summary: 2 succeeded, 1 failed" in output
+    assert "FAILED  target 'exporter-2': connection refused" in output
+
+
+@pytest.mark.asyncio
+async def test_collect_writes_run_report(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that JSON run report and Prometheus textfile are written after the run."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.prometheus_textfile = str(tmp_path / "collector.prom")
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+
+    async def get_juju_data(config, controller, context, source):
+        context.report.add_bytes("model", "openstack", transferred=10, written=10)
+
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    mocker.patch.object(collector, "get_exporter_data")
+    mocker.patch.object(collector, "get_juju_data", side_effect=get_juju_data)
+
+    assert await cli.collect(collector_config) == 0
+
+    with open(
+        report.get_run_report_path(collector_config, collection_context),
+        encoding="UTF-8",
+    ) as file:
+        run_report = json.load(file)
+    assert run_report["bytes_written"] == 10
+    assert "connect" in run_report["phases"]
+    assert (tmp_path / "collector.prom").exists()
+
+
+@pytest.mark.asyncio
+async def test_collect_connection_failure_report(
+    collector_config, mocker, capsys, collection_context
+):
+    """Test that failed controller connection is reported and write errors printed."""
+    mocker.patch.object(collector, "get_controller", side_effect=JujuError("refused"))
+    get_exporter_data_mock = mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(collector, "get_juju_data")
+    write_json_mock = mocker.patch.object(
+        cli.RunReport, "write_json", side_effect=IOError("disk full")
+    )
+
+    assert await cli.collect(collector_config) == 1
+
+    # exporter targets are collected even if no controller is connected
+    get_exporter_data_mock.assert_called_once()
+    get_juju_data_mock.assert_not_called()
+
+    write_json_mock.assert_called_once_with(
+        report.get_run_report_path(collector_config, collection_context)
+    )
+    assert "Failed to write run report: disk full" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_collect_sharded_skips_prometheus(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that shards write only JSON report, Prometheus textfile is merged later."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.prometheus_textfile = str(tmp_path / "collector.prom")
+    collector_config.settings.shard_count = 2
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    mocker.patch.object(collector, "get_exporter_data")
+    mocker.patch.object(collector, "get_juju_data")
+
+    assert await cli.collect(collector_config) == 0
+
+    assert os.path.exists(
+        report.get_run_report_path(collector_config, collection_context)
+    )
+    assert not (tmp_path / "collector.prom").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dry_run, exit_code", [(False, EXIT_PARTIAL_FAILURE), (True, 1)])
+async def test_collect_multiple_controllers(
+    dry_run, exit_code, collector_config, mocker, tmp_path, collection_context
+):
+    """Test that all controllers are collected at once, despite failure of one."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.juju_controller.name = "region-1"
+    collector_config.juju_controllers = [
+        _ConfigJujuController("10.0.0.2:17070", "cert", "admin", "admin", "region-2"),
+        _ConfigJujuController("10.0.0.3:17070", "cert", "admin", "admin", "region-3"),
+    ]
+    controllers = {}
+
+    async def get_controller(_, source):
+        if source.name == "region-3":
+            raise JujuError("refused")
+        controllers[source.name] = MagicMock()
+        controllers[source.name].disconnect.side_effect = AsyncMock()
+        return controllers[source.name]
+
+    async def get_juju_data(config, controller, context, source):
+        context.report.record("model", f"{source.name}_default")
+
+    mocker.patch.object(collector, "get_controller", side_effect=get_controller)
+    mocker.patch.object(collector, "get_exporter_data")
+    get_juju_data_mock = mocker.patch.object(
+        collector, "get_juju_data", side_effect=get_juju_data
+    )
+
+    assert await cli.collect(collector_config, dry_run) == exit_code
+
+    for controller in controllers.values():
+        controller.disconnect.assert_called_once()
+    if not dry_run:
+        assert [call_args.args[1] for call_args in get_juju_data_mock.call_args_list] == [
+            controllers["region-1"],
+            controllers["region-2"],
+        ]
+        with open(
+            report.get_run_report_path(collector_config, collection_context),
+            encoding="UTF-8",
+        ) as file:
+            entries = json.load(file)["entries"]
+        assert [entry["name"] for entry in entries] == [
+            "10.0.0.3:17070",
+            "region-1_default",
+            "region-2_default",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_collect_discovered_targets(collector_config, mocker, tmp_path):
+    """Test that targets discovered during the run are collected by follow-up phase."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.state_file = str(tmp_path / "state.json")
+    collector_config.settings.discover_targets = True
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+    key = discovery.discovery_key(collector_config.juju_controller.endpoint, "model-1")
+    collected = []
+
+    def get_exporter_data(config, context, targets):
+        collected.append([target.hostname for target in targets])
+        for target in targets:
+            context.report.record("target", target.hostname)
+        if len(collected) == 2:
+            raise ValueError("exporter failed")
+
+    async def get_juju_data(config, controller, context, source):
+        context.state.set(key, {"host-1": "10.0.0.5:8675", "host-2": "10.0.0.6:8675"})
+
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    mocker.patch.object(collector, "get_exporter_data", side_effect=get_exporter_data)
+    mocker.patch.object(collector, "get_juju_data", side_effect=get_juju_data)
+    cli.StateStore(
+        collector_config.settings.state_file, {key: {"host-1": "10.0.0.5:8675"}}
+    ).save()
+
+    assert await cli.collect(collector_config) == EXIT_PARTIAL_FAILURE
+
+    assert collected == [["exporter-host-1", "exporter-host-2", "host-1"], ["host-2"]]
+    state = cli.StateStore.load(collector_config.settings.state_file)
+    assert state.get(key) == {"host-1": "10.0.0.5:8675", "host-2": "10.0.0.6:8675"}
+
+
+def test_merge_reports(collector_config, tmp_path, capsys, collection_context):
+    """Test that run reports of shards are merged into unsharded run report."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.prometheus_textfile = str(tmp_path / "collector.prom")
+    collector_config.settings.shard_count = 2
+    paths = []
+    for index, error in enumerate([None, "refused"]):
+        shard_report = cli.RunReport()
+        shard_report.record("target", f"exporter-{index}", error)
+        shard_report.finish()
+        paths.append(str(tmp_path / f"report-{index}.json"))
+        shard_report.write_json(paths[-1])
+
+    assert cli.merge_reports(collector_config, paths) == EXIT_PARTIAL_FAILURE
+
+    assert collector_config.settings.shard_count == 1
+    with open(
+        report.get_run_report_path(collector_config, collection_context),
+        encoding="UTF-8",
+    ) as file:
+        assert len(json.load(file)["entries"]) == 2
+    assert (tmp_path / "collector.prom").exists()
+    assert "1 succeeded, 1 failed" in capsys.readouterr().out
+
+
+def test_merge_reports_invalid(collector_config, tmp_path, capsys):
+    """Test that merge fails if any of the reports can't be loaded."""
+    report_path = tmp_path / "report.json"
+    report_path.write_text("{}", encoding="UTF-8")
+
+    assert cli.merge_reports(collector_config, [str(report_path)]) == EXIT_FAILURE
+
+    assert "Failed to load run report" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "shard_args, merge_args, exit_code",
+    [
+        (["--shard", "1/3"], [], 0),
+        (["--shard", "3/3"], [], 1),
+        ([], ["--merge-reports", "x.json"], 2),
+    ],
+)
+def test_cli_main_shard_options(
+    shard_args, merge_args, exit_code, collector_config_data, mocker, tmp_path
+):
+    """Test that shard is selected on command line and reports are merged."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(collector_config_data), encoding="UTF-8")
+    argv = ["collector", "-c", str(config_path), *shard_args, *merge_args]
+    mocker.patch("sys.argv", argv)
+    collect_mock = mocker.patch.object(cli, "collect", MagicMock(return_value=0))
+    mocker.patch.object(jasyncio, "run", side_effect=lambda result: result)
+    merge_mock = mocker.patch.object(cli, "merge_reports", return_value=2)
+
+    with pytest.raises(SystemExit) as exc:
+        cli.main()
+
+    assert exc.value.code == exit_code
+    if merge_args:
+        merge_mock.assert_called_once_with(ANY, ["x.json"])
+        collect_mock.assert_not_called()
+    elif exit_code == 0:
+        config = collect_mock.call_args.args[0]
+        assert (config.settings.shard_index, config.settings.shard_count) == (1, 3)
+
+
+@pytest.mark.parametrize("schedule_interval, exit_code", [(None, 1), (60, 0)])
+def test_cli_main_daemon(schedule_interval, exit_code, collector_config, mocker):
+    """Test that daemon mode requires schedule defined in the config."""
+    collector_config.settings.schedule_interval = schedule_interval
+    cli_args = MagicMock()
+    cli_args.daemon = True
+    cli_args.dry_run = False
+    cli_args.check_config = False
+    cli_args.shard = None
+    cli_args.merge_reports = None
+    mocker.patch.object(cli, "parse_cli", return_value=cli_args)
+    mocker.patch.object(cli, "parse_config", return_value=collector_config)
+    run_daemon_mock = mocker.patch.object(cli, "run_daemon", MagicMock(return_value=0))
+    mocker.patch.object(jasyncio, "run", side_effect=lambda result: result)
+
+    with pytest.raises(SystemExit) as exc:
+        cli.main()
+
+    assert exc.value.code == exit_code
+    assert run_daemon_mock.called is (schedule_interval is not None)
+
+
+@pytest.mark.asyncio
+async def test_run_daemon(collector_config, mocker, capsys):
+    """Test periodic collection with reconnection and graceful stop on SIGTERM."""
+    collector_config.settings.run_report = False
+    first, second = MagicMock(), MagicMock()
+    first.disconnect.side_effect = AsyncMock(side_effect=OSError("already closed"))
+    second.disconnect.side_effect = AsyncMock()
+    first.is_connected.side_effect = [True, False]
+    get_controller_mock = mocker.patch.object(
+        collector,
+        "get_controller",
+        side_effect=[JujuError("controller unreachable"), first, second],
+    )
+    new_context_spy = mocker.spy(cli.CollectionContext, "new")
+    cycles = []
+
+    async def collect_cycle(config, controllers, context):
+        assert context.report.run_id == context.run_id
+        assert context.watchers == {}
+        controller = next(iter(controllers.values()), None)
+        cycles.append((controller, context.session))
+        if len(cycles) == 4:
+            os.kill(os.getpid(), signal.SIGTERM)
+        return 0
+
+    mocker.patch.object(cli, "collect_cycle", side_effect=collect_cycle)
+
+    assert await cli.run_daemon(collector_config, IntervalSchedule(0.01)) == 0
+
+    assert get_controller_mock.call_count == 3
+    # exporter targets are collected even if the controller is unreachable
+    assert [controller for controller, _ in cycles] == [None, first, first, second]
+    assert len({session for _, session in cycles}) == 1
+    assert new_context_spy.call_count == 4
+    assert len({context.run_id for context in new_context_spy.spy_return_list}) == 4
+    first.disconnect.assert_called_once()
+    second.disconnect.assert_called_once()
+    output = capsys.readouterr().out
+    assert "Failed to connect to juju controller: controller unreachable" in output
+    assert "Failed to disconnect from juju controller: already closed" in output
+    assert "Collector stopped." in output
+
+
+@pytest.mark.asyncio
+async def test_run_daemon_watch_models(collector_config, mocker):
+    """Test that watched models are shared by collections and closed on reconnect."""
+    collector_config.settings.run_report = False
+    collector_config.settings.watch_models = True
+    collector_config.settings.watch_max_staleness = 600
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+    controller.is_connected.return_value = False
+    mocker.patch.object(collector, "get_controller", return_value=controller)
+    close_mock = mocker.patch.object(watcher.ModelWatcher, "close", AsyncMock())
+    watchers = []
+
+    async def collect_cycle(config, controllers, context):
+        watchers.append(context.watchers)
+        if len(watchers) == 2:
+            os.kill(os.getpid(), signal.SIGTERM)
+        return 0
+
+    mocker.patch.object(cli, "collect_cycle", side_effect=collect_cycle)
+
+    assert await cli.run_daemon(collector_config, IntervalSchedule(0.01)) == 0
+
+    assert watchers[0] is watchers[1]
+    assert watchers[0][""].max_staleness == 600
+    # before both connections and when the daemon stops
+    assert close_mock.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_run_daemon_stops_while_waiting(collector_config, mocker):
+    """Test that daemon stops without collecting when signalled before next run."""
+    get_controller_mock = mocker.patch.object(collector, "get_controller")
+    asyncio.get_running_loop().call_soon(os.kill, os.getpid(), signal.SIGTERM)
+
+    schedule = CronSchedule("0 0 1 1 *")
+
+    assert await cli.run_daemon(collector_config, schedule) == 0
+
+    get_controller_mock.assert_not_called()
+
+
+@pytest.mark.parametrize("valid, exit_code", [(True, 0), (False, 1)])
+def test_cli_main_check_config(valid, exit_code, collector_config_data, mocker, tmp_path):
+    """Test that '--check-config' only validates the config file."""
+    if not valid:
+        del collector_config_data["settings"]["customer"]
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(collector_config_data), encoding="UTF-8")
+    mocker.patch("sys.argv", ["collector", "-c", str(config_path), "--check-config"])
+    get_controller_mock = mocker.patch.object(collector, "get_controller")
+
+    with pytest.raises(SystemExit) as exc:
+        cli.main()
+
+    assert exc.value.code == exit_code
+    get_controller_mock.assert_not_called()
+
+
+def test_cli_import_time_budget(collector_config_data, tmp_path):
+    """Test that checking config neither imports Juju stack nor exceeds time budget."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(collector_config_data), encoding="UTF-8")
+    script = (
+        "import sys\n"
+        "from software_inventory_collector import cli\n"
+        f"sys.argv = ['collector', '-c', {str(config_path)!r}, '--check-config']\n"
+        "try:\n"
+        "    cli.main()\n"
+        "except SystemExit:\n"
+        "    print(' '.join(sorted(sys.modules)))\n"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    imported = set(result.stdout.split())
+    for heavy_module in HEAVY_MODULES:
+        assert heavy_module not in imported
+    # each line of importtime output is "import time: self | cumulative | module"
+    cumulative = {
+        fields[2].strip(): int(fields[1])
+        for fields in (
+            line.split(":", 1)[1].split("|")
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:") and "cumulative" not in line
+        )
+    }
+    assert cumulative["software_inventory_collector.cli"] < IMPORT_TIME_BUDGET_US
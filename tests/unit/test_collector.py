@@ -1,80 +1,716 @@
 """Tests for software_inventory_collector.collector module"""
+import io
+import json
+import os
+import tarfile
+import threading
+import time
 from collections import defaultdict
-from tempfile import NamedTemporaryFile
-from unittest.mock import AsyncMock, MagicMock, call, patch
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from unittest.mock import AsyncMock, MagicMock, call
 
 import pytest
 
-from software_inventory_collector import collector
+from software_inventory_collector import (
+    archive,
+    collector,
+    dedup,
+    delta,
+    packaging,
+    shard,
+)
+from software_inventory_collector.budget import DiskGuard, RunLimits
+from software_inventory_collector.config import (
+    DEFAULT_ENDPOINTS,
+    _ConfigEndpoint,
+    _ConfigJujuController,
+    _ConfigTarget,
+)
+from software_inventory_collector.discovery import discovery_key
+from software_inventory_collector.payload import Payload
+from software_inventory_collector.report import get_run_report_path
+from software_inventory_collector.state import StateStore
+from software_inventory_collector.watcher import ModelWatcher
 
 
-def test_add_file_to_tar(mocker):
-    """Test function that writes content to temp file and adds it to tar."""
-    file_name = "collected_data_file"
-    file_content = "collected data"
-    tar_file_path = "/path/to/tarball"
+def assert_tarballs(expected_calls):
+    """Verify that tarballs contain exactly the expected members.
+
+    :param expected_calls: List of `call(member_name, content, tar_path)` objects.
+    """
+    expected = defaultdict(list)
+    for member_name, content, tar_path in (item.args for item in expected_calls):
+        expected[tar_path].append((member_name, content.encode("UTF-8")))
+
+    for tar_path, members in expected.items():
+        with tarfile.open(tar_path, "r") as tar_file:
+            actual = [
+                (member.name, tar_file.extractfile(member).read())
+                for member in tar_file.getmembers()
+            ]
+        assert sorted(actual) == sorted(members)
 
-    opened_tar = MagicMock()
-    tar_object_mock = MagicMock()
-    tar_object_mock.__enter__.return_value = opened_tar
 
-    temp_file = NamedTemporaryFile()
-    temp_file_write_mock = mocker.patch.object(temp_file, "write")
+def new_context(config, **resources):
+    """Return context of a new collection run that holds given run-scoped resources."""
+    return replace(collector.CollectionContext.new(config.settings), **resources)
 
-    mocker.patch.object(collector, "NamedTemporaryFile", return_value=temp_file)
 
-    with patch.object(
-        collector.tarfile, "open", return_value=tar_object_mock
-    ) as tar_file_mock:
-        collector._add_file_to_tar(file_name, file_content, tar_file_path)
+def write_model(config, model_name, status, bundle, state=None):
+    """Write model's status and bundle into its tarball and finalize it."""
+    context = collector.CollectionContext.new()
+    archives = collector.new_archive_set(config, context)
+    juju_collection = collector._JujuCollection(
+        config, MagicMock(), replace(context, state=state, archives=archives)
+    )
+    written = juju_collection.write_model(model_name, status, bundle)
+    archives.close()
+    return written
+
 
-    temp_file_write_mock.assert_called_once_with(file_content.encode("UTF-8"))
-    tar_file_mock.assert_called_once_with(tar_file_path, "a", encoding="UTF-8")
-    opened_tar.add.assert_called_once_with(temp_file.name, arcname=file_name)
+def delta_document(previous, current, changed):
+    """Return expected delta document of content that only changed some entries."""
+    document = {
+        "format": delta.DELTA_FORMAT,
+        "base": collector._content_hash(previous.encode()),
+        "sha256": collector._content_hash(current.encode()),
+        "added": {},
+        "removed": {},
+        "changed": changed,
+    }
+    return json.dumps(document, sort_keys=True)
 
 
-def test_get_exporter_data_success(collector_config, mocker):
+def make_response(content=b"", status_code=200, headers=None):
+    """Return HTTP response that streams the content from memory."""
+    response = collector.requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(content)
+    response.headers.update(headers or {})
+    return response
+
+
+def test_get_exporter_data_success(
+    collector_config, mocker, tmp_path, collection_context
+):
     """Test function gathering data from exporter endpoints."""
+    collector_config.settings.collection_path = str(tmp_path)
     expected_requests = []
-    expected_responses = []
     expected_tar_calls = []
-    ts = collector.TIMESTAMP
+    responses = {}
+    ts = collection_context.timestamp
     output_dir = collector_config.settings.collection_path
     for target in collector_config.targets:
         tar_path = (
             f"{output_dir}/{target.customer}_@_{target.site}_@_{target.model}_@_{ts}.tar"
         )
-        for endpoint in collector.ENDPOINTS:
+        for endpoint in DEFAULT_ENDPOINTS:
             url = f"http://{target.endpoint}/{endpoint}"
             file_path = f"{endpoint}_@_{target.hostname}_@_{ts}"
-            response = MagicMock()
-            response.text = f"{target.endpoint}/{endpoint} response"
-            expected_responses.append(response)
-            expected_requests.append(call(url, timeout=60))
-            expected_tar_calls.append(call(file_path, response.text, tar_path))
+            text = f"{target.endpoint}/{endpoint} response"
+            responses[url] = make_response(text.encode("UTF-8"))
+            expected_requests.append(call(url, timeout=60, headers={}, stream=True))
+            expected_tar_calls.append(call(file_path, text, tar_path))
 
     get_mock = mocker.patch.object(
-        collector.requests, "get", side_effect=expected_responses
+        collector.requests.Session, "get", side_effect=lambda url, **_: responses[url]
     )
-    add_tar_mock = mocker.patch.object(collector, "_add_file_to_tar")
+
+    report = collector.get_exporter_data(collector_config)
+
+    get_mock.assert_has_calls(expected_requests, any_order=True)
+    assert_tarballs(expected_tar_calls)
+    for entry in report.entries:
+        assert entry.bytes_transferred == entry.bytes_written > 0
+        assert set(entry.phases) == {"http", "write"}
+    assert set(report.phases) == {"exporter"}
+    assert len(report.archives) == len(collector_config.targets)
+
+
+def test_get_exporter_data_concurrency_limits(collector_config, mocker):
+    """Test that exporter requests respect global and per-host concurrency limits."""
+    collector_config.settings.max_concurrency = 4
+    collector_config.settings.max_concurrency_per_host = 1
+    lock = threading.Lock()
+    active = defaultdict(int)
+    peak = defaultdict(int)
+
+    def slow_get(url, **_):
+        host = collector.urlsplit(url).hostname
+        with lock:
+            active[host] += 1
+            active["total"] += 1
+            peak[host] = max(peak[host], active[host])
+            peak["total"] = max(peak["total"], active["total"])
+        time.sleep(0.01)
+        with lock:
+            active[host] -= 1
+            active["total"] -= 1
+        return MagicMock()
+
+    mocker.patch.object(collector.requests.Session, "get", side_effect=slow_get)
+    archive_mock = mocker.patch.object(archive, "ArchiveWriter")
 
     collector.get_exporter_data(collector_config)
 
-    get_mock.assert_has_calls(expected_requests)
-    add_tar_mock.assert_has_calls(expected_tar_calls)
+    assert peak.pop("total") <= collector_config.settings.max_concurrency
+    assert set(peak.values()) == {1}
+    assert archive_mock.return_value.add_stream.call_count == len(
+        collector_config.targets
+    ) * len(DEFAULT_ENDPOINTS)
 
 
-def test_get_exporter_data_error(collector_config, mocker):
-    """Test handling of error during collection of data from exporter endpoint."""
-    exception = collector.requests.RequestException
+def test_get_exporter_data_shared_session(collector_config, mocker):
+    """Test that all exporter requests reuse single provided HTTP session."""
+    session = MagicMock()
+    mocker.patch.object(archive, "ArchiveWriter")
+    new_session_mock = mocker.patch.object(collector, "get_http_session")
+
+    collector.get_exporter_data(
+        collector_config, new_context(collector_config, session=session)
+    )
+
+    new_session_mock.assert_not_called()
+    session.close.assert_not_called()
+    assert session.get.call_count == len(collector_config.targets) * len(
+        DEFAULT_ENDPOINTS
+    )
+
+
+def test_get_exporter_data_endpoint_settings(collector_config, mocker):
+    """Test that endpoints are queried by priority with their own timeouts."""
+    collector_config.settings.max_concurrency = 1
+    collector_config.endpoints = [
+        _ConfigEndpoint("dpkg", timeout=30, priority=-1),
+        _ConfigEndpoint("snap", timeout=5, priority=1),
+        _ConfigEndpoint("kernel", enabled=False),
+    ]
+    session = MagicMock()
+    mocker.patch.object(archive, "ArchiveWriter")
+
+    collector.get_exporter_data(
+        collector_config, new_context(collector_config, session=session)
+    )
+
+    queried = [
+        (request.args[0].rsplit("/", 1)[1], request.kwargs["timeout"])
+        for request in session.get.call_args_list
+    ]
+    assert queried == [("snap", 5)] * 2 + [("dpkg", 30)] * 2
+
+
+def test_get_exporter_data_min_interval(collector_config, mocker, tmp_path):
+    """Test that endpoint with minimal interval is skipped until the interval passes."""
+    collector_config.targets = collector_config.targets[:1]
+    target = collector_config.targets[0]
+    collector_config.endpoints = [
+        _ConfigEndpoint("dpkg", min_interval=3600),
+        _ConfigEndpoint("snap"),
+    ]
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    session = MagicMock()
+    mocker.patch.object(archive, "ArchiveWriter")
+    mocker.patch.object(collector.time, "time", return_value=10000.0)
+    context = new_context(collector_config, session=session, state=state)
+
+    collector.get_exporter_data(collector_config, context)
+    collector.get_exporter_data(collector_config, context)
+    collector.time.time.return_value = 13600.0
+    collector.get_exporter_data(collector_config, context)
+
+    urls = [request.args[0] for request in session.get.call_args_list]
+    assert urls.count(f"http://{target.endpoint}/dpkg") == 2
+    assert urls.count(f"http://{target.endpoint}/snap") == 3
+    assert state.get(f"schedule/{target.endpoint}/dpkg") == {"collected_at": "13600.0"}
+    assert state.get(f"schedule/{target.endpoint}/snap") == {}
+
+
+def test_get_exporter_data_min_interval_incomplete(collector_config, mocker, tmp_path):
+    """Test that endpoint whose payload was truncated is not skipped by next run."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.max_artifact_size = 100
+    collector_config.settings.oversize_action = "truncate"
+    collector_config.targets = collector_config.targets[:1]
+    target = collector_config.targets[0]
+    collector_config.endpoints = [
+        _ConfigEndpoint("dpkg", min_interval=86400),
+        _ConfigEndpoint("snap", min_interval=86400),
+    ]
+    contents = {"dpkg": b"x" * 10000, "snap": b"x" * 10}
+    get_mock = mocker.patch.object(
+        collector.requests.Session,
+        "get",
+        side_effect=lambda url, **_: make_response(contents[url.rsplit("/", 1)[1]]),
+    )
+    state = collector.StateStore(str(tmp_path / "state.json"))
+
+    for _ in range(2):
+        collector.get_exporter_data(
+            collector_config, new_context(collector_config, state=state)
+        )
+
+    urls = [request.args[0] for request in get_mock.call_args_list]
+    assert urls.count(f"http://{target.endpoint}/dpkg") == 2
+    assert urls.count(f"http://{target.endpoint}/snap") == 1
+    assert state.get(f"schedule/{target.endpoint}/dpkg") == {}
+
+
+@pytest.mark.parametrize("status_code", [304, 200])
+def test_get_exporter_data_min_interval_unchanged(
+    status_code, collector_config, mocker, tmp_path
+):
+    """Test that endpoint that did not change counts as collected right away."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = True
+    collector_config.targets = collector_config.targets[:1]
+    target = collector_config.targets[0]
+    collector_config.endpoints = [_ConfigEndpoint("dpkg", min_interval=3600)]
+    responses = iter(
+        [make_response(b"ii  bash  5.1"), make_response(b"ii  bash  5.1", status_code)]
+    )
+    get_mock = mocker.patch.object(
+        collector.requests.Session, "get", side_effect=lambda *_, **__: next(responses)
+    )
+    clock = mocker.patch.object(collector.time, "time", return_value=10000.0)
+    state = collector.StateStore(str(tmp_path / "state.json"))
+
+    for now in (10000.0, 13600.0, 14000.0):
+        clock.return_value = now
+        collector.get_exporter_data(
+            collector_config, new_context(collector_config, state=state)
+        )
+
+    assert get_mock.call_count == 2
+    assert state.get(f"schedule/{target.endpoint}/dpkg") == {"collected_at": "13600.0"}
+    assert len(list(tmp_path.glob("*.tar"))) == 1
+
+
+def test_get_exporter_data_given_targets(collector_config, mocker, tmp_path):
+    """Test that only the given targets are queried, if there are any."""
+    collector_config.settings.collection_path = str(tmp_path)
+    get_mock = mocker.patch.object(
+        collector.requests.Session, "get", side_effect=lambda *_, **__: make_response()
+    )
+    target = collector_config.targets[1]
+
+    report = collector.get_exporter_data(collector_config, targets=[target])
+
+    assert report.exit_code == 0
+    assert {request.args[0].split("/")[2] for request in get_mock.call_args_list} == {
+        target.endpoint
+    }
+
+
+def test_get_http_session(collector_config):
+    """Test that HTTP session pools keep-alive connections to exporters."""
+    collector_config.settings.http_pool_size = 42
+    collector_config.settings.max_concurrency_per_host = 3
+
+    session = collector.get_http_session(collector_config)
+
+    for prefix in ("http://", "https://"):
+        adapter = session.get_adapter(f"{prefix}10.0.0.1:8675/dpkg")
+        assert adapter._pool_connections == 42
+        assert adapter._pool_maxsize == 3
+    session.close()
+
+
+def test_get_exporter_data_incremental(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that unchanged exporter artifacts are not written in incremental mode."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = True
+    collector_config.targets = collector_config.targets[:1]
+    target = collector_config.targets[0]
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    dpkg_key = f"exporter/{target.endpoint}/dpkg"
+    snap_key = f"exporter/{target.endpoint}/snap"
+    kernel_key = f"exporter/{target.endpoint}/kernel"
+    state.set(dpkg_key, {"sha256": "old", "etag": '"dpkg-v1"'})
+    state.set(snap_key, {"sha256": "old", "last_modified": "yesterday"})
+    state.set(kernel_key, {"sha256": collector._content_hash(b"same kernel")})
+
+    def conditional_get(url, **kwargs):
+        if url.endswith("dpkg"):
+            assert kwargs["headers"] == {"If-None-Match": '"dpkg-v1"'}
+            return make_response(status_code=304)
+        if url.endswith("snap"):
+            assert kwargs["headers"] == {"If-Modified-Since": "yesterday"}
+            headers = {"ETag": '"snap-v2"', "Last-Modified": "today"}
+            return make_response(b"new snaps", headers=headers)
+        assert kwargs["headers"] == {}
+        return make_response(b"same kernel")
+
+    mocker.patch.object(collector.requests.Session, "get", side_effect=conditional_get)
+
+    collector.get_exporter_data(
+        collector_config, new_context(collector_config, state=state)
+    )
+
+    ts = collection_context.timestamp
+    tar_path = collector._target_tar_path(collector_config, collection_context, target)
+    assert_tarballs([call(f"snap_@_{target.hostname}_@_{ts}", "new snaps", tar_path)])
+    assert state.get(dpkg_key) == {"sha256": "old", "etag": '"dpkg-v1"'}
+    assert state.get(snap_key) == {
+        "sha256": collector._content_hash(b"new snaps"),
+        "etag": '"snap-v2"',
+        "last_modified": "today",
+    }
+
+
+def test_get_exporter_data_delta(collector_config, mocker, tmp_path, collection_context):
+    """Test that exporter artifacts are written as deltas between full baselines."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.delta = "instead"
+    collector_config.targets = collector_config.targets[:1]
+    collector_config.endpoints = [_ConfigEndpoint("dpkg")]
+    target = collector_config.targets[0]
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    ts = collection_context.timestamp
+    name = f"dpkg_@_{target.hostname}_@_{ts}"
+    tar_path = collector._target_tar_path(collector_config, collection_context, target)
+    delta_path = collector._target_tar_path(
+        collector_config, collection_context, target, delta=True
+    )
+    v1, v2 = "ii  bash  5.1  amd64\n", "ii  bash  5.2  amd64\n"
+    get = mocker.patch.object(collector.requests.Session, "get")
+
+    get.side_effect = lambda *_, **__: make_response(v1.encode())
+    collector.get_exporter_data(
+        collector_config, new_context(collector_config, state=state)
+    )
+    assert_tarballs([call(name, v1, tar_path)])
+    assert not os.path.exists(delta_path)
+    os.unlink(tar_path)
+
+    get.side_effect = lambda *_, **__: make_response(v2.encode())
+    collector.get_exporter_data(
+        collector_config, new_context(collector_config, state=state)
+    )
+    expected = delta_document(v1, v2, changed={"bash": [v1.strip(), v2.strip()]})
+    assert_tarballs([call(name, expected, delta_path)])
+    assert delta_path.endswith(f"{collector.DELTA_FIELD}.tar")
+    assert not os.path.exists(tar_path)
 
-    mocker.patch.object(collector.requests, "get", side_effect=exception)
-    add_tar_mock = mocker.patch.object(collector, "_add_file_to_tar")
+
+def test_exporter_delta_over_budget(collector_config, tmp_path, collection_context):
+    """Test that payload whose delta was not written is not used as the previous one."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.delta = "instead"
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    target = collector_config.targets[0]
+    tracker = delta.delta_tracker(collector_config.settings, state)
+    tracker.commit(tracker.plan("key", b"ii  bash  5.1"))
+    context = collector.CollectionContext(
+        collection_context.timestamp,
+        collection_context.run_id,
+        RunLimits(max_run_size=10, oversize_action="skip"),
+    )
+    archives = collector.new_archive_set(collector_config, context)
+    exporter_collection = collector._ExporterCollection(
+        collector_config,
+        replace(context, session=MagicMock(), state=state, archives=archives),
+    )
+    payload = Payload(io.BytesIO(b"ii  bash  5.2"), 13, "new", {})
+
+    assert not exporter_collection._write_payload(target, "dpkg", payload, "key")
+    archives.close()
+
+    with tracker.index.open("key") as previous:
+        assert previous.read() == b"ii  bash  5.1"
+    # content of the discarded plan is not left in the index
+    assert len(os.listdir(tracker.index.path)) == 1
+
+
+def test_exporter_delta_write_error(collector_config, tmp_path, collection_context):
+    """Test that content of a plan is not left in the index if writing it fails."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.delta = "instead"
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    exporter_collection = collector._ExporterCollection(
+        collector_config,
+        replace(collection_context, session=MagicMock(), state=state),
+    )
+    exporter_collection._write_member = MagicMock(side_effect=OSError("disk error"))
+    payload = Payload(io.BytesIO(b"ii  bash  5.2"), 13, "new", {})
+
+    with pytest.raises(OSError):
+        exporter_collection._write_payload(
+            collector_config.targets[0], "dpkg", payload, "key"
+        )
+
+    assert os.listdir(exporter_collection.deltas.index.path) == []
+
+
+def test_exporter_delta_no_disk_space(collector_config, tmp_path, collection_context):
+    """Test that payload is not staged in the index without free disk space."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.delta = "instead"
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    limits = RunLimits(disk=DiskGuard(str(tmp_path), 2**62, timeout=0))
+    exporter_collection = collector._ExporterCollection(
+        collector_config,
+        replace(collection_context, limits=limits, session=MagicMock(), state=state),
+    )
+    payload = Payload(io.BytesIO(b"ii  bash  5.2"), 13, "new", {})
 
     with pytest.raises(collector.CollectionError):
-        collector.get_exporter_data(collector_config)
+        exporter_collection._write_payload(
+            collector_config.targets[0], "dpkg", payload, "key"
+        )
+
+    assert not os.path.exists(exporter_collection.deltas.index.path)
+
+
+def test_collected_tarball_compression(collector_config, tmp_path, collection_context):
+    """Test that tarball names and content follow selected compression."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.compression = "gzip"
+    collector_config.settings.compression_level = 5
+
+    assert write_model(collector_config, "model", "{}", "{}") == 4
+
+    tar_path = collector._model_tar_path(collector_config, collection_context, "model")
+    assert tar_path.endswith(".tar.gz")
+    with tarfile.open(tar_path, "r:gz") as tar_file:
+        assert len(tar_file.getmembers()) == 2
+    target = collector_config.targets[0]
+    assert collector._target_tar_path(
+        collector_config, collection_context, target
+    ).endswith(".tar.gz")
+
+
+def test_collected_dedup_manifest(collector_config, tmp_path, collection_context):
+    """Test that identical content of deduplicated output is stored only once."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.dedup = True
+
+    write_model(collector_config, "model-1", "{}", "{}")
+    write_model(collector_config, "model-2", "{}", "{}")
+
+    manifest_path = collector._model_tar_path(
+        collector_config, collection_context, "model-1"
+    )
+    assert manifest_path.endswith(dedup.MANIFEST_SUFFIX)
+    with open(manifest_path, "r", encoding="UTF-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    assert manifest["blob_store"] == "blobs"
+    assert [member["size"] for member in manifest["members"]] == [2, 2]
+    assert len(list((tmp_path / "blobs").glob("*/*"))) == 1
+
+    collector_config.settings.blob_store = str(tmp_path / "shared")
+    assert collector.get_blob_store_path(collector_config) == str(tmp_path / "shared")
+
+
+def test_get_exporter_data_large_payload(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that large payloads are streamed through bounded spool without decoding."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.spool_threshold = 1024
+    collector_config.targets = collector_config.targets[:1]
+    payload = bytes(range(256)) * 1024
+    from_response = mocker.spy(Payload, "from_response")
+    mocker.patch.object(
+        collector.requests.Session,
+        "get",
+        side_effect=lambda *_, **__: make_response(payload),
+    )
+
+    collector.get_exporter_data(collector_config)
+
+    for call_args in from_response.call_args_list:
+        assert call_args.args[1] == 1024
+    target = collector_config.targets[0]
+    with tarfile.open(
+        collector._target_tar_path(collector_config, collection_context, target)
+    ) as tar:
+        for member in tar.getmembers():
+            assert tar.extractfile(member).read() == payload
+
+
+@pytest.mark.parametrize(
+    "headers, delta_mode, reserved",
+    [
+        ({}, "off", 1024),
+        ({"Content-Length": "2048"}, "off", 1024),
+        ({"Content-Length": "100"}, "off", 100),
+        ({"Content-Length": "2048"}, "alongside", 2048),
+    ],
+)
+def test_get_exporter_data_memory_reserved(
+    headers, delta_mode, reserved, collector_config, mocker, tmp_path
+):
+    """Test that memory of a payload is reserved while its body is downloaded."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.state_file = str(tmp_path / "state.json")
+    collector_config.settings.delta = delta_mode
+    collector_config.settings.spool_threshold = 1024
+    collector_config.targets = collector_config.targets[:1]
+    collector_config.endpoints = [_ConfigEndpoint("dpkg")]
+    state = StateStore(collector_config.settings.state_file)
+    context = new_context(collector_config, state=state)
+    in_flight = []
+
+    def from_response(*_):
+        in_flight.append(context.limits.memory.in_flight)
+        return Payload.from_bytes(b"ii  bash  5.1")
+
+    mocker.patch.object(Payload, "from_response", side_effect=from_response)
+    mocker.patch.object(
+        collector.requests.Session,
+        "get",
+        side_effect=lambda *_, **__: make_response(headers=headers),
+    )
+
+    collector.get_exporter_data(collector_config, context)
+
+    assert in_flight == [reserved]
+    assert context.limits.memory.in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "action, recorded, member_size",
+    [("truncate", "truncated", 100), ("skip", "skipped", None)],
+)
+def test_get_exporter_data_oversized_payload(
+    action, recorded, member_size, collector_config, mocker, tmp_path
+):
+    """Test that payloads over the artifact budget are truncated or skipped."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = True
+    collector_config.settings.state_file = str(tmp_path / "state.json")
+    collector_config.settings.max_artifact_size = 100
+    collector_config.settings.oversize_action = action
+    collector_config.targets = collector_config.targets[:1]
+    mocker.patch.object(
+        collector.requests.Session,
+        "get",
+        side_effect=lambda *_, **__: make_response(
+            b"x" * 10000, headers={"Content-Length": "10000"}
+        ),
+    )
+    state = collector.StateStore(collector_config.settings.state_file)
+
+    report = collector.get_exporter_data(
+        collector_config, new_context(collector_config, state=state)
+    )
+
+    (entry,) = report.entries
+    assert entry.succeeded
+    assert entry.bytes_transferred == 101 * len(DEFAULT_ENDPOINTS)
+    assert {item["action"] for item in entry.limited} == {recorded}
+    assert {item["size"] for item in entry.limited} == {10000}
+    assert len(entry.limited) == len(DEFAULT_ENDPOINTS)
+    assert state.get(f"exporter/{collector_config.targets[0].endpoint}/dpkg") == {}
+    tarballs = list(tmp_path.glob("*.tar"))
+    if member_size is None:
+        assert not tarballs
+    else:
+        with tarfile.open(tarballs[0]) as tar:
+            assert {member.size for member in tar.getmembers()} == {member_size}
+
+
+def test_write_model_run_budget(collector_config, tmp_path, collection_context):
+    """Test that model members over the run budget are recorded and collected again."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = True
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    context = collector.CollectionContext(
+        collection_context.timestamp,
+        collection_context.run_id,
+        RunLimits(max_run_size=10, oversize_action="truncate"),
+        state=state,
+    )
+    report = context.report
+    archives = collector.new_archive_set(collector_config, context)
+    juju_collection = collector._JujuCollection(
+        collector_config, MagicMock(), replace(context, archives=archives)
+    )
+
+    written = juju_collection.write_model("model", '{"status": "large"}', "{}")
+    archives.close()
+
+    assert written == 10
+    (entry,) = report.entries
+    assert [(item["action"], item["written"]) for item in entry.limited] == [
+        ("truncated", 10),
+        ("skipped", 0),
+    ]
+    assert state.get("juju/model/status") == {}
+    assert state.get("juju/model/bundle") == {}
+
+
+def test_get_exporter_data_error(collector_config, mocker):
+    """Test that failing target is retried and reported without affecting others."""
+    collector_config.settings.retries = 2
+    collector_config.settings.retry_backoff = 0.5
+    failing, healthy = collector_config.targets
+
+    def get(url, **_):
+        if failing.endpoint in url:
+            raise collector.requests.ConnectionError("connection refused")
+        return make_response(b"data")
+
+    get_mock = mocker.patch.object(collector.requests.Session, "get", side_effect=get)
+    sleep_mock = mocker.patch.object(collector.time, "sleep")
+    archive_mock = mocker.patch.object(archive, "ArchiveWriter")
+
+    report = collector.get_exporter_data(collector_config)
+
+    endpoints = len(DEFAULT_ENDPOINTS)
+    assert get_mock.call_count == endpoints * 3 + endpoints
+    sleep_mock.assert_has_calls([call(0.5), call(1.0)] * endpoints, any_order=True)
+    assert archive_mock.return_value.add_stream.call_count == endpoints
+    archive_mock.return_value.close.assert_called()
+    assert [entry.name for entry in report.failed] == [failing.hostname]
+    assert "connection refused" in report.failed[0].error
+    assert report.exit_code == 2
+
+
+@pytest.mark.parametrize("status_code, attempts", [(404, 1), (503, 2)])
+def test_get_exporter_data_http_error_retry(
+    status_code, attempts, collector_config, mocker
+):
+    """Test that only server-side HTTP errors are retried."""
+    collector_config.settings.retries = 1
+    collector_config.targets = collector_config.targets[:1]
+    get_mock = mocker.patch.object(
+        collector.requests.Session,
+        "get",
+        side_effect=lambda *_, **__: make_response(status_code=status_code),
+    )
+    mocker.patch.object(collector.time, "sleep")
+    mocker.patch.object(archive, "ArchiveWriter")
+
+    report = collector.get_exporter_data(collector_config)
+
+    assert get_mock.call_count == attempts * len(DEFAULT_ENDPOINTS)
+    assert report.exit_code == 1
+
+
+def test_get_exporter_data_retry_success(collector_config, mocker):
+    """Test that target recovering within retries is reported as successful."""
+    collector_config.targets = collector_config.targets[:1]
+    attempts = []
 
-    add_tar_mock.assert_not_called()
+    def flaky_get(url, **_):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise collector.requests.Timeout("timed out")
+        return make_response(b"data")
+
+    mocker.patch.object(collector.requests.Session, "get", side_effect=flaky_get)
+    mocker.patch.object(collector.time, "sleep")
+    archive_mock = mocker.patch.object(archive, "ArchiveWriter")
+
+    report = collector.get_exporter_data(collector_config)
+
+    assert report.exit_code == 0
+    assert len(attempts) == len(DEFAULT_ENDPOINTS) + 1
+    assert archive_mock.return_value.add_stream.call_count == len(DEFAULT_ENDPOINTS)
 
 
 @pytest.mark.asyncio
@@ -98,29 +734,84 @@ async def test_get_controller(collector_config, mocker):
 
 
 @pytest.mark.asyncio
-async def test_get_juju_data(collector_config, mocker):
+async def test_get_controller_source(collector_config, mocker):
+    """Test connecting to a controller other than the first one."""
+    controller_mock = MagicMock()
+    controller_mock.connect.side_effect = AsyncMock()
+    mocker.patch.object(collector, "Controller", return_value=controller_mock)
+    source = _ConfigJujuController("10.0.0.2:17070", "cert", "user", "secret", "b")
+    collector_config.juju_controllers = [source]
+
+    await collector.get_controller(collector_config, source)
+
+    controller_mock.connect.assert_called_once_with(
+        endpoint="10.0.0.2:17070", username="user", password="secret", cacert="cert"
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_juju_data_multiple_controllers(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that models of several controllers get unique names in output and report."""
+    collector_config.settings.collection_path = str(tmp_path)
+    first = collector_config.juju_controller
+    first.name = "region-1"
+    second = _ConfigJujuController(
+        "10.0.0.2:17070", "cert", "admin", "admin", "region-2", max_model_connections=1
+    )
+    collector_config.juju_controllers = [second]
+    semaphore_spy = mocker.spy(collector.asyncio, "Semaphore")
+    archives = collector.new_archive_set(collector_config, collection_context)
+    context = replace(collection_context, archives=archives)
+    report = context.report
+
+    for source in collector_config.controllers:
+        status = MagicMock()
+        status.to_json.return_value = "{}"
+        model = MagicMock()
+        model.get_status.side_effect = AsyncMock(return_value=status)
+        model.export_bundle.side_effect = AsyncMock(return_value="{}")
+        model.disconnect.side_effect = AsyncMock()
+        controller = MagicMock()
+        controller.get_model.side_effect = AsyncMock(return_value=model)
+        controller.model_uuids.side_effect = AsyncMock(return_value={"default": 1})
+        await collector.get_juju_data(collector_config, controller, context, source)
+    collector.close_archives(archives, report)
+
+    assert [entry.name for entry in report.entries] == [
+        "region-1_default",
+        "region-2_default",
+    ]
+    assert report.exit_code == 0
+    assert set(report.phases) == {"juju/region-1", "juju/region-2"}
+    assert len(list(tmp_path.glob("*_@_region-?_default_@_*.tar"))) == 2
+    assert [call_args.args for call_args in semaphore_spy.call_args_list] == [(4,), (1,)]
+
+
+@pytest.mark.asyncio
+async def test_get_juju_data(collector_config, mocker, tmp_path, collection_context):
     """Test collection data from juju controller.
 
     Note (mkalcok): This is absolutely monstrous unit tests that shouldn't exist but
     there's just too much that needs to be mocked and prepared in terms of data and
     structures that it ended up as a huge UT. I'll try to go briefly over its steps:
       * Prepare some commonly used variables
-      * Patch Controller object and function that creates tarballs
-      * Prepare data about juju models and setup expected calls to `_add_file_to_tar`
+      * Patch Controller object and redirect tarballs to temporary directory
+      * Prepare data about juju models and setup expected content of tarballs
         - Setup regular model called "basic"
         - Setup empty model that'd trigger `JujuAPIError` because there are no
           applications to export.
         - Setup model with Cross Model Relation to make sure that we ignore CMR data in
           bundle export.
       * Once all is prepared, run `get_juju_data` function.
-      * Verify that expected calls were made.
+      * Verify that expected calls were made and tarballs were written.
     """
-    ts = collector.TIMESTAMP
+    ts = collection_context.timestamp
     site = collector_config.settings.site
     customer = collector_config.settings.customer
-    output_dir = collector_config.settings.collection_path
+    output_dir = collector_config.settings.collection_path = str(tmp_path)
 
-    add_file_to_tar_mock = mocker.patch.object(collector, "_add_file_to_tar")
     tar_calls = []
     controller = MagicMock()
     controller.disconnect.side_effect = AsyncMock()
@@ -217,40 +908,530 @@ async def test_get_juju_data(collector_config, mocker):
     controller.get_model.side_effect = AsyncMock(side_effect=models)
 
     # collect data from juju
-    await collector.get_juju_data(collector_config, controller)
+    report = await collector.get_juju_data(collector_config, controller)
 
     # check expected calls
-    add_file_to_tar_mock.assert_has_calls(tar_calls)
-    controller.disconnect.assert_called_once()
+    assert_tarballs(tar_calls)
+    for entry in report.entries:
+        assert entry.bytes_transferred > 0 and entry.bytes_written > 0
+        assert set(entry.phases) == {"connect", "get_status", "export_bundle", "write"}
+    assert set(report.phases) == {"juju"}
+    assert len(report.archives) == len(models)
+    controller.disconnect.assert_not_called()
     for model in models:
         model.disconnect.assert_called_once()
 
 
 @pytest.mark.asyncio
-async def test_get_juju_data_error(collector_config, mocker):
-    """Test that `get_juju_data` re-raises exceptions not related to empty model.
+async def test_get_juju_data_error(collector_config, mocker, tmp_path):
+    """Test that `get_juju_data` reports exceptions not related to empty model.
 
     This function is meant to handle only JujuAPIErrors during bundle export of an empty
-    model, other errors should be re-raised.
+    model, other errors should be retried and then reported for the failed model
+    without affecting collection of other models.
     """
+    collector_config.settings.collection_path = str(tmp_path)
     controller = MagicMock()
     controller.disconnect.side_effect = AsyncMock()
 
     juju_error = defaultdict(str)
     juju_error["error"] = "Something horrible juju error occurred."
 
-    model = MagicMock()
-    model.get_status.side_effect = AsyncMock(return_value="Model status")
-    model.export_bundle.side_effect = AsyncMock(
+    broken_model = MagicMock()
+    broken_model.get_status.side_effect = AsyncMock(return_value="Model status")
+    broken_model.export_bundle.side_effect = AsyncMock(
         side_effect=collector.JujuAPIError(juju_error)
     )
+    broken_model.disconnect.side_effect = AsyncMock()
+
+    status = MagicMock()
+    status.to_json.return_value = "{}"
+    healthy_model = MagicMock()
+    healthy_model.get_status.side_effect = AsyncMock(return_value=status)
+    healthy_model.export_bundle.side_effect = AsyncMock(return_value="{}")
+    healthy_model.disconnect.side_effect = AsyncMock()
+
+    models = {"Broken model": broken_model, "Healthy model": healthy_model}
+    controller.get_model.side_effect = AsyncMock(side_effect=lambda name: models[name])
+    controller.model_uuids.side_effect = AsyncMock(
+        return_value={name: f"{name} UUID" for name in models}
+    )
+
+    collector_config.settings.retries = 1
+    sleep_mock = mocker.patch.object(collector.asyncio, "sleep", AsyncMock())
+
+    report = await collector.get_juju_data(collector_config, controller)
+
+    assert [(entry.name, entry.error) for entry in report.failed] == [
+        ("Broken model", juju_error["error"])
+    ]
+    assert report.exit_code == 2
+    assert broken_model.disconnect.call_count == 2
+    sleep_mock.assert_called_once_with(collector_config.settings.retry_backoff)
+    assert len(list(tmp_path.glob("*_@_Healthy model_@_*.tar"))) == 1
+    assert not list(tmp_path.glob("*_@_Broken model_@_*.tar"))
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_write_model_archive_incremental(
+    incremental, collector_config, tmp_path, collection_context
+):
+    """Test that unchanged model artifacts are skipped only in incremental mode."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = incremental
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    status, bundle = '{"status": "unchanged"}', '{"bundle": "v1"}'
+    write_model(collector_config, "model", status, bundle, state)
+    for tar in tmp_path.glob("*.tar"):
+        tar.unlink()
+
+    write_model(collector_config, "model", status, bundle, state)
+    assert bool(list(tmp_path.glob("*.tar"))) is not incremental
+    for tar in tmp_path.glob("*.tar"):
+        tar.unlink()
+
+    new_bundle = '{"bundle": "v2"}'
+    write_model(collector_config, "model", status, new_bundle, state)
+    ts = collection_context.timestamp
+    tar_path = next(tmp_path.glob("*.tar"))
+    expected = [call(f"juju_bundle_@_model_@_{ts}", new_bundle, str(tar_path))]
+    if not incremental:
+        expected.append(call(f"juju_status_@_model_@_{ts}", status, str(tar_path)))
+    assert_tarballs(expected)
+
+
+@pytest.mark.parametrize("mode", ["alongside", "instead"])
+def test_write_model_delta(mode, collector_config, tmp_path, collection_context):
+    """Test that delta of model's status is written into model's tarball of deltas."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.delta = mode
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    ts = collection_context.timestamp
+    tar_path = collector._model_tar_path(collector_config, collection_context, "model")
+    delta_path = collector._model_tar_path(
+        collector_config, collection_context, "model", delta=True
+    )
+    old_status, new_status, bundle = '{"a": 1}', '{"a": 2}', '{"bundle": "v1"}'
+    write_model(collector_config, "model", old_status, bundle, state)
+    os.unlink(tar_path)
+
+    write_model(collector_config, "model", new_status, bundle, state)
+
+    expected = [call(f"juju_bundle_@_model_@_{ts}", bundle, tar_path)]
+    if mode == "alongside":
+        expected.append(call(f"juju_status_@_model_@_{ts}", new_status, tar_path))
+    status_delta = delta_document(old_status, new_status, changed={"/a": [1, 2]})
+    expected.append(call(f"juju_status_@_model_@_{ts}", status_delta, delta_path))
+    assert_tarballs(expected)
+    assert state.get("delta/juju/model/status")["sha256"] == collector._content_hash(
+        new_status.encode()
+    )
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_write_model_ignores_controller_timestamp(
+    incremental, collector_config, tmp_path, collection_context
+):
+    """Test that status that differs only in controller's timestamp is unchanged."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = incremental
+    collector_config.settings.delta = "alongside"
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    old_status = '{"controller-timestamp": "2023-05-01T10:00:00Z", "model": {}}'
+    new_status = '{"controller-timestamp": "2023-05-01T10:05:00Z", "model": {}}'
+    write_model(collector_config, "model", old_status, "{}", state)
+    for tar in tmp_path.glob("*.tar"):
+        tar.unlink()
+
+    write_model(collector_config, "model", new_status, "{}", state)
+
+    delta_path = collector._model_tar_path(
+        collector_config, collection_context, "model", delta=True
+    )
+    if incremental:
+        assert not list(tmp_path.glob("*.tar"))
+    else:
+        with tarfile.open(delta_path, "r") as tar_file:
+            (member,) = tar_file.getmembers()
+            status_delta = json.load(tar_file.extractfile(member))
+        assert status_delta["added"] == status_delta["removed"] == {}
+        assert status_delta["changed"] == {}
+
+
+def test_write_model_delta_over_budget(collector_config, tmp_path, collection_context):
+    """Test that status whose delta was not written is not used as the previous one."""
+    collector_config.settings.delta = "instead"
+    collector_config.settings.collection_path = str(tmp_path)
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    write_model(collector_config, "model", '{"a": 1}', "{}", state)
+    context = collector.CollectionContext(
+        collection_context.timestamp,
+        collection_context.run_id,
+        RunLimits(max_run_size=10, oversize_action="skip"),
+    )
+    archives = collector.new_archive_set(collector_config, context)
+    juju_collection = collector._JujuCollection(
+        collector_config, MagicMock(), replace(context, state=state, archives=archives)
+    )
+
+    juju_collection.write_model("model", '{"a": 2}', "{}")
+    archives.close()
+
+    assert state.get("delta/juju/model/status")["sha256"] == collector._content_hash(
+        b'{"a": 1}'
+    )
+    assert len(os.listdir(tmp_path / "state.delta")) == 1
+
+
+def test_write_model_delta_write_error(collector_config, tmp_path, collection_context):
+    """Test that status of a plan is not left in the index if writing it fails."""
+    collector_config.settings.delta = "instead"
+    collector_config.settings.collection_path = str(tmp_path)
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    juju_collection = collector._JujuCollection(
+        collector_config, MagicMock(), replace(collection_context, state=state)
+    )
+    juju_collection._write_members = MagicMock(side_effect=OSError("disk error"))
+
+    with pytest.raises(OSError):
+        juju_collection.write_model("model", '{"a": 1}', "{}")
+
+    assert os.listdir(juju_collection.deltas.index.path) == []
+
+
+@pytest.mark.asyncio
+async def test_get_juju_data_connection_limit(collector_config, mocker):
+    """Test that number of simultaneous model connections is limited."""
+    collector_config.settings.max_model_connections = 2
+    write_mock = mocker.patch.object(
+        collector._JujuCollection, "write_model", return_value=0
+    )
+    active = 0
+    peak = 0
+
+    async def get_model(_):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        model = MagicMock()
+        model.get_status.side_effect = AsyncMock(return_value=MagicMock())
+        model.export_bundle.side_effect = AsyncMock(return_value="{}")
+
+        async def disconnect():
+            nonlocal active
+            await collector.asyncio.sleep(0.01)
+            active -= 1
+
+        model.disconnect.side_effect = disconnect
+        await collector.asyncio.sleep(0.01)
+        return model
+
+    controller = MagicMock()
+    controller.disconnect.side_effect = AsyncMock()
+    controller.get_model.side_effect = get_model
+    controller.model_uuids.side_effect = AsyncMock(
+        return_value={f"model-{index}": index for index in range(6)}
+    )
+
+    await collector.get_juju_data(collector_config, controller)
+
+    assert peak == 2
+    assert write_mock.call_count == 6
+
 
+@pytest.mark.asyncio
+async def test_get_juju_data_watched_models(collector_config, mocker):
+    """Test that watched models stay connected and unchanged models are reused."""
+    write_mock = mocker.patch.object(
+        collector._JujuCollection, "write_model", return_value=0
+    )
+    model = MagicMock()
+    model.is_connected.return_value = True
+    model.get_status.side_effect = AsyncMock(return_value=MagicMock())
+    model.export_bundle.side_effect = AsyncMock(return_value="{}")
+    model.disconnect.side_effect = AsyncMock()
+    controller = MagicMock()
     controller.get_model.side_effect = AsyncMock(return_value=model)
     controller.model_uuids.side_effect = AsyncMock(
-        return_value={"Broken model": "model UUID"}
+        side_effect=[{"model-1": 1}, {"model-1": 1}, {}]
+    )
+    model_watcher = ModelWatcher(max_staleness=3600)
+    watchers = {collector_config.juju_controller.name: model_watcher}
+
+    for _ in range(3):
+        report = await collector.get_juju_data(
+            collector_config, controller, new_context(collector_config, watchers=watchers)
+        )
+        assert report.exit_code == 0
+
+    controller.get_model.assert_called_once_with("model-1")
+    model.get_status.assert_called_once()
+    assert write_mock.call_count == 2
+    model.disconnect.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_juju_data_discovers_targets(collector_config, mocker, tmp_path):
+    """Test that exporters found in status of models are cached as targets."""
+    collector_config.settings.discover_targets = True
+    mocker.patch.object(collector._JujuCollection, "write_model", return_value=0)
+    discover_mock = mocker.patch.object(
+        collector, "discover_exporters", return_value={"host-1": "10.0.0.5:8675"}
+    )
+    status = MagicMock()
+    model = MagicMock()
+    model.get_status.side_effect = AsyncMock(return_value=status)
+    model.export_bundle.side_effect = AsyncMock(return_value="{}")
+    model.disconnect.side_effect = AsyncMock()
+    controller = MagicMock()
+    controller.get_model.side_effect = AsyncMock(return_value=model)
+    controller.model_uuids.side_effect = AsyncMock(return_value={"model-1": "uuid"})
+    endpoint = collector_config.juju_controller.endpoint
+    state = StateStore(str(tmp_path / "state.json"))
+    state.set(discovery_key(endpoint, "destroyed"), {"host-9": "10.0.0.9:8675"})
+    state.set(discovery_key("10.9.9.9:17070", "other"), {"host-8": "10.0.0.8:8675"})
+
+    await collector.get_juju_data(
+        collector_config, controller, new_context(collector_config, state=state)
+    )
+
+    discover_mock.assert_called_once_with(status, "inventory-exporter", 8675)
+    assert state.items("discovery/") == {
+        discovery_key(endpoint, "model-1"): {"host-1": "10.0.0.5:8675"},
+        discovery_key("10.9.9.9:17070", "other"): {"host-8": "10.0.0.8:8675"},
+    }
+    settings = collector_config.settings
+    assert collector.exporter_targets(collector_config, state) == [
+        *collector_config.targets,
+        _ConfigTarget(
+            "10.0.0.5:8675", "host-1", settings.customer, settings.site, "model-1"
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_juju_data_packaging_pool(collector_config, mocker, tmp_path):
+    """Test that models are serialized and compressed by packaging pool."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.compression = "gzip"
+    pool = packaging.PackagingPool(workers=1)
+    pool._executor = ThreadPoolExecutor(2)
+    run_spy = mocker.spy(pool, "run")
+    context = collector.CollectionContext("20230501100000", "run-1", pool=pool)
+    status = MagicMock(to_json=lambda: '{"status": 1}')
+    bundle = "applications: {}\n---\noffers: {}\n"
+    model = MagicMock()
+    model.get_status.side_effect = AsyncMock(return_value=status)
+    model.export_bundle.side_effect = AsyncMock(return_value=bundle)
+    model.disconnect.side_effect = AsyncMock()
+    controller = MagicMock()
+    controller.get_model.side_effect = AsyncMock(return_value=model)
+    controller.model_uuids.side_effect = AsyncMock(return_value={"model-1": "uuid"})
+
+    report = await collector.get_juju_data(collector_config, controller, context=context)
+    pool.shutdown()
+
+    assert report.exit_code == 0
+    run_spy.assert_called_once_with(collector.serialize_model, status, bundle)
+    ts = context.timestamp
+    tar_path = collector._model_tar_path(collector_config, context, "model-1")
+    with tarfile.open(tar_path, "r:gz") as tar_file:
+        members = {
+            member.name: tar_file.extractfile(member).read()
+            for member in tar_file.getmembers()
+        }
+    assert members == {
+        f"juju_status_@_model-1_@_{ts}": b'{"status": 1}',
+        f"juju_bundle_@_model-1_@_{ts}": b'{"applications": {}}',
+    }
+
+
+@pytest.mark.asyncio
+async def test_exporter_and_juju_data_share_tarball(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that exporter and Juju data of the same model end up in one tarball."""
+    collector_config.settings.collection_path = str(tmp_path)
+    target = collector_config.targets[0]
+    collector_config.targets = [target]
+    mocker.patch.object(
+        collector.requests.Session,
+        "get",
+        side_effect=lambda url, **_: make_response(url.encode("UTF-8")),
     )
+    model = MagicMock()
+    model.get_status.side_effect = AsyncMock(return_value=MagicMock(to_json=lambda: "{}"))
+    model.export_bundle.side_effect = AsyncMock(return_value="{}")
+    model.disconnect.side_effect = AsyncMock()
+    controller = MagicMock()
+    controller.get_model.side_effect = AsyncMock(return_value=model)
+    controller.model_uuids.side_effect = AsyncMock(return_value={target.model: "uuid"})
+    archives = collector.new_archive_set(collector_config, collection_context)
+    context = replace(collection_context, archives=archives)
+    report = context.report
+
+    collector.get_exporter_data(collector_config, context)
+    await collector.get_juju_data(collector_config, controller, context)
+    collector.close_archives(archives, report)
+
+    ts = collection_context.timestamp
+    tar_path = collector._target_tar_path(collector_config, collection_context, target)
+    assert tar_path == collector._model_tar_path(
+        collector_config, collection_context, target.model
+    )
+    expected = [
+        call(
+            f"{endpoint}_@_{target.hostname}_@_{ts}",
+            f"http://{target.endpoint}/{endpoint}",
+            tar_path,
+        )
+        for endpoint in DEFAULT_ENDPOINTS
+    ]
+    expected.append(call(f"juju_status_@_{target.model}_@_{ts}", "{}", tar_path))
+    expected.append(call(f"juju_bundle_@_{target.model}_@_{ts}", "{}", tar_path))
+    assert_tarballs(expected)
+    assert list(report.archives) == [os.path.basename(tar_path)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shard_index", [0, 1])
+async def test_sharded_collection(
+    shard_index, collector_config, mocker, tmp_path, collection_context
+):
+    """Test that shard collects only its own targets and models into tagged files."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.shard_index = shard_index
+    collector_config.settings.shard_count = 2
+    get_mock = mocker.patch.object(
+        collector.requests.Session, "get", side_effect=lambda *_, **__: make_response()
+    )
+    models = {f"model-{index}": "uuid" for index in range(10)}
+    controller = MagicMock()
+    controller.model_uuids.side_effect = AsyncMock(return_value=models)
+    collect_mock = mocker.patch.object(collector._JujuCollection, "collect_model")
+
+    collector.get_exporter_data(collector_config, collection_context)
+    await collector.get_juju_data(collector_config, controller, collection_context)
+
+    targets = [
+        target.endpoint
+        for target in collector_config.targets
+        if shard.shard_of(target.hostname, 2) == shard_index
+    ]
+    assert sorted(
+        {request.args[0].split("/")[2] for request in get_mock.call_args_list}
+    ) == sorted(targets)
+    collected = sorted(request.args[0] for request in collect_mock.call_args_list)
+    assert collected == sorted(
+        name for name in models if shard.shard_of(name, 2) == shard_index
+    )
+    tag = f"_@_shard-{shard_index}-of-2"
+    assert collector._model_tar_path(collector_config, collection_context, "m").endswith(
+        f"{tag}.tar"
+    )
+    assert get_run_report_path(collector_config, collection_context).endswith(
+        f"{tag}.json"
+    )
+
+
+def test_close_archives_publish_failure(collector_config, tmp_path, capsys, mocker):
+    """Test that archive that can't be published is recorded as failed source."""
+    collector_config.settings.collection_path = str(tmp_path)
+    context = collector.CollectionContext("20230501100000", "run-1")
+    tar_path = collector._model_tar_path(collector_config, context, "model")
+    mocker.patch.object(archive.os, "link", side_effect=PermissionError("denied"))
+    archives = collector.new_archive_set(collector_config, context)
+    archives.get(tar_path).add_bytes("member", b"data")
+    report = collector.RunReport()
+
+    collector.close_archives(archives, report)
+
+    assert report.failed[0].kind == "archive"
+    assert report.failed[0].name == os.path.basename(tar_path)
+    staged = os.path.join(tmp_path, ".staging", "run-1", os.path.basename(tar_path))
+    assert os.path.exists(staged)
+    assert "Failed to finalize archive" in capsys.readouterr().out
+
+
+def test_close_archives_same_second(collector_config, tmp_path):
+    """Test that runs started within the same second publish all their archives."""
+    collector_config.settings.collection_path = str(tmp_path)
+    published = []
+    for run_id in ("run-1", "run-2"):
+        context = collector.CollectionContext("20230501100000", run_id)
+        archives = collector.new_archive_set(collector_config, context)
+        tar_path = collector._model_tar_path(collector_config, context, "model")
+        archives.get(tar_path).add_bytes("member", run_id.encode())
+        report = collector.RunReport()
+        collector.close_archives(archives, report)
+        assert not report.failed
+        published.extend(report.archives)
+
+    assert published == [
+        os.path.basename(tar_path),
+        os.path.basename(archive.numbered_path(tar_path, 1)),
+    ]
+    assert not os.listdir(tmp_path / ".staging")
+
+
+def test_state_not_advanced_by_unpublished_archives(
+    collector_config, mocker, tmp_path, collection_context
+):
+    """Test that state of artifacts advances only once their archives are published."""
+    collector_config.settings.collection_path = str(tmp_path)
+    collector_config.settings.incremental = True
+    collector_config.settings.delta = "alongside"
+    collector_config.targets = collector_config.targets[:1]
+    collector_config.endpoints = [_ConfigEndpoint("dpkg")]
+    state = collector.StateStore(str(tmp_path / "state.json"))
+    mocker.patch.object(
+        collector.requests.Session, "get", return_value=make_response(b"ii  bash  5.1")
+    )
+    mocker.patch.object(archive.os, "link", side_effect=PermissionError("denied"))
+
+    collector.get_exporter_data(
+        collector_config, new_context(collector_config, state=state)
+    )
+    write_model(collector_config, "model", '{"a": 1}', "{}", state)
+
+    assert state.items() == {}
 
-    with pytest.raises(collector.JujuAPIError) as exc:
-        await collector.get_juju_data(collector_config, controller)
 
-    assert str(exc.value) == juju_error["error"]
+@pytest.mark.parametrize(
+    "bundle, expected",
+    [
+        ("{}", [{}]),
+        ("series: focal\n---\noffers: {db: {endpoints: [db]}}", [{"series": "focal"}]),
+        (
+            "applications: {mysql: {charm: mysql}}\n---\n"
+            "applications: {mysql: {offers: {db: {endpoints: [db]}}}}",
+            [{"applications": {"mysql": {"charm": "mysql"}}}],
+        ),
+        # mentions of offers in names or values must not drop the bundle
+        (
+            "applications: {offers-api: {charm: offers, options: {x: offers}}}",
+            [
+                {
+                    "applications": {
+                        "offers-api": {"charm": "offers", "options": {"x": "offers"}}
+                    }
+                }
+            ],
+        ),
+        (
+            "series: focal\n---\napplications: {mysql: {offers: {}, num_units: 2}}",
+            [
+                {"series": "focal"},
+                {"applications": {"mysql": {"offers": {}, "num_units": 2}}},
+            ],
+        ),
+        (
+            "series: focal\n---\napplications: {}",
+            [{"series": "focal"}, {"applications": {}}],
+        ),
+        ("- not a mapping", [["not a mapping"]]),
+    ],
+)
+def test_bundle_documents(bundle, expected):
+    """Test that only the offers overlay is skipped, based on document structure."""
+    assert list(collector.bundle_documents(bundle)) == expected
@@ -5,7 +5,9 @@ from typing import List
 import pytest
 
 from software_inventory_collector.config import (
+    DEFAULT_ENDPOINTS,
     Config,
+    ConfigError,
     ConfigMissingKeyError,
     _BaseConfig,
 )
@@ -40,6 +42,301 @@ def test_config_parsing_missing(collector_config_data):
         Config.from_dict(collector_config_data)
 
 
+def test_config_parsing_defaults(collector_config_data):
+    """Test that optional keys fall back to their default values."""
+    config = Config.from_dict(collector_config_data)
+
+    assert config.settings.max_concurrency == 10
+    assert config.settings.max_concurrency_per_host == 2
+    assert config.settings.max_model_connections == 4
+    assert config.settings.http_pool_size == 100
+
+
+@pytest.mark.parametrize(
+    "option",
+    [
+        "max_concurrency",
+        "max_concurrency_per_host",
+        "max_model_connections",
+        "http_pool_size",
+    ],
+)
+def test_config_parsing_invalid_concurrency(option, collector_config_data):
+    """Test that non-positive concurrency limits are rejected."""
+    collector_config_data["settings"][option] = 0
+
+    with pytest.raises(ConfigError):
+        Config.from_dict(collector_config_data)
+
+
+def test_config_parsing_optional(collector_config_data):
+    """Test parsing of optional config values."""
+    config = Config.from_dict(collector_config_data)
+    assert config.settings.state_file is None
+    assert config.settings.incremental is False
+
+    collector_config_data["settings"]["state_file"] = "/path/to/state.json"
+    collector_config_data["settings"]["incremental"] = True
+    config = Config.from_dict(collector_config_data)
+    assert config.settings.state_file == "/path/to/state.json"
+    assert config.settings.incremental is True
+
+
+@pytest.mark.parametrize("option", ["retries", "retry_backoff"])
+def test_config_parsing_negative_retries(option, collector_config_data):
+    """Test that negative retry settings are rejected."""
+    collector_config_data["settings"][option] = -1
+
+    with pytest.raises(ConfigError):
+        Config.from_dict(collector_config_data)
+
+
+@pytest.mark.parametrize(
+    "option, value",
+    [("incremental", True), ("discover_targets", True), ("delta", "instead")],
+)
+def test_config_parsing_incremental_without_state(option, value, collector_config_data):
+    """Test that incremental collection, discovery and deltas require state file."""
+    collector_config_data["settings"][option] = value
+
+    with pytest.raises(ConfigError, match=f"{option} requires state_file"):
+        Config.from_dict(collector_config_data)
+
+
+def test_config_parsing_discovered_targets_only(collector_config_data):
+    """Test that targets don't need to be declared if they are discovered."""
+    del collector_config_data["targets"]
+    collector_config_data["settings"]["discover_targets"] = True
+    collector_config_data["settings"]["state_file"] = "/path/to/state.json"
+
+    config = Config.from_dict(collector_config_data)
+
+    assert config.targets == []
+    assert config.settings.exporter_charm == "inventory-exporter"
+    assert config.settings.exporter_port == 8675
+
+
+@pytest.mark.parametrize("compression, level", [("rar", None), ("gzip", 0), ("xz", 10)])
+def test_config_parsing_invalid_compression(compression, level, collector_config_data):
+    """Test that unsupported compression settings are rejected."""
+    collector_config_data["settings"]["compression"] = compression
+    collector_config_data["settings"]["compression_level"] = level
+
+    with pytest.raises(ConfigError):
+        Config.from_dict(collector_config_data)
+
+
+@pytest.mark.parametrize(
+    "interval, cron", [(60, "*/5 * * * *"), (-1, None), (None, "61 * * * *")]
+)
+def test_config_parsing_invalid_schedule(interval, cron, collector_config_data):
+    """Test that ambiguous or invalid daemon schedule is rejected."""
+    collector_config_data["settings"]["schedule_interval"] = interval
+    collector_config_data["settings"]["schedule_cron"] = cron
+
+    with pytest.raises(ConfigError, match="schedule|cron"):
+        Config.from_dict(collector_config_data)
+
+
+@pytest.mark.parametrize("index, count", [(0, 0), (2, 2), (-1, 2)])
+def test_config_parsing_invalid_shard(index, count, collector_config_data):
+    """Test that shard index outside of shard count is rejected."""
+    collector_config_data["settings"]["shard_index"] = index
+    collector_config_data["settings"]["shard_count"] = count
+
+    with pytest.raises(ConfigError, match="shard"):
+        Config.from_dict(collector_config_data)
+
+
+@pytest.mark.parametrize(
+    "option, value",
+    [
+        ("max_artifact_size", 0),
+        ("max_run_size", -1),
+        ("max_in_flight", 0),
+        ("min_free_space", -1),
+        ("free_space_timeout", -1),
+        ("oversize_action", "compress"),
+    ],
+)
+def test_config_parsing_invalid_budgets(option, value, collector_config_data):
+    """Test that invalid byte budgets and oversize action are rejected."""
+    collector_config_data["settings"][option] = value
+
+    with pytest.raises(ConfigError, match=f"{option}|budgets"):
+        Config.from_dict(collector_config_data)
+
+
+@pytest.mark.parametrize("mode, interval", [("diff", 86400), ("alongside", -1)])
+def test_config_parsing_invalid_delta(mode, interval, collector_config_data):
+    """Test that unsupported delta mode and negative baseline interval are rejected."""
+    collector_config_data["settings"]["delta"] = mode
+    collector_config_data["settings"]["delta_baseline_interval"] = interval
+    collector_config_data["settings"]["state_file"] = "/path/to/state.json"
+
+    with pytest.raises(ConfigError, match="delta"):
+        Config.from_dict(collector_config_data)
+
+
+def test_config_parsing_invalid_staleness(collector_config_data):
+    """Test that non-positive staleness of watched models is rejected."""
+    collector_config_data["settings"]["watch_max_staleness"] = 0
+
+    with pytest.raises(ConfigError, match="watch_max_staleness"):
+        Config.from_dict(collector_config_data)
+
+
+def test_config_parsing_multiple_controllers(collector_config_data):
+    """Test that controllers are declared by a single section and by a list."""
+    single = collector_config_data["juju_controller"]
+    collector_config_data["juju_controller"] = dict(single, name="region-1")
+    collector_config_data["juju_controllers"] = [
+        dict(single, name="region-2", max_model_connections=1)
+    ]
+
+    config = Config.from_dict(collector_config_data)
+
+    assert [controller.name for controller in config.controllers] == [
+        "region-1",
+        "region-2",
+    ]
+    assert config.controllers[1].max_model_connections == 1
+
+
+def test_config_parsing_controller_list_only(collector_config_data):
+    """Test that single controller section can be omitted or null."""
+    collector_config_data["juju_controllers"] = [collector_config_data["juju_controller"]]
+    collector_config_data["juju_controller"] = None
+
+    config = Config.from_dict(collector_config_data)
+
+    assert config.juju_controller is None
+    assert config.controllers[0].endpoint == "10.0.0.1:17070"
+
+
+@pytest.mark.parametrize(
+    "controllers, match",
+    [
+        ([], "must define juju_controller"),
+        ([{"name": "a"}, {"name": "a"}], "unique names"),
+        ([{"name": "a"}, {}], "unique names"),
+        ([{"max_model_connections": 0}], "max_model_connections"),
+    ],
+)
+def test_config_parsing_invalid_controllers(controllers, match, collector_config_data):
+    """Test that missing, ambiguous and invalid controllers are rejected."""
+    single = collector_config_data.pop("juju_controller")
+    collector_config_data["juju_controllers"] = [
+        dict(single, **controller) for controller in controllers
+    ]
+
+    with pytest.raises(ConfigError, match=match):
+        Config.from_dict(collector_config_data)
+
+
+def test_config_parsing_endpoints(collector_config_data):
+    """Test that endpoints are declared in config and overridden by targets."""
+    collector_config_data["endpoints"] = [
+        {"name": "dpkg", "timeout": 120, "priority": -1},
+        {"name": "snap", "timeout": 5, "priority": 10},
+        {"name": "kernel"},
+    ]
+    collector_config_data["targets"][0]["endpoints"] = [
+        {"name": "dpkg", "enabled": False},
+        {"name": "kernel", "priority": 20, "timeout": 2},
+        {"name": "lxd", "priority": 5},
+    ]
+
+    config = Config.from_dict(collector_config_data)
+
+    first, second = config.targets
+    assert [endpoint.name for endpoint in config.target_endpoints(first)] == [
+        "kernel",
+        "snap",
+        "lxd",
+    ]
+    assert config.target_endpoints(first)[0].timeout == 2
+    assert [endpoint.name for endpoint in config.target_endpoints(second)] == [
+        "snap",
+        "kernel",
+        "dpkg",
+    ]
+    assert config.target_endpoints(second)[-1].timeout == 120
+
+
+def test_config_parsing_default_endpoints(collector_config_data):
+    """Test that default endpoints are collected if config does not declare any."""
+    config = Config.from_dict(collector_config_data)
+
+    endpoints = config.target_endpoints(config.targets[0])
+    assert [endpoint.name for endpoint in endpoints] == DEFAULT_ENDPOINTS
+    assert {endpoint.timeout for endpoint in endpoints} == {60}
+
+
+@pytest.mark.parametrize(
+    "endpoints, overrides, state_file, match",
+    [
+        ([{"name": "dpkg", "timeout": 0}], [], None, "timeout"),
+        ([{"name": "dpkg"}], [{"name": "dpkg", "timeout": -1}], None, "timeout"),
+        ([{"name": "dpkg", "min_interval": -1}], [], None, "min_interval"),
+        ([{"name": "dpkg"}, {"name": "dpkg"}], [], None, "unique"),
+        ([{"name": "dpkg", "min_interval": 3600}], [], None, "state_file"),
+        ([{"name": "dpkg"}], [{"name": "dpkg", "min_interval": 60}], None, "state_file"),
+    ],
+)
+def test_config_parsing_invalid_endpoints(
+    endpoints, overrides, state_file, match, collector_config_data
+):
+    """Test that invalid endpoint settings are rejected."""
+    collector_config_data["settings"]["state_file"] = state_file
+    collector_config_data["endpoints"] = endpoints
+    collector_config_data["targets"][0]["endpoints"] = overrides
+
+    with pytest.raises(ConfigError, match=match):
+        Config.from_dict(collector_config_data)
+
+
+def test_config_parsing_nested_list_missing_key(collector_config_data):
+    """Test that missing key of a config in nested list is reported."""
+    del collector_config_data["targets"][0]["hostname"]
+
+    with pytest.raises(ConfigMissingKeyError) as exc:
+        Config.from_dict(collector_config_data)
+
+    assert exc.value.key_name == "target.hostname"
+
+
+@pytest.mark.parametrize(
+    "section, key, value, match",
+    [
+        ("settings", "max_concurrency", "10", "settings.max_concurrency must be int"),
+        ("settings", "incremental", 1, "settings.incremental must be bool"),
+        ("settings", "retry_backoff", True, "settings.retry_backoff must be float"),
+        (None, "endpoints", ["dpkg", "snap"], "endpoint must be a mapping"),
+        (None, "targets", {"hostname": "exporter-1"}, "config.targets must be a list"),
+        (None, "settings", None, "config.settings can't be null"),
+        (None, "settings", [], "settings must be a mapping"),
+    ],
+)
+def test_config_parsing_invalid_types(section, key, value, match, collector_config_data):
+    """Test that values of wrong type are rejected with config error."""
+    data = collector_config_data[section] if section else collector_config_data
+    data[key] = value
+
+    with pytest.raises(ConfigError, match=match):
+        Config.from_dict(collector_config_data)
+
+
+@pytest.mark.parametrize("section", [None, "settings", "juju_controller"])
+def test_config_parsing_unknown_key(section, collector_config_data):
+    """Test that misspelled keys are rejected instead of silently ignored."""
+    data = collector_config_data[section] if section else collector_config_data
+    data["max_concurency"] = 10
+
+    with pytest.raises(ConfigError, match="unknown keys max_concurency"):
+        Config.from_dict(collector_config_data)
+
+
 def test_config_parsing_basic_list():
     """Test parsing config object that contains list of basic objects (int/str/..)
 
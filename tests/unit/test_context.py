@@ -0,0 +1,33 @@
+"""Tests for software_inventory_collector.context module"""
+import datetime
+
+from software_inventory_collector import context
+
+
+def test_collection_context_new():
+    """Test that every run gets a unique ID and a timestamp of its start."""
+    first = context.CollectionContext.new()
+    second = context.CollectionContext.new()
+
+    assert first.run_id != second.run_id
+    started = datetime.datetime.strptime(first.timestamp, context.TIMESTAMP_FORMAT)
+    assert abs(datetime.datetime.now() - started) < datetime.timedelta(minutes=1)
+
+
+def test_collection_context_new_with_limits(collector_config):
+    """Test that limits of the run are taken from settings."""
+    settings = collector_config.settings
+    settings.max_artifact_size = 100
+    settings.max_run_size = 1000
+    settings.oversize_action = "truncate"
+    settings.max_in_flight = 500
+    settings.min_free_space = 10
+
+    limits = context.CollectionContext.new(settings).limits
+
+    assert limits.max_artifact_size == 100
+    assert limits.run_budget.limit == 1000
+    assert limits.oversize_action == "truncate"
+    assert limits.memory.limit == 500
+    assert limits.disk.path == settings.collection_path
+    assert limits.disk.min_free == 10
@@ -0,0 +1,150 @@
+"""Tests for software_inventory_collector.dedup module"""
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from software_inventory_collector import dedup
+
+
+def test_blob_store_put(tmp_path):
+    """Test that content is stored once under its SHA-256 hash."""
+    store = dedup.BlobStore(str(tmp_path / "blobs"))
+    digest = hashlib.sha256(b"payload").hexdigest()
+
+    assert store.put_bytes(b"payload") == digest
+    assert store.put_stream(io.BytesIO(b"payload and more"), 7) == digest
+
+    assert store.blob_path(digest) == str(tmp_path / "blobs" / digest[:2] / digest)
+    with store.open(digest) as blob:
+        assert blob.read() == b"payload"
+    assert os.listdir(tmp_path / "blobs") == [digest[:2]]
+
+
+def test_blob_store_truncated_stream(tmp_path):
+    """Test that truncated content is rejected and no temporary file is left."""
+    store = dedup.BlobStore(str(tmp_path))
+
+    with pytest.raises(OSError, match="unexpected end of data"):
+        store.put_stream(io.BytesIO(b"short"), 10)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_manifest_writer(tmp_path):
+    """Test that manifest maps member names to hashes of their content."""
+    store = dedup.BlobStore(str(tmp_path / "blobs"))
+    manifest_path = tmp_path / f"output{dedup.MANIFEST_SUFFIX}"
+
+    with dedup.ManifestWriter(str(manifest_path), store) as writer:
+        writer.add_bytes("snap_@_host-1", b"same")
+        writer.add_stream("snap_@_host-2", io.BytesIO(b"same"), 4, mtime=10)
+
+    with open(manifest_path, "r", encoding="UTF-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    digest = hashlib.sha256(b"same").hexdigest()
+    assert manifest["format"] == dedup.MANIFEST_FORMAT
+    assert manifest["blob_store"] == "blobs"
+    assert [member["sha256"] for member in manifest["members"]] == [digest, digest]
+    assert manifest["members"][1]["mtime"] == 10
+
+
+def test_manifest_writer_without_members(tmp_path):
+    """Test that closing writer without any members does not create manifest."""
+    manifest_path = tmp_path / "output.manifest.json"
+
+    with dedup.ManifestWriter(str(manifest_path), dedup.BlobStore(str(tmp_path))):
+        pass
+
+    assert not manifest_path.exists()
+
+
+def test_manifest_writer_no_clobber(tmp_path):
+    """Test that existing manifest is never replaced, manifest gets a numbered name."""
+    manifest_path = tmp_path / "output_@_20230501100000.manifest.json"
+    manifest_path.write_text("previous run", encoding="UTF-8")
+    writer = dedup.ManifestWriter(str(manifest_path), dedup.BlobStore(str(tmp_path)))
+    writer.add_bytes("member", b"data")
+
+    writer.close()
+
+    assert manifest_path.read_text(encoding="UTF-8") == "previous run"
+    assert writer.path == str(tmp_path / "output_@_20230501100000_@_1.manifest.json")
+    with open(writer.path, "r", encoding="UTF-8") as manifest_file:
+        assert json.load(manifest_file)["members"][0]["name"] == "member"
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+@pytest.mark.parametrize("compression, mode", [("none", "r:"), ("gzip", "r:gz")])
+def test_rebuild_tarball(compression, mode, tmp_path):
+    """Test that tarball with the classic layout is rebuilt from a manifest."""
+    store = dedup.BlobStore(str(tmp_path / "blobs"))
+    manifest_path = str(tmp_path / "output.manifest.json")
+    with dedup.ManifestWriter(manifest_path, store) as writer:
+        writer.add_bytes("dpkg_@_host-1", b"dpkg data")
+        writer.add_stream("kernel_@_host-1", io.BytesIO(b"kernel"), 6, mtime=1000)
+    tar_path = tmp_path / dedup.rebuilt_tarball_name(manifest_path, compression)
+
+    dedup.rebuild_tarball(manifest_path, str(tar_path), compression)
+
+    with tarfile.open(tar_path, mode) as tar_file:
+        assert tar_file.getnames() == ["dpkg_@_host-1", "kernel_@_host-1"]
+        assert tar_file.getmember("kernel_@_host-1").mtime == 1000
+        assert tar_file.extractfile("dpkg_@_host-1").read() == b"dpkg data"
+
+
+def test_rebuild_tarball_unsupported_format(tmp_path):
+    """Test that manifest of unknown format is rejected."""
+    manifest_path = tmp_path / "output.manifest.json"
+    manifest_path.write_text(json.dumps({"format": 99}))
+
+    with pytest.raises(ValueError, match="unsupported manifest format"):
+        dedup.rebuild_tarball(str(manifest_path), str(tmp_path / "output.tar"))
+
+
+@pytest.mark.parametrize(
+    "manifest, compression, expected",
+    [
+        ("/out/a_@_b.manifest.json", "none", "a_@_b.tar"),
+        ("/out/a_@_b.manifest.json", "xz", "a_@_b.tar.xz"),
+        ("/out/a_@_b.json", "none", "a_@_b.json.tar"),
+    ],
+)
+def test_rebuilt_tarball_name(manifest, compression, expected):
+    """Test that rebuilt tarball is named after its manifest."""
+    assert dedup.rebuilt_tarball_name(manifest, compression) == expected
+
+
+def test_main(tmp_path, mocker, capsys):
+    """Test that CLI rebuilds all valid manifests and reports failed ones."""
+    store = dedup.BlobStore(str(tmp_path / "store"))
+    manifest_path = str(tmp_path / "valid.manifest.json")
+    with dedup.ManifestWriter(manifest_path, store) as writer:
+        writer.add_bytes("snap_@_host-1", b"snap data")
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    argv = ["rebuild", "-o", str(output_dir), "--blob-store", str(tmp_path / "store")]
+    argv += [manifest_path, str(tmp_path / "missing.manifest.json")]
+    mocker.patch.object(dedup.sys, "argv", argv)
+
+    with pytest.raises(SystemExit) as exc:
+        dedup.main()
+
+    assert exc.value.code == 1
+    assert os.listdir(output_dir) == ["valid.tar"]
+    assert "Failed to rebuild" in capsys.readouterr().out
+
+
+def test_main_unavailable_compression(tmp_path, mocker, capsys):
+    """Test that CLI fails if selected compression is not available."""
+    mocker.patch.object(dedup.sys, "argv", ["rebuild", "--compression", "zstd", "x"])
+    mocker.patch.object(dedup, "validate_compression", side_effect=ValueError("nope"))
+
+    with pytest.raises(SystemExit) as exc:
+        dedup.main()
+
+    assert exc.value.code == 1
+    assert "Failed to rebuild tarballs: nope" in capsys.readouterr().out
@@ -0,0 +1,300 @@
+"""Tests for software_inventory_collector.delta module"""
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from software_inventory_collector import delta
+from software_inventory_collector.state import StateStore
+
+DPKG_V1 = b"""Desired=Unknown/Install/Remove/Purge/Hold
+ii  bash  5.1-6  amd64  GNU Bourne Again SHell
+ii  curl  7.81.0-1  amd64  command line tool for transferring data with URL syntax
+rc  vim  2:8.2  amd64  Vi IMproved
+"""
+DPKG_V2 = b"""Desired=Unknown/Install/Remove/Purge/Hold
+ii  bash  5.1-6ubuntu1  amd64  GNU Bourne Again SHell
+
+ii  jq  1.6-2.1  amd64  lightweight and flexible command-line JSON processor
+rc  vim  2:8.2  amd64  Vi IMproved
+"""
+
+
+def make_tracker(tmp_path, mode="instead", baseline_interval=3600):
+    """Return delta tracker with empty index and state store."""
+    state = StateStore(str(tmp_path / "state.json"))
+    index = delta.DeltaIndex(str(tmp_path / "index"))
+    return delta.DeltaTracker(mode, index, state, baseline_interval)
+
+
+def read_index(index, key):
+    """Return last content of the artifact in the index, or None."""
+    content_file = index.open(key)
+    if content_file is None:
+        return None
+    with content_file:
+        return content_file.read()
+
+
+def entries(content):
+    """Return entries of content read from memory."""
+    return delta.stream_entries(io.BytesIO(content))
+
+
+def test_text_entries():
+    """Test that lines of package listings are identified by package name."""
+    content = b"lxd  5.0.2  24322\n  \n\nlxd  5.0.2  24322  latest\n"
+
+    assert entries(content) == {
+        "lxd": "lxd  5.0.2  24322",
+        "lxd  5.0.2  24322  latest": "lxd  5.0.2  24322  latest",
+    }
+
+
+def test_stream_entries_chunks(mocker):
+    """Test that text read in chunks has the same entries as text read at once."""
+    expected = entries(DPKG_V2)
+    mocker.patch.object(delta, "CHUNK_SIZE", 7)
+
+    assert entries(DPKG_V2) == expected
+    assert entries(b"[not json\nii  bash  5.1") == {
+        "[not": "[not json",
+        "bash": "ii  bash  5.1",
+    }
+
+
+def test_json_entries():
+    """Test that JSON values are identified by pointers, list items by their name."""
+    document = {
+        "applications": {"nova/compute": {"units": {"nova/0": {"status": "active"}}}},
+        "snaps": [{"name": "lxd", "rev": 1}, {"name": "core~20", "rev": 2}],
+        "ports": [80, 443],
+        "relations": {},
+        "tags": [],
+    }
+
+    assert entries(json.dumps(document).encode("UTF-8")) == {
+        "/applications/nova~1compute/units/nova~10/status": "active",
+        "/snaps/lxd/name": "lxd",
+        "/snaps/lxd/rev": 1,
+        "/snaps/core~020/name": "core~20",
+        "/snaps/core~020/rev": 2,
+        "/ports/0": 80,
+        "/ports/1": 443,
+        "/relations": {},
+        "/tags": [],
+    }
+
+
+def test_delta_packages(tmp_path):
+    """Test that delta of package listing holds added, removed and changed packages."""
+    tracker = make_tracker(tmp_path)
+    tracker.commit(tracker.plan_stream("key", io.BytesIO(DPKG_V1)))
+
+    document = json.loads(tracker.plan_stream("key", io.BytesIO(DPKG_V2)).delta)
+
+    assert document == {
+        "format": delta.DELTA_FORMAT,
+        "base": hashlib.sha256(DPKG_V1).hexdigest(),
+        "sha256": hashlib.sha256(DPKG_V2).hexdigest(),
+        "added": {
+            "jq": "ii  jq  1.6-2.1  amd64  lightweight and flexible command-line JSON "
+            "processor"
+        },
+        "removed": {
+            "curl": "ii  curl  7.81.0-1  amd64  command line tool for transferring "
+            "data with URL syntax"
+        },
+        "changed": {
+            "bash": [
+                "ii  bash  5.1-6  amd64  GNU Bourne Again SHell",
+                "ii  bash  5.1-6ubuntu1  amd64  GNU Bourne Again SHell",
+            ]
+        },
+    }
+
+
+def test_delta_status(tmp_path):
+    """Test that delta of JSON status holds changed fields."""
+    tracker = make_tracker(tmp_path)
+    previous = json.dumps({"units": {"a/0": "active", "a/1": "blocked"}}).encode()
+    current = json.dumps({"units": {"a/0": "active", "a/1": "active"}}).encode()
+    tracker.commit(tracker.plan("key", previous))
+
+    document = json.loads(tracker.plan("key", current).delta)
+
+    assert document["added"] == document["removed"] == {}
+    assert document["changed"] == {"/units/a~11": ["blocked", "active"]}
+
+
+def test_delta_index(tmp_path):
+    """Test that index keeps the last content of each artifact."""
+    index = delta.DeltaIndex(str(tmp_path / "index"))
+
+    assert read_index(index, "exporter/host/dpkg") is None
+    index.put_staged("exporter/host/dpkg", index.stage(io.BytesIO(b"v1")))
+    index.put_staged("exporter/host/dpkg", index.stage(io.BytesIO(b"v2")))
+    index.put_staged("exporter/host/snap", index.stage(io.BytesIO(b"v1")))
+
+    assert read_index(index, "exporter/host/dpkg") == b"v2"
+    assert len(os.listdir(tmp_path / "index")) == 2
+
+
+def test_delta_index_failed_write(tmp_path, mocker):
+    """Test that failed write keeps the previous content and no temporary file."""
+    index = delta.DeltaIndex(str(tmp_path))
+    index.put_staged("key", index.stage(io.BytesIO(b"v1")))
+    mocker.patch.object(delta.os, "replace", side_effect=OSError("disk full"))
+
+    with pytest.raises(OSError, match="disk full"):
+        index.put_staged("key", index.stage(io.BytesIO(b"v2")))
+
+    assert read_index(index, "key") == b"v1"
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_delta_index_failed_stage(tmp_path, mocker):
+    """Test that content that can't be read completely leaves no staged file."""
+    index = delta.DeltaIndex(str(tmp_path))
+    stream = mocker.MagicMock()
+    stream.read.side_effect = OSError("connection reset")
+
+    with pytest.raises(OSError, match="connection reset"):
+        index.stage(stream)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_delta_index_discard_missing(tmp_path):
+    """Test that staged content can be discarded more than once."""
+    index = delta.DeltaIndex(str(tmp_path))
+    staged = index.stage(io.BytesIO(b"v1"))
+
+    index.discard(staged)
+    index.discard(staged)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_delta_tracker_instead(tmp_path, mocker):
+    """Test that full content is planned only as a periodic baseline."""
+    tracker = make_tracker(tmp_path)
+    clock = mocker.patch.object(delta.time, "time", return_value=1000.0)
+
+    first = tracker.plan("key", DPKG_V1)
+    assert (first.full, first.delta) == (True, None)
+    tracker.commit(first)
+
+    clock.return_value = 2000.0
+    second = tracker.plan("key", DPKG_V2)
+    assert second.full is False
+    assert json.loads(second.delta)["base"] == hashlib.sha256(DPKG_V1).hexdigest()
+    assert second.state["baseline_at"] == "1000.0"
+    tracker.commit(second)
+
+    clock.return_value = 4600.0
+    baseline = tracker.plan("key", DPKG_V1)
+    assert baseline.full is True
+    assert json.loads(baseline.delta)["base"] == hashlib.sha256(DPKG_V2).hexdigest()
+    assert baseline.state == {
+        "sha256": hashlib.sha256(DPKG_V1).hexdigest(),
+        "baseline_at": "4600.0",
+    }
+
+
+def test_delta_tracker_alongside(tmp_path):
+    """Test that full content is planned always in alongside mode."""
+    tracker = make_tracker(tmp_path, mode="alongside")
+    tracker.commit(tracker.plan("key", DPKG_V1))
+
+    plan = tracker.plan("key", DPKG_V2)
+
+    assert plan.full is True
+    assert plan.delta is not None
+
+
+def test_delta_tracker_uncommitted(tmp_path):
+    """Test that content that was not committed is not used as the previous one."""
+    tracker = make_tracker(tmp_path)
+    tracker.plan("key", DPKG_V1)
+
+    assert tracker.plan("key", DPKG_V2).delta is None
+
+
+def test_delta_tracker_mismatched_index(tmp_path):
+    """Test that previous content that does not match the state store is ignored."""
+    tracker = make_tracker(tmp_path)
+    tracker.commit(tracker.plan("key", DPKG_V1))
+    staged = tracker.index.stage(io.BytesIO(b"content of another state store"))
+    tracker.index.put_staged("key", staged)
+
+    plan = tracker.plan("key", DPKG_V2)
+
+    assert (plan.full, plan.delta) == (True, None)
+
+
+def test_delta_tracker_missing_index(tmp_path):
+    """Test that full content is planned if previous content was removed."""
+    tracker = make_tracker(tmp_path)
+    tracker.commit(tracker.plan("key", DPKG_V1))
+    for content_file in os.listdir(tmp_path / "index"):
+        os.unlink(tmp_path / "index" / content_file)
+
+    plan = tracker.plan("key", DPKG_V2)
+
+    assert (plan.full, plan.delta) == (True, None)
+
+
+def test_delta_tracker_plan_stream(tmp_path):
+    """Test that streamed content is staged in the index until it's committed."""
+    tracker = make_tracker(tmp_path)
+    tracker.commit(tracker.plan("key", DPKG_V1))
+
+    plan = tracker.plan_stream("key", io.BytesIO(DPKG_V2))
+
+    document = json.loads(plan.delta)
+    assert document["base"] == hashlib.sha256(DPKG_V1).hexdigest()
+    assert document["sha256"] == hashlib.sha256(DPKG_V2).hexdigest()
+    assert read_index(tracker.index, "key") == DPKG_V1
+    tracker.commit(plan)
+    assert read_index(tracker.index, "key") == DPKG_V2
+    assert len(os.listdir(tmp_path / "index")) == 1
+
+
+def test_delta_tracker_plan_stream_error(tmp_path, mocker):
+    """Test that content whose entries can't be read is not left staged."""
+    tracker = make_tracker(tmp_path)
+    mocker.patch.object(delta, "stream_entries", side_effect=MemoryError)
+
+    with pytest.raises(MemoryError):
+        tracker.plan_stream("key", io.BytesIO(DPKG_V1))
+
+    assert os.listdir(tmp_path / "index") == []
+
+
+def test_delta_tracker_discard(tmp_path):
+    """Test that discarded content leaves neither previous content nor staged file."""
+    tracker = make_tracker(tmp_path)
+    tracker.commit(tracker.plan("key", DPKG_V1))
+
+    tracker.discard(tracker.plan("key", DPKG_V2))
+
+    assert read_index(tracker.index, "key") == DPKG_V1
+    assert len(os.listdir(tmp_path / "index")) == 1
+
+
+def test_delta_tracker_index_path(collector_config, tmp_path):
+    """Test that delta index defaults to a directory next to the state file."""
+    collector_config.settings.delta = "alongside"
+    state = StateStore(str(tmp_path / "state.shard-0-of-2.json"))
+
+    tracker = delta.delta_tracker(collector_config.settings, state)
+    assert tracker.index.path == str(tmp_path / "state.shard-0-of-2.delta")
+
+    collector_config.settings.delta_index = "/var/lib/collector/delta"
+    tracker = delta.delta_tracker(collector_config.settings, state)
+    assert tracker.index.path == "/var/lib/collector/delta"
+    collector_config.settings.delta = "off"
+    assert delta.delta_tracker(collector_config.settings, state) is None
@@ -0,0 +1,110 @@
+"""Tests for software_inventory_collector.discovery module"""
+import pytest
+from juju.client._definitions import FullStatus
+
+from software_inventory_collector import discovery
+from software_inventory_collector.config import _ConfigTarget
+from software_inventory_collector.state import StateStore
+
+
+def make_status():
+    """Return model status with exporters in various deployments."""
+    exporter_units = {
+        "exporter/0": {"public-address": "10.0.0.1", "opened-ports": ["8675/tcp"]}
+    }
+    return FullStatus.from_json(
+        {
+            "applications": {
+                "exporter": {
+                    "charm": "ch:amd64/focal/inventory-exporter-3",
+                    "subordinate-to": ["ubuntu", "nova-compute"],
+                },
+                "ubuntu": {
+                    "charm": "ch:amd64/focal/ubuntu-21",
+                    "units": {
+                        "ubuntu/0": {
+                            "machine": "0",
+                            "public-address": "10.0.0.1",
+                            "subordinates": exporter_units,
+                        },
+                        "ubuntu/1": {
+                            "machine": "0/lxd/1",
+                            "public-address": "10.0.0.2",
+                            "subordinates": {"exporter/1": {"opened-ports": ["53/udp"]}},
+                        },
+                        "ubuntu/2": {"machine": "1", "subordinates": {"exporter/2": {}}},
+                    },
+                },
+                "nova-compute": {
+                    "charm": "nova-compute",
+                    "units": {
+                        "nova-compute/0": {
+                            "machine": "2",
+                            "public-address": "fd00::1",
+                            "subordinates": {"exporter/3": {}},
+                        }
+                    },
+                },
+                "k8s-exporter": {
+                    "charm": "inventory-exporter",
+                    "units": {"k8s-exporter/0": {"address": "10.1.0.1"}},
+                },
+            },
+            "machines": {
+                "0": {
+                    "hostname": "host-0",
+                    "containers": {"0/lxd/1": {"hostname": "container-1"}},
+                },
+                "1": {"hostname": "host-1"},
+                "2": {},
+            },
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "charm_url, name",
+    [
+        ("ch:amd64/focal/inventory-exporter-3", "inventory-exporter"),
+        ("cs:~user/inventory-exporter-12", "inventory-exporter"),
+        ("local:inventory-exporter", "inventory-exporter"),
+        ("inventory-exporter", "inventory-exporter"),
+        ("ch:amd64/jammy/k8s-1", "k8s"),
+    ],
+)
+def test_charm_name(charm_url, name):
+    """Test that charm name is parsed from various forms of charm URL."""
+    assert discovery.charm_name(charm_url) == name
+
+
+def test_discover_exporters():
+    """Test discovery of principal and subordinate exporter units."""
+    exporters = discovery.discover_exporters(make_status(), "inventory-exporter", 8000)
+
+    assert exporters == {
+        "host-0": "10.0.0.1:8675",
+        "container-1": "10.0.0.2:8000",
+        "exporter-3": "[fd00::1]:8000",
+        "k8s-exporter-0": "10.1.0.1:8000",
+    }
+
+
+def test_discovered_targets(collector_config, tmp_path):
+    """Test that cached exporters of configured controllers become targets."""
+    controller = collector_config.juju_controller.endpoint
+    state = StateStore(str(tmp_path / "state.json"))
+    state.set(
+        discovery.discovery_key(controller, "model-1"),
+        {"host-1": "10.0.0.1:8675", "declared": collector_config.targets[0].endpoint},
+    )
+    state.set(discovery.discovery_key(controller, "model-2"), {"host-1": "10.0.0.1:8675"})
+    state.set(discovery.discovery_key("10.9.9.9:17070", "other"), {"h": "10.0.0.9:1"})
+    settings = collector_config.settings
+
+    targets = discovery.discovered_targets(collector_config, state)
+
+    assert targets == [
+        _ConfigTarget(
+            "10.0.0.1:8675", "host-1", settings.customer, settings.site, "model-1"
+        )
+    ]
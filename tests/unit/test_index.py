@@ -0,0 +1,103 @@
+"""Tests for software_inventory_collector.index module"""
+import hashlib
+import json
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from software_inventory_collector import archive, index
+
+MEMBERS = {
+    "juju_status_@_model_@_20230501100000": b'{"status": "active"}',
+    "dpkg_@_host_@_20230501100000": b"ii  bash  5.1\n" * 5000,
+    "long_name_" * 20: b"pax header",
+    "empty": b"",
+}
+
+
+def write_indexed(tar_path, compression, executor=None):
+    """Write MEMBERS into indexed tarball, compressed in frames if executor is given."""
+    if executor is None:
+        writer = archive.ArchiveWriter(str(tar_path), compression, index=True)
+    else:
+        writer = archive.FramedArchiveWriter(
+            str(tar_path), compression, None, executor, index=True
+        )
+    with writer:
+        for name, content in MEMBERS.items():
+            writer.add_bytes(name, content)
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "bz2", "xz", "zstd"])
+@pytest.mark.parametrize("framed", [False, True])
+def test_indexed_archive_reader(compression, framed, tmp_path, mocker):
+    """Test that every member is read from its offset and matches its hash."""
+    mocker.patch.object(archive, "FRAME_SIZE", 4096)
+    tar_path = tmp_path / f"output{archive.archive_suffix(compression)}"
+    with ThreadPoolExecutor(2) as executor:
+        write_indexed(tar_path, compression, executor if framed else None)
+
+    with index.IndexedArchiveReader(str(tar_path)) as reader:
+        assert reader.names() == list(MEMBERS)
+        for name, content in MEMBERS.items():
+            assert reader.read(name) == content
+            assert reader.verify(name)
+
+    with open(f"{tar_path}{index.INDEX_SUFFIX}", "r", encoding="UTF-8") as index_file:
+        members = json.load(index_file)["members"]
+    assert [member["sha256"] for member in members] == [
+        hashlib.sha256(content).hexdigest() for content in MEMBERS.values()
+    ]
+    if compression != "none":
+        assert len({member["frame"] for member in members}) == len(MEMBERS)
+    if compression != "zstd":
+        with tarfile.open(tar_path) as tar_file:
+            assert tar_file.getnames() == list(MEMBERS)
+
+
+def test_uncompressed_offsets(tmp_path):
+    """Test that index offsets match offsets found by tarfile."""
+    tar_path = tmp_path / "output.tar"
+    write_indexed(tar_path, "none")
+
+    with index.IndexedArchiveReader(str(tar_path)) as reader, tarfile.open(
+        tar_path
+    ) as tar_file:
+        for member in tar_file.getmembers():
+            assert reader.members[member.name]["offset"] == member.offset_data
+
+
+def test_indexed_archive_reader_errors(tmp_path):
+    """Test that unsupported index, missing member and truncated tarball fail."""
+    tar_path = tmp_path / "output.tar.gz"
+    write_indexed(tar_path, "gzip")
+    index_path = tmp_path / "custom.json"
+    with open(f"{tar_path}{index.INDEX_SUFFIX}", "r", encoding="UTF-8") as index_file:
+        data = json.load(index_file)
+    data["members"][0]["offset"] = 10**9
+    index_path.write_text(json.dumps(data), encoding="UTF-8")
+
+    with index.IndexedArchiveReader(str(tar_path), str(index_path)) as reader:
+        with pytest.raises(KeyError):
+            reader.read("missing")
+        with pytest.raises(OSError, match="unexpected end of data"):
+            reader.read(data["members"][0]["name"])
+        assert reader.verify("empty")
+
+    data["format"] = 2
+    index_path.write_text(json.dumps(data), encoding="UTF-8")
+    with pytest.raises(ValueError, match="unsupported index format"):
+        index.IndexedArchiveReader(str(tar_path), str(index_path))
+
+
+def test_archive_index_failed_save(tmp_path, mocker):
+    """Test that failed save leaves no temporary file."""
+    archive_index = index.ArchiveIndex("none")
+    mocker.patch.object(index.json, "dump", side_effect=OSError("disk full"))
+
+    with pytest.raises(OSError, match="disk full"):
+        archive_index.save(str(tmp_path / "output.tar.index.json"), "output.tar")
+
+    assert os.listdir(tmp_path) == []
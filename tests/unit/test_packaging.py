@@ -0,0 +1,79 @@
+"""Tests for software_inventory_collector.packaging module"""
+import gzip
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from software_inventory_collector import archive, packaging
+
+
+@pytest.fixture()
+def thread_pool():
+    """Packaging pool whose jobs run in threads, with queue of a single job."""
+    pool = packaging.PackagingPool(workers=1, queue_size=1)
+    pool._executor = ThreadPoolExecutor(2)
+    yield pool
+    pool.shutdown()
+
+
+def test_packaging_pool_processes():
+    """Test that jobs run in worker processes sized to available cores."""
+    with packaging.PackagingPool() as pool:
+        frame = pool.submit(archive.compress_frame, b"data" * 100, "gzip").result()
+
+    assert pool.workers == packaging.available_cores()
+    assert pool.queue_size == packaging.QUEUE_PER_WORKER * pool.workers
+    assert gzip.decompress(frame) == b"data" * 100
+
+
+def test_packaging_pool_bounded_queue(thread_pool):
+    """Test that submission blocks while the queue is full."""
+    release = threading.Event()
+    thread_pool.submit(release.wait)
+    submitted = threading.Event()
+    thread = threading.Thread(
+        target=lambda: thread_pool.submit(submitted.set).result(), daemon=True
+    )
+    thread.start()
+
+    assert not submitted.wait(0.2)
+    release.set()
+    thread.join(5)
+    assert submitted.is_set()
+
+
+@pytest.mark.asyncio
+async def test_packaging_pool_run(thread_pool, mocker):
+    """Test that coroutine waits for a place in the queue without blocking."""
+    mocker.patch.object(packaging, "POLL_INTERVAL", 0.01)
+    blocker = thread_pool.submit(time.sleep, 0.1)
+
+    assert await thread_pool.run(sum, [1, 2, 3]) == 6
+    assert blocker.done()
+
+
+def test_packaging_pool_submit_error(thread_pool):
+    """Test that failed submission does not take place in the queue."""
+    thread_pool._executor.shutdown()
+
+    with pytest.raises(RuntimeError):
+        thread_pool.submit(sum, [1])
+
+    assert thread_pool._slots.acquire(blocking=False)
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_packaging_pool_from_settings(enabled, collector_config, mocker):
+    """Test that packaging pool is created only if it's enabled in settings."""
+    shutdown_mock = mocker.patch.object(packaging.PackagingPool, "shutdown")
+    collector_config.settings.packaging_pool = enabled
+    collector_config.settings.packaging_workers = 3
+
+    with packaging.packaging_pool(collector_config.settings) as pool:
+        assert (pool is not None) == enabled
+
+    if enabled:
+        assert pool.workers == 3
+        shutdown_mock.assert_called_once()
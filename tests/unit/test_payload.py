@@ -0,0 +1,58 @@
+"""Tests for software_inventory_collector.payload module"""
+import hashlib
+import io
+
+import pytest
+import requests
+
+from software_inventory_collector import payload
+
+
+def make_response(content, headers=None):
+    """Return HTTP response that streams the content from memory."""
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(content)
+    response.headers.update(headers or {})
+    return response
+
+
+def test_payload_from_response(mocker):
+    """Test that large body is spooled to disk in chunks with its hash and headers."""
+    content = bytes(range(256)) * 1024
+    spool_spy = mocker.spy(payload, "SpooledTemporaryFile")
+    response = make_response(content, {"ETag": '"v1"', "Last-Modified": "yesterday"})
+
+    spooled = payload.Payload.from_response(response, 1024)
+
+    assert spool_spy.call_args.kwargs == {"max_size": 1024}
+    assert spool_spy.spy_return._rolled
+    assert spooled.data.read() == content
+    assert (spooled.size, spooled.artifact_size) == (len(content), len(content))
+    assert not spooled.partial and not spooled.size_is_lower_bound
+    assert spooled.state == {
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "etag": '"v1"',
+        "last_modified": "yesterday",
+    }
+
+
+@pytest.mark.parametrize(
+    "headers, artifact_size, lower_bound",
+    [
+        ({"Content-Length": "10000"}, 10000, False),
+        ({}, 101, True),
+        ({"Content-Length": "invalid"}, 101, True),
+        ({"Content-Length": "500", "Content-Encoding": "gzip"}, 101, True),
+    ],
+)
+def test_payload_oversized(headers, artifact_size, lower_bound):
+    """Test that oversized body is spooled partially, with its size if it's known."""
+    spooled = payload.Payload.from_response(
+        make_response(b"x" * 10000, headers), 1024, max_size=100
+    )
+
+    assert spooled.size == 101
+    assert spooled.partial
+    assert spooled.artifact_size == artifact_size
+    assert spooled.size_is_lower_bound is lower_bound
@@ -0,0 +1,223 @@
+"""Tests for software_inventory_collector.report module"""
+import json
+import os
+
+import pytest
+
+from software_inventory_collector import report
+
+
+@pytest.mark.parametrize(
+    "errors, exit_code",
+    [
+        ([], report.EXIT_OK),
+        ([None, None], report.EXIT_OK),
+        ([None, "error"], report.EXIT_PARTIAL_FAILURE),
+        (["error", "error"], report.EXIT_FAILURE),
+    ],
+)
+def test_run_report_exit_code(errors, exit_code):
+    """Test that exit code reflects full, partial or no failure."""
+    run_report = report.RunReport()
+    for index, error in enumerate(errors):
+        run_report.record("target", f"target-{index}", error)
+
+    assert run_report.exit_code == exit_code
+
+
+def test_run_report_failure_is_kept():
+    """Test that failure of a source is not overwritten by its later success."""
+    run_report = report.RunReport()
+    run_report.record("target", "exporter-1", "dpkg failed")
+    run_report.record("target", "exporter-1")
+    run_report.record("target", "exporter-1", "snap failed")
+
+    assert [entry.error for entry in run_report.entries] == ["dpkg failed"]
+
+
+def test_run_report_summary():
+    """Test human-readable summary of the run."""
+    run_report = report.RunReport()
+    run_report.record("target", "exporter-1")
+    run_report.record("model", "openstack", "connection lost")
+
+    assert run_report.summary() == (
+        "Collection summary: 1 succeeded, 1 failed\n"
+        "  OK      target 'exporter-1'\n"
+        "  FAILED  model 'openstack': connection lost"
+    )
+
+
+def test_run_report_limited_artifacts():
+    """Test that truncated and skipped artifacts are listed with their source."""
+    run_report = report.RunReport()
+    run_report.record("target", "exporter-1")
+    run_report.limit(
+        "target", "exporter-1", report.LimitedArtifact("dpkg", 2048, 1024, "too large")
+    )
+    run_report.limit(
+        "target", "exporter-1", report.LimitedArtifact("snap", 10, 0, "budget reached")
+    )
+    run_report.limit(
+        "target", "exporter-1", report.LimitedArtifact("kernel", 101, 0, "large", True)
+    )
+
+    assert run_report.exit_code == report.EXIT_OK
+    assert run_report.summary() == (
+        "Collection summary: 1 succeeded, 0 failed\n"
+        "  OK      target 'exporter-1'\n"
+        "    TRUNCATED 'dpkg' (2048 bytes): too large\n"
+        "    SKIPPED 'snap' (10 bytes): budget reached\n"
+        "    SKIPPED 'kernel' (at least 101 bytes): large"
+    )
+    limited = run_report.to_dict()["entries"][0]["limited"]
+    assert [(item["action"], item["written"]) for item in limited] == [
+        ("truncated", 1024),
+        ("skipped", 0),
+        ("skipped", 0),
+    ]
+    assert [item["size_is_lower_bound"] for item in limited] == [False, False, True]
+
+
+def test_run_report_timing_and_bytes(mocker):
+    """Test that phase timings and transferred bytes are accumulated per source."""
+    mocker.patch.object(
+        report.time, "time", side_effect=[99.0, 100.0, 101.0, 103.0, 104.0]
+    )
+    run_report = report.RunReport()
+
+    with run_report.timer("http", "target", "exporter-1"):
+        pass
+    with run_report.timer("connect"):
+        pass
+    run_report.add_bytes("target", "exporter-1", transferred=10, written=4)
+    run_report.add_bytes("target", "exporter-1", transferred=5)
+
+    entry = run_report.entries[0]
+    assert entry.phases == {"http": 1.0}
+    assert entry.duration == 1.0
+    assert (entry.bytes_transferred, entry.bytes_written) == (15, 4)
+    assert run_report.phases == {"connect": 1.0}
+    assert report.ReportEntry("model", "openstack").duration == 0.0
+
+
+def test_run_report_write_json(tmp_path):
+    """Test that JSON report contains totals, archives and every source."""
+    archive = tmp_path / "archive.tar"
+    archive.write_bytes(b"data")
+    run_report = report.RunReport()
+    run_report.add_bytes("target", "exporter-1", transferred=10, written=10)
+    run_report.record("model", "openstack", "connection lost")
+    run_report.add_archive(str(archive))
+    run_report.add_archive(str(tmp_path / "not-created.tar"))
+    run_report.finish()
+
+    run_report.write_json(str(tmp_path / "report.json"))
+
+    data = json.loads((tmp_path / "report.json").read_text(encoding="UTF-8"))
+    assert data["exit_code"] == report.EXIT_PARTIAL_FAILURE
+    assert data["bytes_transferred"] == 10
+    assert data["archives"] == {"archive.tar": 4}
+    assert [(entry["name"], entry["status"]) for entry in data["entries"]] == [
+        ("exporter-1", "ok"),
+        ("openstack", "failed"),
+    ]
+    assert "started" not in data["entries"][0]
+
+
+def test_run_report_write_prometheus(tmp_path):
+    """Test Prometheus textfile output with escaped label values."""
+    run_report = report.RunReport()
+    with run_report.timer("connect"):
+        pass
+    run_report.add_bytes("target", 'exporter "1"', transferred=10, written=8)
+    run_report.record("model", "open\\stack", "connection lost")
+    path = tmp_path / "collector.prom"
+
+    run_report.write_prometheus(str(path))
+
+    lines = path.read_text(encoding="UTF-8").splitlines()
+    prefix = report.METRIC_PREFIX
+    assert f"# TYPE {prefix}_run_exit_code gauge" in lines
+    assert f"{prefix}_run_exit_code {report.EXIT_PARTIAL_FAILURE}" in lines
+    assert any(
+        line.startswith(f'{prefix}_phase_duration_seconds{{phase="connect"}} ')
+        for line in lines
+    )
+    assert (
+        f'{prefix}_source_bytes_written{{kind="target",name="exporter \\"1\\""}} 8'
+        in lines
+    )
+    assert f'{prefix}_source_success{{kind="model",name="open\\\\stack"}} 0' in lines
+    assert (
+        f'{prefix}_source_artifacts_limited{{kind="model",name="open\\\\stack"}} 0'
+        in lines
+    )
+    assert os.listdir(tmp_path) == ["collector.prom"]
+
+
+def test_run_report_failed_write(tmp_path, mocker):
+    """Test that failed write keeps the previous file and no temporary file."""
+    path = tmp_path / "report.json"
+    path.write_text("previous", encoding="UTF-8")
+    mocker.patch.object(report.os, "replace", side_effect=OSError("disk full"))
+
+    with pytest.raises(OSError, match="disk full"):
+        report.RunReport().write_json(str(path))
+
+    assert os.listdir(tmp_path) == ["report.json"]
+    assert path.read_text(encoding="UTF-8") == "previous"
+
+
+def test_run_report_finish_once(mocker):
+    """Test that end of already finished run is not moved."""
+    mocker.patch.object(report.time, "time", side_effect=[10.0, 20.0, 30.0])
+    run_report = report.RunReport()
+
+    run_report.finish()
+    run_report.finish()
+
+    assert run_report.duration == 10.0
+
+
+def test_run_report_merge(mocker):
+    """Test that reports of shards, loaded from JSON, are merged into one report."""
+    mocker.patch.object(report.time, "time", side_effect=[100.0, 101.0, 103.0])
+    first = report.RunReport()
+    with first.timer("juju", "model", "openstack"):
+        first.record("model", "openstack")
+    mocker.stopall()
+    first.record("controller", "10.0.0.1", "timeout")
+    first.add_bytes("model", "openstack", transferred=10, written=5)
+    first.limit(
+        "model", "openstack", report.LimitedArtifact("juju_status", 10, 0, "too large")
+    )
+    first.phases = {"juju": 3.0}
+    first.archives = {"openstack.tar": 512}
+    first.finished = 105.0
+    second = report.RunReport()
+    second.started, second.finished = 102.0, 110.0
+    second.phases = {"juju": 1.0, "exporter": 8.0}
+    second.record("target", "exporter-1")
+    second.record("controller", "10.0.0.1")
+
+    loaded = [
+        report.RunReport.from_dict(json.loads(json.dumps(r.to_dict())))
+        for r in (first, second)
+    ]
+    merged = report.RunReport.merge(loaded)
+
+    assert merged.started == 100.0
+    assert merged.duration == 10.0
+    assert merged.phases == {"juju": 3.0, "exporter": 8.0}
+    assert merged.archives == {"openstack.tar": 512}
+    assert merged.exit_code == report.EXIT_PARTIAL_FAILURE
+    entries = {(entry.kind, entry.name): entry for entry in merged.entries}
+    assert entries["controller", "10.0.0.1"].error == "timeout"
+    assert entries["model", "openstack"].duration == 2.0
+    assert entries["model", "openstack"].phases == {"juju": 2.0}
+    assert entries["model", "openstack"].bytes_written == 5
+    assert [item["artifact"] for item in entries["model", "openstack"].limited] == [
+        "juju_status"
+    ]
+    assert entries["target", "exporter-1"].duration == 0.0
@@ -0,0 +1,78 @@
+"""Tests for software_inventory_collector.schedule module"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from software_inventory_collector import schedule
+
+
+@pytest.mark.parametrize(
+    "expression, after, expected",
+    [
+        ("*/15 * * * *", datetime(2023, 5, 1, 10, 7, 30), datetime(2023, 5, 1, 10, 15)),
+        ("*/15 * * * *", datetime(2023, 5, 1, 10, 15), datetime(2023, 5, 1, 10, 30)),
+        ("30 2 * * *", datetime(2023, 5, 1, 3, 0), datetime(2023, 5, 2, 2, 30)),
+        ("0 0 1 */3 *", datetime(2023, 5, 15), datetime(2023, 7, 1)),
+        ("0 0 * 1 *", datetime(2023, 12, 31, 12), datetime(2024, 1, 1)),
+        # 2023-05-01 is Monday, 7 and 0 are both Sunday
+        ("0 12 * * 7", datetime(2023, 5, 1), datetime(2023, 5, 7, 12)),
+        ("0 12 * * 1-5/2", datetime(2023, 5, 1, 13), datetime(2023, 5, 3, 12)),
+        # restricted day of month and day of week match either of them
+        ("0 0 20 * 0", datetime(2023, 5, 1), datetime(2023, 5, 7)),
+        ("0 0 2,20 * 0", datetime(2023, 5, 1), datetime(2023, 5, 2)),
+        ("5/20 8-9 * * *", datetime(2023, 5, 1, 8, 50), datetime(2023, 5, 1, 9, 5)),
+    ],
+)
+def test_cron_schedule_next_run(expression, after, expected):
+    """Test that next run is the first matching minute after given time."""
+    cron = schedule.CronSchedule(expression)
+
+    assert cron.next_run(after) == expected
+    assert cron.first_run(after) == expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["* * * *", "60 * * * *", "* 5-3 * * *", "*/0 * * * *", "x * * * *", "* * 0 * *"],
+)
+def test_cron_schedule_invalid(expression):
+    """Test that invalid cron expressions are rejected."""
+    with pytest.raises(ValueError):
+        schedule.CronSchedule(expression)
+
+
+def test_cron_schedule_never_matches():
+    """Test that expression that never matches does not loop forever."""
+    cron = schedule.CronSchedule("0 0 31 2 *")
+
+    with pytest.raises(ValueError, match="never matches"):
+        cron.next_run(datetime(2023, 1, 1))
+
+
+def test_interval_schedule():
+    """Test that interval schedule starts immediately and keeps fixed rate."""
+    interval = schedule.IntervalSchedule(90)
+    now = datetime(2023, 5, 1, 10, 0)
+
+    assert interval.first_run(now) == now
+    assert interval.next_run(now) == now + timedelta(seconds=90)
+
+
+@pytest.mark.parametrize(
+    "interval, cron, expected",
+    [
+        (None, None, type(None)),
+        (60, None, schedule.IntervalSchedule),
+        (None, "* * * * *", schedule.CronSchedule),
+    ],
+)
+def test_parse_schedule(interval, cron, expected):
+    """Test that schedule is defined by either interval or cron expression."""
+    assert isinstance(schedule.parse_schedule(interval, cron), expected)
+
+
+@pytest.mark.parametrize("interval, cron", [(60, "* * * * *"), (0, None)])
+def test_parse_schedule_invalid(interval, cron):
+    """Test that ambiguous or invalid schedule is rejected."""
+    with pytest.raises(ValueError):
+        schedule.parse_schedule(interval, cron)
@@ -0,0 +1,59 @@
+"""Tests for software_inventory_collector.shard module"""
+from collections import Counter
+
+import pytest
+
+from software_inventory_collector import shard
+
+
+def test_shard_of_stable_and_balanced():
+    """Test that every key is assigned to the same shard and shards are balanced."""
+    keys = [f"host-{index}" for index in range(1000)]
+
+    assignment = [shard.shard_of(key, 4) for key in keys]
+
+    assert assignment == [shard.shard_of(key, 4) for key in keys]
+    assert set(assignment) == {0, 1, 2, 3}
+    assert min(Counter(assignment).values()) > 200
+
+
+def test_shard_of_minimal_movement():
+    """Test that adding a shard moves only keys that the new shard takes over."""
+    keys = [f"model-{index}" for index in range(1000)]
+
+    for key in keys:
+        new_shard = shard.shard_of(key, 5)
+        assert new_shard in (shard.shard_of(key, 4), 4)
+
+
+@pytest.mark.parametrize("spec, expected", [("0/1", (0, 1)), ("3/4", (3, 4))])
+def test_parse_shard(spec, expected):
+    """Test parsing of valid shard specification."""
+    assert shard.parse_shard(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["4/4", "-1/4", "0/0", "1", "a/b"])
+def test_parse_shard_invalid(spec):
+    """Test that invalid shard specification is rejected."""
+    with pytest.raises(ValueError):
+        shard.parse_shard(spec)
+
+
+@pytest.mark.parametrize(
+    "index, count, expected",
+    [
+        (0, 1, "/var/state.json"),
+        (1, 4, "/var/state.shard-1-of-4.json"),
+    ],
+)
+def test_shard_path(index, count, expected):
+    """Test that files of shards get distinct paths, unsharded path is unchanged."""
+    assert shard.shard_path("/var/state.json", index, count) == expected
+
+
+@pytest.mark.parametrize(
+    "index, count, expected", [(0, 1, ""), (2, 4, "_@_shard-2-of-4")]
+)
+def test_shard_field(index, count, expected):
+    """Test that file name field of a shard is empty if sharding is disabled."""
+    assert shard.shard_field(index, count) == expected
@@ -0,0 +1,59 @@
+"""Tests for software_inventory_collector.state module"""
+import json
+
+import pytest
+
+from software_inventory_collector.state import StateStore
+
+
+def test_state_store_roundtrip(tmp_path):
+    """Test that saved state is loaded back in the next run."""
+    state_path = str(tmp_path / "state.json")
+    state = StateStore.load(state_path)
+    state.set("exporter/10.0.0.1:8675/dpkg", {"sha256": "abc", "etag": '"v1"'})
+
+    state.save()
+
+    loaded = StateStore.load(state_path)
+    assert loaded.get("exporter/10.0.0.1:8675/dpkg") == {
+        "sha256": "abc",
+        "etag": '"v1"',
+    }
+    assert not (tmp_path / "state.json.tmp").exists()
+
+
+@pytest.mark.parametrize("content", ["not a json {", json.dumps(["list"])])
+def test_state_store_invalid_file(content, tmp_path):
+    """Test that unreadable state file results in empty state."""
+    state_path = tmp_path / "state.json"
+    state_path.write_text(content, encoding="UTF-8")
+
+    state = StateStore.load(str(state_path))
+
+    assert state.get("any key") == {}
+
+
+def test_state_store_get_returns_copy(tmp_path):
+    """Test that modification of returned state does not alter the store."""
+    state = StateStore(str(tmp_path / "state.json"))
+    state.set("key", {"sha256": "abc"})
+
+    state.get("key")["sha256"] = "modified"
+
+    assert state.get("key") == {"sha256": "abc"}
+
+
+def test_state_store_items_and_delete(tmp_path):
+    """Test listing states by key prefix and removal of states."""
+    state = StateStore(str(tmp_path / "state.json"))
+    state.set("discovery/juju/model", {"host": "10.0.0.1:8675"})
+    state.set("exporter/10.0.0.1:8675/dpkg", {"sha256": "abc"})
+
+    assert state.items("discovery/") == {
+        "discovery/juju/model": {"host": "10.0.0.1:8675"}
+    }
+
+    state.delete("discovery/juju/model")
+    state.delete("missing")
+
+    assert state.items() == {"exporter/10.0.0.1:8675/dpkg": {"sha256": "abc"}}
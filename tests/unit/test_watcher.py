@@ -0,0 +1,112 @@
+"""Tests for software_inventory_collector.watcher module"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from software_inventory_collector import watcher
+
+
+def make_model(connected=True):
+    """Return connected model whose observers can be notified about deltas."""
+    model = MagicMock()
+    model.is_connected.return_value = connected
+    model.disconnect.side_effect = AsyncMock()
+    model.observers = []
+    model.add_observer.side_effect = lambda callable_, predicate: model.observers.append(
+        (callable_, predicate)
+    )
+    return model
+
+
+async def notify(model, entity):
+    """Deliver delta of given entity type to observers of the model."""
+    delta = MagicMock(entity=entity)
+    for callable_, predicate in model.observers:
+        if predicate(delta):
+            await callable_(delta, None, None, model)
+
+
+@pytest.mark.asyncio
+async def test_model_watcher_refetches_changed_model():
+    """Test that model is queried only after a relevant delta arrives."""
+    model = make_model()
+    connect = AsyncMock(return_value=model)
+    query = AsyncMock(side_effect=[("status-1", "bundle-1"), ("status-2", "bundle-2")])
+    model_watcher = watcher.ModelWatcher(max_staleness=3600)
+
+    assert await model_watcher.fetch("model", connect, query) == ("status-1", "bundle-1")
+    await notify(model, "action")
+    assert await model_watcher.fetch("model", connect, query) == ("status-1", "bundle-1")
+    await notify(model, "unit")
+    assert await model_watcher.fetch("model", connect, query) == ("status-2", "bundle-2")
+
+    connect.assert_called_once_with("model")
+    assert query.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_model_watcher_max_staleness(mocker):
+    """Test that unchanged model is queried again once its data are too old."""
+    time_mock = mocker.patch.object(watcher, "time")
+    time_mock.monotonic.side_effect = [100, 150, 160, 160]
+    query = AsyncMock(return_value=("status", "bundle"))
+    model_watcher = watcher.ModelWatcher(max_staleness=60)
+    connect = AsyncMock(return_value=make_model())
+
+    await model_watcher.fetch("model", connect, query)
+    await model_watcher.fetch("model", connect, query)
+    await model_watcher.fetch("model", connect, query)
+
+    assert query.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_model_watcher_failed_query():
+    """Test that model whose query failed is queried again."""
+    query = AsyncMock(side_effect=[OSError("timeout"), ("status", "bundle")])
+    model_watcher = watcher.ModelWatcher(max_staleness=3600)
+    connect = AsyncMock(return_value=make_model())
+
+    with pytest.raises(OSError):
+        await model_watcher.fetch("model", connect, query)
+
+    assert model_watcher.is_stale("model")
+    assert await model_watcher.fetch("model", connect, query) == ("status", "bundle")
+
+
+@pytest.mark.asyncio
+async def test_model_watcher_reconnect(capsys):
+    """Test that model whose connection dropped is connected again."""
+    dropped, fresh = make_model(), make_model()
+    dropped.disconnect.side_effect = AsyncMock(side_effect=OSError("already closed"))
+    connect = AsyncMock(side_effect=[dropped, fresh])
+    query = AsyncMock(return_value=("status", "bundle"))
+    model_watcher = watcher.ModelWatcher(max_staleness=3600)
+
+    await model_watcher.fetch("model", connect, query)
+    dropped.is_connected.return_value = False
+    await model_watcher.fetch("model", connect, query)
+
+    assert connect.call_count == 2
+    assert query.call_args.args == ("model", fresh)
+    assert "Failed to disconnect from model 'model': already closed" in (
+        capsys.readouterr().out
+    )
+
+
+@pytest.mark.asyncio
+async def test_model_watcher_prune_and_close():
+    """Test that models are disconnected when they are no longer collected."""
+    models = {"model-1": make_model(), "model-2": make_model()}
+    query = AsyncMock(return_value=("status", "bundle"))
+    model_watcher = watcher.ModelWatcher(max_staleness=3600)
+    for name, model in models.items():
+        await model_watcher.fetch(name, AsyncMock(return_value=model), query)
+
+    await model_watcher.prune(["model-2"])
+    models["model-1"].disconnect.assert_called_once()
+    models["model-2"].disconnect.assert_not_called()
+
+    await model_watcher.close()
+    models["model-2"].disconnect.assert_called_once()
+    assert model_watcher.is_stale("model-2")